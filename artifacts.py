@@ -0,0 +1,329 @@
+import re
+import base64
+import hashlib
+from config import ARTIFACT_TABLE_MAX_ROWS
+
+# --- Keccak-256 (the pre-standard padding used by Ethereum and Monero, unlike hashlib.sha3_256) ---
+
+_MASK = (1 << 64) - 1
+_ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+# Rotation offset of lane (x, y)
+_ROTATIONS = [
+    [0, 36, 3, 41, 18],
+    [1, 44, 10, 45, 2],
+    [62, 6, 43, 15, 61],
+    [28, 55, 25, 21, 56],
+    [27, 20, 39, 8, 14],
+]
+
+
+def _rotl(value, shift):
+    return ((value << shift) | (value >> (64 - shift))) & _MASK
+
+
+def _keccak_f(lanes):
+    """Keccak-f[1600] permutation over 25 lanes indexed x + 5 * y."""
+    for rc in _ROUND_CONSTANTS:
+        c = [lanes[x] ^ lanes[x + 5] ^ lanes[x + 10] ^ lanes[x + 15] ^ lanes[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rotl(c[(x + 1) % 5], 1) for x in range(5)]
+        lanes = [lanes[i] ^ d[i % 5] for i in range(25)]
+        b = [0] * 25
+        for x in range(5):
+            for y in range(5):
+                b[y + 5 * ((2 * x + 3 * y) % 5)] = _rotl(lanes[x + 5 * y], _ROTATIONS[x][y])
+        lanes = [
+            b[i] ^ (~b[(i + 1) % 5 + 5 * (i // 5)] & b[(i + 2) % 5 + 5 * (i // 5)])
+            for i in range(25)
+        ]
+        lanes[0] ^= rc
+    return lanes
+
+
+def keccak256(data):
+    """Keccak-256 digest of bytes."""
+    rate = 136
+    padded = bytearray(data) + b"\x01" + b"\x00" * (rate - 1 - len(data) % rate)
+    padded[-1] |= 0x80
+    lanes = [0] * 25
+    for start in range(0, len(padded), rate):
+        block = padded[start:start + rate]
+        for i in range(rate // 8):
+            lanes[i] ^= int.from_bytes(block[8 * i:8 * i + 8], "little")
+        lanes = _keccak_f(lanes)
+    return b"".join(lane.to_bytes(8, "little") for lane in lanes[:4])
+
+
+# --- Validators ---
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BASE58_INDEX = {ch: i for i, ch in enumerate(BASE58_ALPHABET)}
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32_CONST, BECH32M_CONST = 1, 0x2BC830A3
+# Monero base58 works in 8-byte blocks; encoded length of a final block of n bytes
+XMR_BLOCK_SIZES = [0, 2, 3, 5, 6, 7, 9, 10, 11]
+# Network bytes of mainnet standard, integrated and subaddresses
+XMR_NETWORK_BYTES = {18, 19, 42}
+TELEGRAM_RESERVED = {"joinchat", "addstickers", "addtheme", "share", "proxy", "socks", "login", "setlanguage", "iv"}
+# "logo@2x.png" looks like an email
+FILE_TLDS = {"png", "jpg", "jpeg", "gif", "svg", "webp", "css", "js", "ico", "bmp"}
+
+
+def _base58_decode(text):
+    number = 0
+    for ch in text:
+        number = number * 58 + BASE58_INDEX[ch]
+    leading = len(text) - len(text.lstrip("1"))
+    body = number.to_bytes((number.bit_length() + 7) // 8, "big") if number else b""
+    return b"\x00" * leading + body
+
+
+def valid_btc_base58(address):
+    """P2PKH (1...) or P2SH (3...) address with a valid Base58Check checksum."""
+    try:
+        raw = _base58_decode(address)
+    except KeyError:
+        return False
+    if len(raw) != 25 or raw[0] not in (0x00, 0x05):
+        return False
+    return hashlib.sha256(hashlib.sha256(raw[:-4]).digest()).digest()[:4] == raw[-4:]
+
+
+def _bech32_polymod(values):
+    generator = [0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3]
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1FFFFFF) << 5 ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                chk ^= generator[i]
+    return chk
+
+
+def _convert_bits(data, from_bits, to_bits):
+    acc = bits = 0
+    out = []
+    for value in data:
+        acc = (acc << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            out.append((acc >> bits) & ((1 << to_bits) - 1))
+    if bits >= from_bits or (acc << (to_bits - bits)) & ((1 << to_bits) - 1):
+        return None
+    return out
+
+
+def valid_btc_bech32(address):
+    """Segwit address (bc1...) with a valid bech32 (v0) or bech32m (v1+) checksum."""
+    if address != address.lower() and address != address.upper():
+        return False
+    address = address.lower()
+    hrp, _, data_part = address.rpartition("1")
+    if hrp != "bc" or len(data_part) < 7 or any(ch not in BECH32_CHARSET for ch in data_part):
+        return False
+    data = [BECH32_CHARSET.index(ch) for ch in data_part]
+    expanded = [ord(ch) >> 5 for ch in hrp] + [0] + [ord(ch) & 31 for ch in hrp]
+    version = data[0]
+    expected = BECH32_CONST if version == 0 else BECH32M_CONST
+    if version > 16 or _bech32_polymod(expanded + data) != expected:
+        return False
+    program = _convert_bits(data[1:-6], 5, 8)
+    if program is None or not 2 <= len(program) <= 40:
+        return False
+    return version != 0 or len(program) in (20, 32)
+
+
+def valid_xmr(address):
+    """Monero standard, integrated or subaddress with a valid Keccak checksum."""
+    raw = bytearray()
+    for start in range(0, len(address), 11):
+        block = address[start:start + 11]
+        if len(block) not in XMR_BLOCK_SIZES:
+            return False
+        number = 0
+        for ch in block:
+            if ch not in BASE58_INDEX:
+                return False
+            number = number * 58 + BASE58_INDEX[ch]
+        size = XMR_BLOCK_SIZES.index(len(block))
+        if number >= 1 << (8 * size):
+            return False
+        raw += number.to_bytes(size, "big")
+    if len(raw) not in (69, 77) or raw[0] not in XMR_NETWORK_BYTES:
+        return False
+    return keccak256(bytes(raw[:-4]))[:4] == raw[-4:]
+
+
+def valid_eth(address):
+    """0x address; mixed-case addresses must carry a valid EIP-55 checksum."""
+    hex_part = address[2:]
+    if hex_part == hex_part.lower() or hex_part == hex_part.upper():
+        return True
+    digest = keccak256(hex_part.lower().encode()).hex()
+    return all(
+        ch.isdigit() or ch.isupper() == (int(digest[i], 16) >= 8)
+        for i, ch in enumerate(hex_part)
+    )
+
+
+def valid_onion_v3(domain):
+    """56-character v3 onion address whose embedded checksum and version match its key."""
+    label = domain.lower()[:-len(".onion")]
+    try:
+        raw = base64.b32decode(label.upper())
+    except ValueError:
+        return False
+    pubkey, checksum, version = raw[:32], raw[32:34], raw[34:]
+    if version != b"\x03":
+        return False
+    return hashlib.sha3_256(b".onion checksum" + pubkey + version).digest()[:2] == checksum
+
+
+# --- Extraction ---
+
+_B58 = "1-9A-HJ-NP-Za-km-z"
+# One alternation so every page is scanned once; earlier branches win at the same position
+ARTIFACT_RE = re.compile(
+    r"(?P<pgp>-----BEGIN PGP (?P<pgp_kind>[A-Z ]{5,30}?)-----(?s:.{0,20000}?)-----END PGP [A-Z ]{5,30}?-----)"
+    r"|(?P<email>\b[A-Za-z0-9._%+-]{1,64}@(?:[A-Za-z0-9-]{1,63}\.){1,8}[A-Za-z]{2,24}\b)"
+    r"|(?P<onion>\b(?i:[a-z2-7]{56}\.onion)\b)"
+    rf"|(?P<xmr>\b[48][{_B58}]{{94}}(?:[{_B58}]{{11}})?\b)"
+    r"|(?P<btc_bech32>\b(?i:bc1[ac-hj-np-z02-9]{8,87})\b)"
+    rf"|(?P<btc>\b[13][{_B58}]{{25,34}}\b)"
+    r"|(?P<eth>\b0x[0-9a-fA-F]{40}\b)"
+    r"|(?:(?:https?://)?(?:t\.me|telegram\.me|telegram\.dog)/(?:s/)?(?P<telegram>[A-Za-z][A-Za-z0-9_]{4,31})\b)"
+    r"|(?:\b(?i:telegram|tg)\W{0,3}@(?P<telegram_at>[A-Za-z][A-Za-z0-9_]{4,31})\b)"
+)
+PGP_BLOCK_RE = re.compile(
+    r"-----BEGIN PGP (?P<kind>[A-Z ]{5,30}?)-----(?s:.{0,20000}?)-----END PGP [A-Z ]{5,30}?-----"
+)
+WHITESPACE_RE = re.compile(r"\s+")
+
+ARTIFACT_LABELS = {
+    "btc": "Bitcoin address",
+    "xmr": "Monero address",
+    "eth": "Ethereum address",
+    "onion": "Onion v3 domain",
+    "email": "Email",
+    "pgp": "PGP block",
+    "telegram": "Telegram handle",
+}
+
+
+def _pgp_id(kind, block):
+    digest = hashlib.sha256(WHITESPACE_RE.sub("", block).encode()).hexdigest()[:16]
+    return f"{kind} sha256:{digest}"
+
+
+def compact_text(text):
+    """Replace PGP blocks with a short reference (the same id the artifact table uses)."""
+    return PGP_BLOCK_RE.sub(lambda m: f"[PGP {_pgp_id(m.group('kind'), m.group(0))}]", text)
+
+
+def _validated(match):
+    """(type, normalized value) for a regex match, or None if it fails validation."""
+    kind = match.lastgroup
+    if kind == "pgp_kind":
+        kind = "pgp"
+    value = match.group(kind)
+    if kind == "pgp":
+        return "pgp", _pgp_id(match.group("pgp_kind"), value)
+    if kind == "email":
+        value = value.lower()
+        if value.rsplit(".", 1)[-1] in FILE_TLDS:
+            return None
+        return "email", value
+    if kind == "onion":
+        value = value.lower()
+        return ("onion", value) if valid_onion_v3(value) else None
+    if kind == "xmr":
+        return ("xmr", value) if valid_xmr(value) else None
+    if kind == "btc_bech32":
+        return ("btc", value.lower()) if valid_btc_bech32(value) else None
+    if kind == "btc":
+        return ("btc", value) if valid_btc_base58(value) else None
+    if kind == "eth":
+        return ("eth", value) if valid_eth(value) else None
+    if kind in ("telegram", "telegram_at"):
+        value = value.lower()
+        if value in TELEGRAM_RESERVED or value.endswith("_"):
+            return None
+        return "telegram", "@" + value
+    return None
+
+
+def extract_artifacts(pages):
+    """
+    Find and validate artifacts in {url: text}.
+    Returns a deduplicated list of {"type", "value", "sources"} sorted by
+    type, then by the number of pages an artifact appears on.
+    """
+    found = {}
+    for url, text in pages.items():
+        for match in ARTIFACT_RE.finditer(text or ""):
+            artifact = _validated(match)
+            if artifact is None:
+                continue
+            found.setdefault(artifact, []).append(url)
+            if artifact[0] == "email" and artifact[1].endswith(".onion"):
+                domain = artifact[1].split("@", 1)[1]
+                if valid_onion_v3(domain):
+                    found.setdefault(("onion", domain), []).append(url)
+    artifacts = [
+        {"type": kind, "value": value, "sources": list(dict.fromkeys(urls))}
+        for (kind, value), urls in found.items()
+    ]
+    order = list(ARTIFACT_LABELS)
+    artifacts.sort(key=lambda a: (order.index(a["type"]), -len(a["sources"]), a["value"]))
+    return artifacts
+
+
+def artifact_refs(artifacts, max_rows=ARTIFACT_TABLE_MAX_ROWS):
+    """{(type, value): "A1", ...} for the artifacts that fit in the table."""
+    return {(a["type"], a["value"]): f"A{i}" for i, a in enumerate(artifacts[:max_rows], 1)}
+
+
+def mask_artifacts(text, artifacts, max_rows=ARTIFACT_TABLE_MAX_ROWS):
+    """
+    Replace every occurrence of a tabled artifact with its reference ("[A3]"),
+    so the LLM takes addresses from the validated table instead of copying
+    them out of the page text. Artifacts beyond max_rows are left as they are.
+    """
+    refs = artifact_refs(artifacts, max_rows)
+    if not refs:
+        return text
+
+    def replace(match):
+        ref = refs.get(_validated(match))
+        return f"[{ref}]" if ref else match.group(0)
+
+    text = ARTIFACT_RE.sub(replace, text)
+    # PGP blocks are already reduced to their id by compact_text
+    for (kind, value), ref in refs.items():
+        if kind == "pgp":
+            text = text.replace(f"[PGP {value}]", f"[{ref}]")
+    return text
+
+
+def format_artifact_table(artifacts, max_rows=ARTIFACT_TABLE_MAX_ROWS):
+    """Compact text table of artifacts for the LLM, with the references mask_artifacts uses ("" when there are none)."""
+    if not artifacts:
+        return ""
+    lines = ["ref | type | value | found on"]
+    for ref, artifact in zip(artifact_refs(artifacts, max_rows).values(), artifacts):
+        sources = artifact["sources"]
+        where = ", ".join(sources[:3])
+        if len(sources) > 3:
+            where += f" (+{len(sources) - 3} more)"
+        lines.append(f"{ref} | {ARTIFACT_LABELS[artifact['type']]} | {artifact['value']} | {where}")
+    if len(artifacts) > max_rows:
+        lines.append(f"... {len(artifacts) - max_rows} more artifacts not shown")
+    return "\n".join(lines)
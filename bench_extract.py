@@ -0,0 +1,137 @@
+"""
+Micro-benchmark for the HTML-to-text engines in extract.py.
+
+    python bench_extract.py --corpus path/to/saved/pages
+
+Every *.html / *.htm file under the corpus directory is converted by each
+engine. The report shows pages/sec, MB/sec and output parity against the
+extraction scrape.py did before extract.py existed, BeautifulSoup(html,
+"html.parser").get_text() over the whole page (the "original" row, which is
+also the speed baseline): "recall" is the share of words an engine outputs
+that also appear in the original text, "kept" the share of the original
+text (non-whitespace characters) left after script, style and boilerplate
+removal. Without a corpus a synthetic set of forum/market style pages is
+used.
+"""
+import os
+import re
+import time
+import random
+import click
+from bs4 import BeautifulSoup
+from extract import EXTRACTORS, extract_text
+
+WORD_RE = re.compile(r"\w+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def load_corpus(path):
+    pages = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.lower().endswith((".html", ".htm")):
+                with open(os.path.join(root, name), "rb") as f:
+                    pages.append(f.read().decode("utf-8", errors="replace"))
+    return pages
+
+
+def synthetic_corpus(count=200, seed=0):
+    rng = random.Random(seed)
+    words = (
+        "market vendor escrow bitcoin monero listing shipping review forum thread "
+        "reply account login password database leak dump price stealth pgp key"
+    ).split()
+
+    def sentence(n):
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    pages = []
+    for i in range(count):
+        posts = "".join(
+            f"<div class='post'><h3>{sentence(4)}</h3><p>{sentence(40)} &amp; {sentence(10)}</p>"
+            f"<ul>{''.join(f'<li>{sentence(6)}</li>' for _ in range(5))}</ul></div>"
+            for _ in range(rng.randint(5, 40))
+        )
+        pages.append(
+            f"<!DOCTYPE html><html><head><title>Page {i} {sentence(3)}</title>"
+            f"<style>body{{font-family:sans-serif}} .post{{margin:1em}}</style>"
+            f"<script>var config = {{'ads': true, 'id': {i}}}; function f(){{return '<p>x</p>';}}</script>"
+            f"</head><body><header><a href='/'>Home</a> <a href='/login'>Login</a></header>"
+            f"<nav><ul><li><a href='/c/1'>{sentence(2)}</a></li><li><a href='/c/2'>{sentence(2)}</a></li></ul></nav>"
+            f"<main>{posts}</main><footer>{sentence(8)}</footer></body></html>"
+        )
+    return pages
+
+
+def original_extract(html):
+    """The pre-extract.py path of scrape.py, without the title it prepended."""
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.get_text().replace('\n', ' ').replace('\r', '')
+
+
+def parity(text, reference):
+    """(recall, kept) of one engine output against the original output of the same page."""
+    reference = reference.lower()
+    # bs4 glues words from adjacent elements together, so match substrings
+    words = set(WORD_RE.findall(text.lower()))
+    recall = sum(1 for w in words if w in reference) / len(words) if words else 1.0
+    ref_chars = len(WHITESPACE_RE.sub("", reference))
+    kept = len(WHITESPACE_RE.sub("", text)) / ref_chars if ref_chars else 1.0
+    return recall, kept
+
+
+def run_engine(name, pages, repeat, drop_boilerplate):
+    if name == "original":
+        def extract(page):
+            return original_extract(page)
+    else:
+        def extract(page):
+            return extract_text(page, name, drop_boilerplate)
+    outputs = [extract(page) for page in pages]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            extract(page)
+    elapsed = time.perf_counter() - started
+    return outputs, elapsed
+
+
+@click.command()
+@click.option("--corpus", "-c", type=click.Path(file_okay=False), default=None,
+              help="Directory of saved pages (*.html). Uses a synthetic corpus if omitted")
+@click.option("--repeat", "-r", type=int, default=3, help="Timed passes over the corpus")
+@click.option("--keep-boilerplate", is_flag=True, help="Keep nav/header/footer text in the fast engines")
+def main(corpus, repeat, keep_boilerplate):
+    if corpus:
+        pages = load_corpus(corpus)
+        if not pages:
+            raise click.ClickException(f"No .html files found under {corpus}")
+        source = corpus
+    else:
+        pages = synthetic_corpus()
+        source = "synthetic corpus (pass --corpus for saved onion pages)"
+    total_mb = sum(len(p.encode("utf-8")) for p in pages) / 1e6
+    click.echo(f"{len(pages)} pages, {total_mb:.1f} MB from {source}, {repeat} passes\n")
+
+    reference, _ = run_engine("original", pages, 0, False)
+    click.echo(f"{'engine':<8} {'pages/sec':>10} {'MB/sec':>8} {'speedup':>8} {'recall':>7} {'kept':>6}")
+    baseline = None
+    for name in ["original"] + list(EXTRACTORS):
+        outputs, elapsed = run_engine(name, pages, repeat, not keep_boilerplate)
+        rate = len(pages) * repeat / elapsed
+        baseline = baseline or rate
+        scores = [parity(o, r) for o, r in zip(outputs, reference)]
+        recall = sum(s[0] for s in scores) / len(pages)
+        kept = sum(s[1] for s in scores) / len(pages)
+        click.echo(
+            f"{name:<8} {rate:>10.1f} {total_mb * repeat / elapsed:>8.2f} "
+            f"{rate / baseline:>7.1f}x {recall:>7.1%} {kept:>6.1%}"
+        )
+    click.echo(
+        "\nrecall = output words also in the original text; "
+        "kept = share of the original text left after script/style/boilerplate removal"
+    )
+
+
+if __name__ == "__main__":
+    main()
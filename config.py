@@ -8,6 +8,8 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
+# Context window (tokens) requested from Ollama for local models
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
 
 # Content Filtering Configuration
 def parse_list(env_var):
@@ -19,8 +21,153 @@ def parse_list(env_var):
 
 CONTENT_ALLOWLIST = parse_list("CONTENT_ALLOWLIST")
 CONTENT_BLOCKLIST = parse_list("CONTENT_BLOCKLIST")
+# Optional keyword files (one keyword per line) merged into the lists above
+CONTENT_ALLOWLIST_FILE = os.getenv("CONTENT_ALLOWLIST_FILE", "")
+CONTENT_BLOCKLIST_FILE = os.getenv("CONTENT_BLOCKLIST_FILE", "")
+# Match keywords as whole words only (e.g. "gore" no longer matches "gorearth")
+CONTENT_FILTER_WORD_BOUNDARY = os.getenv("CONTENT_FILTER_WORD_BOUNDARY", "false").lower() == "true"
+# Also apply the blocklist to scraped page text, not just search result titles and links
+FILTER_SCRAPED_CONTENT = os.getenv("FILTER_SCRAPED_CONTENT", "false").lower() == "true"
 FILTER_NSFW = os.getenv("FILTER_NSFW", "true").lower() == "true"
 FILTER_IRRELEVANT = os.getenv("FILTER_IRRELEVANT", "true").lower() == "true"
 
 # Maximum results to process (0 = no limit)
 MAX_RESULTS = int(os.getenv("MAX_RESULTS", "20"))
+
+# Results shortlisted locally (BM25 over titles and URLs) before the LLM picks MAX_RESULTS of them (0 = send all)
+FILTER_SHORTLIST_SIZE = int(os.getenv("FILTER_SHORTLIST_SIZE", "100"))
+
+# Search engine fan-out deadlines (seconds)
+# SEARCH_ENGINE_TIMEOUT bounds a single engine, SEARCH_DEADLINE bounds the whole search stage
+SEARCH_ENGINE_TIMEOUT = float(os.getenv("SEARCH_ENGINE_TIMEOUT", "20"))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "45"))
+
+# Local directory for persistent state (engine health, caches)
+ROBIN_CACHE_DIR = os.getenv(
+    "ROBIN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+)
+
+# Search engine health tracking
+# Engines failing ENGINE_FAILURE_THRESHOLD times in a row are skipped for ENGINE_COOLDOWN
+# seconds (doubling on every failed re-probe); the ENGINE_HEDGE_COUNT fastest healthy
+# engines get a duplicate request on a fresh circuit when they answer slower than usual
+ENGINE_HEALTH_ENABLED = os.getenv("ENGINE_HEALTH_ENABLED", "true").lower() == "true"
+ENGINE_FAILURE_THRESHOLD = int(os.getenv("ENGINE_FAILURE_THRESHOLD", "3"))
+ENGINE_COOLDOWN = float(os.getenv("ENGINE_COOLDOWN", "1800"))
+ENGINE_HEDGE_COUNT = int(os.getenv("ENGINE_HEDGE_COUNT", "3"))
+
+# On-disk search result cache shared by CLI and UI (TTL in seconds)
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+# Number of result pages fetched per search engine (engines without pagination return one page)
+SEARCH_PAGES = int(os.getenv("SEARCH_PAGES", "1"))
+
+# Maximum search results kept per onion host after URL canonicalization (0 = no cap)
+MAX_RESULTS_PER_HOST = int(os.getenv("MAX_RESULTS_PER_HOST", "3"))
+
+# Streaming pipeline: maximum pages scraped while search results are still arriving (0 = no limit)
+STREAM_MAX_PAGES = int(os.getenv("STREAM_MAX_PAGES", "40"))
+
+# Pooled keep-alive HTTP sessions, one per (proxy, host)
+# SESSION_POOL_MAXSIZE = kept-alive connections per host, SESSION_POOL_MAX_SESSIONS = hosts kept open
+SESSION_POOL_CONNECTIONS = int(os.getenv("SESSION_POOL_CONNECTIONS", "4"))
+SESSION_POOL_MAXSIZE = int(os.getenv("SESSION_POOL_MAXSIZE", "4"))
+SESSION_POOL_MAX_SESSIONS = int(os.getenv("SESSION_POOL_MAX_SESSIONS", "64"))
+
+# Tor SOCKS endpoints as comma-separated host:port (several tor processes or SocksPorts)
+# TOR_SELECTION: least_loaded or latency; dead endpoints are retried after TOR_DEAD_COOLDOWN seconds
+TOR_SOCKS_ENDPOINTS = os.getenv("TOR_SOCKS_ENDPOINTS", "127.0.0.1:9050")
+TOR_SELECTION = os.getenv("TOR_SELECTION", "least_loaded").lower()
+TOR_DEAD_COOLDOWN = float(os.getenv("TOR_DEAD_COOLDOWN", "60"))
+
+# Tor circuit rotation through the control port (robin cli --rotate)
+# A circuit is replaced when its median latency exceeds TOR_ROTATE_LATENCY_FACTOR x the
+# baseline or its error rate exceeds TOR_ROTATE_MAX_ERROR_RATE, at most once per
+# TOR_ROTATE_MIN_INTERVAL seconds
+TOR_CONTROL_HOST = os.getenv("TOR_CONTROL_HOST", "127.0.0.1")
+TOR_CONTROL_PORT = int(os.getenv("TOR_CONTROL_PORT", "9051"))
+# Control ports of the tor processes behind TOR_SOCKS_ENDPOINTS, in the same order
+# (one port = shared by all endpoints; empty = TOR_CONTROL_PORT for all of them)
+TOR_CONTROL_PORTS = os.getenv("TOR_CONTROL_PORTS", "")
+TOR_CONTROL_PASSWORD = os.getenv("TOR_CONTROL_PASSWORD") or None
+TOR_ROTATE_MIN_INTERVAL = float(os.getenv("TOR_ROTATE_MIN_INTERVAL", "10"))
+TOR_ROTATE_LATENCY_FACTOR = float(os.getenv("TOR_ROTATE_LATENCY_FACTOR", "2.0"))
+TOR_ROTATE_MAX_ERROR_RATE = float(os.getenv("TOR_ROTATE_MAX_ERROR_RATE", "0.5"))
+
+# Streaming page fetch: stop downloading a page once SCRAPE_MAX_TEXT_CHARS characters of
+# text have been extracted or SCRAPE_MAX_BYTES bytes have been read
+SCRAPE_MAX_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", "1000000"))
+SCRAPE_MAX_TEXT_CHARS = int(os.getenv("SCRAPE_MAX_TEXT_CHARS", "20000"))
+
+# HTML-to-text engine for scraped pages: auto (lxml if installed), lxml, stdlib or bs4 (BeautifulSoup)
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "auto").lower()
+
+# Processes that run HTML extraction for scrape_multiple (0 = extract in the fetching threads)
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "0"))
+
+# Query-aware passage selection: text kept per scraped page, in characters or,
+# if PASSAGE_BUDGET_TOKENS is set, in estimated tokens (about 4 characters each)
+PASSAGE_BUDGET_CHARS = int(os.getenv("PASSAGE_BUDGET_CHARS", "1200"))
+PASSAGE_BUDGET_TOKENS = int(os.getenv("PASSAGE_BUDGET_TOKENS", "0"))
+PASSAGE_CHARS = int(os.getenv("PASSAGE_CHARS", "300"))
+
+# Local archive of raw page bodies (ROBIN_CACHE_DIR/pages); pages fetched within
+# PAGE_STORE_FRESHNESS seconds are served from it, older ones are re-fetched conditionally;
+# the least recently fetched pages are evicted beyond PAGE_STORE_MAX_MB of bodies
+PAGE_STORE_ENABLED = os.getenv("PAGE_STORE_ENABLED", "true").lower() == "true"
+PAGE_STORE_FRESHNESS = float(os.getenv("PAGE_STORE_FRESHNESS", "3600"))
+PAGE_STORE_MAX_MB = float(os.getenv("PAGE_STORE_MAX_MB", "500"))
+
+# Host-aware scraping: pages in flight per host, and the backoff (seconds, doubling
+# up to the maximum) for a host that times out, errors or answers 429/503
+SCRAPE_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPE_PER_HOST_CONCURRENCY", "2"))
+SCRAPE_HOST_BACKOFF = float(os.getenv("SCRAPE_HOST_BACKOFF", "5"))
+SCRAPE_HOST_MAX_BACKOFF = float(os.getenv("SCRAPE_HOST_MAX_BACKOFF", "60"))
+
+# Scrape retries (jittered exponential backoff from SCRAPE_RETRY_BACKOFF seconds),
+# hedged duplicate requests past the SCRAPE_HEDGE_PERCENTILE fetch time (0 = off)
+# and a wall-clock deadline for the whole scrape stage in seconds (0 = none)
+SCRAPE_RETRIES = int(os.getenv("SCRAPE_RETRIES", "2"))
+SCRAPE_RETRY_BACKOFF = float(os.getenv("SCRAPE_RETRY_BACKOFF", "1"))
+SCRAPE_HEDGE_PERCENTILE = float(os.getenv("SCRAPE_HEDGE_PERCENTILE", "90"))
+SCRAPE_DEADLINE = float(os.getenv("SCRAPE_DEADLINE", "120"))
+
+# Crawl mode defaults (robin cli --crawl-depth / --crawl-pages); depth 0 = no crawling
+CRAWL_DEPTH = int(os.getenv("CRAWL_DEPTH", "0"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "30"))
+
+# Locally extracted and validated artifacts (crypto addresses, onion domains, emails,
+# PGP blocks, Telegram handles) passed to the summary as a table; at most this many rows
+ARTIFACT_TABLE_MAX_ROWS = int(os.getenv("ARTIFACT_TABLE_MAX_ROWS", "200"))
+
+# Near-duplicate pages (mirrors, clones) are collapsed into one before summarization;
+# pages whose SimHash fingerprints differ in at most SIMHASH_MAX_DISTANCE of 64 bits count as copies
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+
+# Chunked summaries: chunks analyzed concurrently (LLM calls in flight); failed calls
+# are retried by the LLM scheduler (LLM_MAX_RETRIES)
+LLM_MAP_CONCURRENCY = int(os.getenv("LLM_MAP_CONCURRENCY", "4"))
+
+# Upper limit on content tokens sent per summary call, below the model's own budget
+# (e.g. to stay under a provider tokens-per-minute limit); 0 = use the full context
+LLM_MAX_CHUNK_TOKENS = int(os.getenv("LLM_MAX_CHUNK_TOKENS", "0"))
+
+# On-disk LLM response cache keyed on model, parameters and rendered prompt (TTL in seconds);
+# least recently used responses are evicted beyond LLM_CACHE_MAX_MB
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "604800"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "100"))
+
+# LLM call scheduling, per provider: requests and tokens per minute (0 = unlimited; not
+# applied to local Ollama models), calls in flight, and retries of throttled (429) or
+# transiently failed calls with jittered backoff from LLM_RETRY_BACKOFF seconds or the
+# provider's Retry-After, waiting at most LLM_MAX_RETRY_WAIT seconds per retry
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "2"))
+LLM_MAX_RETRY_WAIT = float(os.getenv("LLM_MAX_RETRY_WAIT", "60"))
@@ -0,0 +1,62 @@
+from keyword_matcher import KeywordMatcher
+from config import (
+    CONTENT_ALLOWLIST,
+    CONTENT_BLOCKLIST,
+    CONTENT_ALLOWLIST_FILE,
+    CONTENT_BLOCKLIST_FILE,
+    CONTENT_FILTER_WORD_BOUNDARY,
+)
+
+
+def build_matcher(keywords, path=None, word_boundary=CONTENT_FILTER_WORD_BOUNDARY):
+    """Compile keywords from the env list and an optional keyword file into one matcher."""
+    keywords = list(keywords)
+    if path:
+        try:
+            keywords += KeywordMatcher.from_file(path).keywords
+        except OSError as e:
+            print(f"[DEBUG] Could not load keyword file {path}: {e}")
+    return KeywordMatcher(keywords, word_boundary=word_boundary)
+
+
+# Compiled once at import, matching cost no longer grows with list size
+BLOCKLIST_MATCHER = build_matcher(CONTENT_BLOCKLIST, CONTENT_BLOCKLIST_FILE)
+ALLOWLIST_MATCHER = build_matcher(CONTENT_ALLOWLIST, CONTENT_ALLOWLIST_FILE)
+
+
+def check_content_filters(text):
+    """
+    Check if content should be filtered based on allowlist/blocklist.
+    Returns (should_include, reason)
+    """
+    # Check blocklist first - these are always excluded
+    blocked_keyword = BLOCKLIST_MATCHER.find_first(text)
+    if blocked_keyword:
+        return False, f"Blocked keyword: {blocked_keyword}"
+
+    # Check allowlist - these override other filters
+    if ALLOWLIST_MATCHER.find_first(text):
+        return True, None
+
+    # Default: include the content
+    return True, None
+
+
+def filter_scraped_content(scraped_results):
+    """
+    Apply the blocklist to scraped page text.
+    Returns (kept, excluded) where kept maps URL -> text (a ScrapeResults
+    subset when given one) and excluded is a list of {"title", "link",
+    "reason"} entries in the excluded_content format.
+    """
+    kept = {}
+    excluded = []
+    for url, content in scraped_results.items():
+        should_include, reason = check_content_filters(content)
+        if should_include:
+            kept[url] = content
+        else:
+            excluded.append({"title": content[:50], "link": url, "reason": reason})
+    if hasattr(scraped_results, "subset"):
+        kept = scraped_results.subset(list(kept))
+    return kept, excluded
@@ -0,0 +1,162 @@
+import re
+import math
+import heapq
+import hashlib
+import itertools
+import threading
+from urllib.parse import urljoin, urlsplit
+from scrape import ScrapeResults, scrape_multiple
+from ranking import tokenize
+from url_utils import get_host, canonicalize_url, dedup_key
+from config import CRAWL_MAX_PAGES
+
+# Links that never lead to a page worth reading
+SKIP_EXTENSIONS_RE = re.compile(
+    r"\.(jpe?g|png|gif|webp|svg|ico|bmp|css|js|woff2?|ttf|pdf|zip|rar|7z|gz|tar|exe|apk|mp[34]|avi|mkv)$",
+    re.IGNORECASE,
+)
+SKIP_PATH_RE = re.compile(r"(log-?out|sign-?out|log-?in|register|signup|captcha)", re.IGNORECASE)
+# Words in a link that usually point at content rather than navigation
+CONTENT_HINTS = frozenset({"thread", "topic", "post", "viewtopic", "showthread", "listing", "product", "item"})
+
+
+class BloomFilter:
+    """
+    Set membership in a fixed bit array: no false negatives, and false
+    positives at about error_rate once `capacity` items are added. Takes
+    roughly 1.2 bytes per item at 1% instead of a full URL string.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        # Double hashing: the i-th position is h1 + i * h2
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Add an item. Returns True if it was (probably) not present before."""
+        new = False
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        self.count += new
+        return new
+
+    def __contains__(self, item):
+        return all(
+            self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(item)
+        )
+
+
+def _link_score(url, anchor_text, query_tokens):
+    """Priority of a link: query terms in its anchor text or URL, plus a small bonus for content-looking links."""
+    tokens = set(tokenize(anchor_text)) | set(tokenize(urlsplit(url).path + " " + urlsplit(url).query))
+    score = len(tokens & query_tokens)
+    if tokens & CONTENT_HINTS:
+        score += 0.5
+    return score
+
+
+def crawl(seed_results, query=None, max_depth=1, max_pages=CRAWL_MAX_PAGES, max_workers=5, rotate=False):
+    """
+    Scrape the seed results and follow links on the same host.
+
+    Links are kept in a frontier ordered by relevance to the query (anchor
+    text and URL), then by depth, and are visited up to max_depth clicks
+    from a seed, for at most max_pages pages in total including the seeds.
+    Every seed is scraped even when there are more than max_pages of them;
+    the cap then only stops the crawl from following links.
+    Visited URLs are tracked in a Bloom filter. The whole crawl is one
+    scrape_multiple run fed from the frontier, so one host scheduler, the
+    retries, the page store and SCRAPE_DEADLINE cover every page, and a
+    link is fetched as soon as a thread is free instead of after a batch.
+
+    Returns a ScrapeResults dict like scrape_multiple, with seeds first.
+    """
+    query_tokens = set(tokenize(query or ""))
+    visited = BloomFilter(capacity=max(1000, max_pages * 200))
+    order = itertools.count()
+    # (-score, depth, order, url_data)
+    frontier = []
+    for res in seed_results:
+        if visited.add(dedup_key(res["link"])):
+            heapq.heappush(frontier, (-math.inf, 0, next(order), dict(res, depth=0)))
+    # Seeds sort first in the frontier, so a cap below their count only drops links
+    limit = max(max_pages, len(frontier))
+    if len(frontier) >= max_pages:
+        print(f"[DEBUG] {len(frontier)} seeds reach the crawl limit of {max_pages} pages, no links will be followed")
+
+    # Guards the frontier; the scrape loop adds links, the input reader takes them
+    changed = threading.Condition()
+    depths = {}
+    state = {"in_flight": 0, "finished": False}
+
+    def pages():
+        # Runs on the scrape's input thread; waiting here does not hold up fetches
+        while len(depths) < limit:
+            with changed:
+                while not frontier and state["in_flight"] and not state["finished"]:
+                    changed.wait()
+                if not frontier or state["finished"]:
+                    return
+                url_data = heapq.heappop(frontier)[3]
+                depths[url_data["link"]] = url_data["depth"]
+                state["in_flight"] += 1
+            yield url_data
+
+    def follow_links(url, content, page_stats):
+        depth = depths.get(url, 0)
+        page_stats["depth"] = depth
+        with changed:
+            state["in_flight"] -= 1
+            if depth < max_depth:
+                host = get_host(url)
+                for href, anchor_text in page_stats.get("links", []):
+                    link = urljoin(url, href)
+                    if not link.startswith(("http://", "https://")) or get_host(link) != host:
+                        continue
+                    link = canonicalize_url(link)
+                    path = urlsplit(link).path
+                    if SKIP_EXTENSIONS_RE.search(path) or SKIP_PATH_RE.search(path):
+                        continue
+                    if not visited.add(dedup_key(link)):
+                        continue
+                    heapq.heappush(frontier, (
+                        -_link_score(link, anchor_text, query_tokens),
+                        depth + 1,
+                        next(order),
+                        {"link": link, "title": anchor_text or link, "depth": depth + 1},
+                    ))
+            changed.notify_all()
+
+    try:
+        scraped = scrape_multiple(
+            pages(), max_workers=max_workers, rotate=rotate, query=query, on_page=follow_links
+        )
+    finally:
+        # Release the input reader if the deadline ended the scrape while it waited
+        with changed:
+            state["finished"] = True
+            changed.notify_all()
+
+    results = ScrapeResults()
+    for url in sorted(scraped, key=lambda url: depths.get(url, 0)):
+        results[url] = scraped[url]
+        results.page_stats[url] = scraped.page_stats.get(url, {})
+        results.page_stats[url].setdefault("depth", depths.get(url, 0))
+    results.refresh_artifacts()
+    print(
+        f"[DEBUG] Crawled {len(results)} pages "
+        f"({sum(1 for p in results.page_stats.values() if p.get('depth'))} beyond the seeds), "
+        f"{len(frontier)} links left in the frontier"
+    )
+    return results
@@ -0,0 +1,119 @@
+import re
+import hashlib
+from collections import Counter
+from config import SIMHASH_MAX_DISTANCE
+
+TOKEN_RE = re.compile(r"\w+")
+# Words per shingle
+SHINGLE_SIZE = 3
+# Pages with fewer words than this are too short to compare reliably
+MIN_TOKENS = 20
+HASH_BITS = 64
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """64-bit SimHash of a text over word shingles; similar texts differ in few bits."""
+    tokens = TOKEN_RE.findall(text.lower())
+    shingles = Counter(
+        " ".join(tokens[i:i + shingle_size])
+        for i in range(max(1, len(tokens) - shingle_size + 1))
+    )
+    weights = [0] * HASH_BITS
+    total = 0
+    for shingle, count in shingles.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        total += count
+        # Visit only the set bits
+        while h:
+            low = h & -h
+            weights[low.bit_length() - 1] += count
+            h ^= low
+    # A bit is set when more than half of the shingle weight has it set
+    return sum(1 << i for i, w in enumerate(weights) if 2 * w > total)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def find_near_duplicates(texts, max_distance=SIMHASH_MAX_DISTANCE):
+    """
+    Cluster {key: text} by SimHash distance.
+
+    Each cluster is built around its longest text: keys are visited from the
+    longest text down and join the first cluster whose representative is
+    within max_distance bits, so no member is further than that from it
+    (chains of near pairs do not merge distant pages). max_distance is
+    clamped to 0..63.
+
+    Fingerprints are split into max_distance + 1 bands; two fingerprints
+    within max_distance bits must agree on at least one whole band, so a key
+    is only compared with representatives sharing a band. Returns a list of
+    clusters (lists of keys in input order) with more than one member.
+    """
+    max_distance = max(0, min(HASH_BITS - 1, max_distance))
+    bands = max_distance + 1
+    width = HASH_BITS // bands
+    fingerprints = {
+        key: simhash(text)
+        for key, text in texts.items()
+        if len(TOKEN_RE.findall(text)) >= MIN_TOKENS
+    }
+    order = {key: i for i, key in enumerate(texts)}
+
+    def band_values(fp):
+        return [(band, (fp >> (band * width)) & ((1 << width) - 1)) for band in range(bands)]
+
+    # (band, value) -> representatives with that band value
+    buckets = {}
+    clusters = {}
+    for key in sorted(fingerprints, key=lambda k: (-len(texts[k]), order[k])):
+        fp = fingerprints[key]
+        keys = band_values(fp)
+        representative = None
+        for band_key in keys:
+            for candidate in buckets.get(band_key, ()):
+                if hamming(fingerprints[candidate], fp) <= max_distance:
+                    representative = candidate
+                    break
+            if representative is not None:
+                break
+        if representative is None:
+            clusters[key] = [key]
+            for band_key in keys:
+                buckets.setdefault(band_key, []).append(key)
+        else:
+            clusters[representative].append(key)
+    return [
+        sorted(members, key=order.get)
+        for members in clusters.values()
+        if len(members) > 1
+    ]
+
+
+def collapse_mirrors(scraped_results, max_distance=SIMHASH_MAX_DISTANCE):
+    """
+    Keep one page per cluster of near-duplicate pages (mirrors, clones).
+
+    The page with the most text represents its cluster; the other URLs are
+    listed in .mirrors[representative] and dropped from the results. Pages
+    are compared on their full text when page_stats has it.
+    """
+    page_stats = getattr(scraped_results, "page_stats", {})
+    texts = {
+        url: page_stats.get(url, {}).get("text") or content
+        for url, content in scraped_results.items()
+    }
+    clusters = find_near_duplicates(texts, max_distance)
+    if not clusters:
+        return scraped_results
+    mirrors = {}
+    dropped = set()
+    for cluster in clusters:
+        representative = max(cluster, key=lambda url: len(texts[url]))
+        mirrors[representative] = [url for url in cluster if url != representative]
+        dropped.update(mirrors[representative])
+    collapsed = scraped_results.subset([url for url in scraped_results if url not in dropped])
+    collapsed.mirrors = {**getattr(scraped_results, "mirrors", {}), **mirrors}
+    print(f"[DEBUG] Collapsed {len(dropped)} mirror pages into {len(mirrors)} representatives")
+    return collapsed
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import threading
+from config import (
+    ROBIN_CACHE_DIR,
+    ENGINE_FAILURE_THRESHOLD,
+    ENGINE_COOLDOWN,
+    ENGINE_HEDGE_COUNT,
+)
+
+# Number of recent observations kept per engine
+HISTORY_SIZE = 50
+# Longest an engine stays benched before it is probed again (seconds)
+MAX_COOLDOWN = 24 * 3600
+# Minimum samples and success rate before an engine is trusted for hedging
+HEDGE_MIN_SAMPLES = 5
+HEDGE_MIN_SUCCESS_RATE = 0.8
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (q in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+def _new_record():
+    return {
+        "latencies": [],
+        "outcomes": [],
+        "yields": [],
+        "consecutive_failures": 0,
+        "bench_level": 0,
+        "bench_until": 0,
+        "last_error": None,
+        "last_checked": 0,
+    }
+
+
+class EngineHealthStore:
+    """
+    Per-endpoint latency, success rate and result yield, persisted as JSON.
+
+    Engines that keep failing are benched with an exponential cooldown and
+    re-probed once it expires, healthy engines are ordered fastest first.
+    """
+
+    def __init__(
+        self,
+        path,
+        failure_threshold=ENGINE_FAILURE_THRESHOLD,
+        cooldown=ENGINE_COOLDOWN,
+        hedge_count=ENGINE_HEDGE_COUNT,
+    ):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge_count = hedge_count
+        self._lock = threading.Lock()
+        self._records = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Atomically write the store to disk."""
+        with self._lock:
+            payload = json.dumps(self._records, indent=2)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[DEBUG] Could not save engine health to {self.path}: {e}")
+
+    def record(self, endpoint, success, latency, result_count=0, error=None):
+        """Record the outcome of one request to an engine."""
+        now = time.time()
+        with self._lock:
+            rec = self._records.setdefault(endpoint, _new_record())
+            rec["outcomes"] = (rec["outcomes"] + [bool(success)])[-HISTORY_SIZE:]
+            rec["last_checked"] = now
+            if success:
+                rec["latencies"] = (rec["latencies"] + [round(latency, 3)])[-HISTORY_SIZE:]
+                rec["yields"] = (rec["yields"] + [int(result_count)])[-HISTORY_SIZE:]
+                rec["consecutive_failures"] = 0
+                rec["bench_level"] = 0
+                rec["bench_until"] = 0
+                rec["last_error"] = None
+                return
+            rec["consecutive_failures"] += 1
+            rec["last_error"] = error
+            if rec["consecutive_failures"] >= self.failure_threshold:
+                wait = min(self.cooldown * (2 ** rec["bench_level"]), MAX_COOLDOWN)
+                rec["bench_until"] = now + wait
+                rec["bench_level"] += 1
+
+    def stats(self, endpoint):
+        """Summary statistics for an endpoint (None values when there is no data yet)."""
+        with self._lock:
+            rec = self._records.get(endpoint) or _new_record()
+            latencies = list(rec["latencies"])
+            outcomes = list(rec["outcomes"])
+            yields = list(rec["yields"])
+            return {
+                "samples": len(outcomes),
+                "success_rate": sum(outcomes) / len(outcomes) if outcomes else None,
+                "mean_yield": sum(yields) / len(yields) if yields else None,
+                "p50": percentile(latencies, 50),
+                "p75": percentile(latencies, 75),
+                "p90": percentile(latencies, 90),
+                "consecutive_failures": rec["consecutive_failures"],
+                "bench_until": rec["bench_until"],
+                "last_error": rec["last_error"],
+            }
+
+    def plan(self, endpoints):
+        """
+        Decide how to query the given endpoints.
+        Returns (active, skipped, hedge_delays):
+          - active: endpoints to query, best first (benched engines whose cooldown
+            has expired are included as probes)
+          - skipped: list of (endpoint, reason) for engines still benched
+          - hedge_delays: {endpoint: seconds} after which a duplicate request
+            should be sent to one of the fastest healthy engines
+        """
+        now = time.time()
+        skipped, ranked = [], []
+        for endpoint in endpoints:
+            s = self.stats(endpoint)
+            if s["bench_until"] > now:
+                retry_in = int(s["bench_until"] - now)
+                skipped.append((
+                    endpoint,
+                    f"Skipped: {s['consecutive_failures']} consecutive failures "
+                    f"(last: {s['last_error']}), retry in {retry_in}s",
+                ))
+                continue
+            ranked.append((endpoint, s))
+
+        def sort_key(item):
+            s = item[1]
+            if not s["samples"]:
+                # Unknown engines sit between proven and struggling ones
+                return (0, -0.5, float("inf"))
+            return (
+                0 if s["mean_yield"] else 1,
+                -s["success_rate"],
+                s["p50"] if s["p50"] is not None else float("inf"),
+            )
+
+        ranked.sort(key=sort_key)
+        active = [endpoint for endpoint, _ in ranked]
+
+        healthy = [
+            (endpoint, s) for endpoint, s in ranked
+            if s["samples"] >= HEDGE_MIN_SAMPLES
+            and s["success_rate"] >= HEDGE_MIN_SUCCESS_RATE
+            and s["p75"] is not None
+        ]
+        healthy.sort(key=lambda item: item[1]["p50"])
+        hedge_delays = {
+            endpoint: s["p75"] for endpoint, s in healthy[: self.hedge_count]
+        }
+        return active, skipped, hedge_delays
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_engine_health():
+    """Return the process-wide engine health store, loading it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EngineHealthStore(os.path.join(ROBIN_CACHE_DIR, "engine_health.json"))
+        return _store
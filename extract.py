@@ -0,0 +1,262 @@
+import re
+from html.parser import HTMLParser
+from config import HTML_EXTRACTOR
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Elements whose content is never page text
+SKIP_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+})
+# Page chrome dropped by the boilerplate filter
+BOILERPLATE_TAGS = frozenset({"nav", "header", "footer", "aside", "menu", "form", "select", "button"})
+# Links kept per page
+MAX_LINKS = 500
+# Elements that end a run of text, so words on either side are not glued together
+BLOCK_TAGS = frozenset({
+    "p", "div", "br", "li", "ul", "ol", "tr", "td", "th", "table", "section", "article",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "dd", "dt", "title", "main",
+})
+
+
+class _TextBuilder:
+    """Shared state for the streaming extractors: element depths, collected text, its length and links."""
+
+    def __init__(self, drop_boilerplate=True):
+        self.drop_boilerplate = drop_boilerplate
+        self.parts = []
+        self.text_length = 0
+        # [href, anchor text parts] per link; the open <a> collects text
+        self.links = []
+        self._anchor = None
+        # Text inside page chrome, only used if the page has nothing else
+        self._boilerplate_parts = []
+        self._skip_depth = 0
+        self._boilerplate_depth = 0
+
+    def _start(self, tag, href=None):
+        if tag == "a":
+            self._anchor = None
+            if href and len(self.links) < MAX_LINKS:
+                self._anchor = [href.strip(), []]
+                self.links.append(self._anchor)
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif self.drop_boilerplate and tag in BOILERPLATE_TAGS:
+            self._boilerplate_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def _end(self, tag):
+        if tag == "a":
+            self._anchor = None
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif self.drop_boilerplate and tag in BOILERPLATE_TAGS:
+            self._boilerplate_depth = max(0, self._boilerplate_depth - 1)
+            self._boilerplate_parts.append(" ")
+        elif tag in BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def _data(self, data):
+        if self._skip_depth:
+            return
+        if self._anchor is not None:
+            # Navigation links count too, so this is before the boilerplate check
+            self._anchor[1].append(data)
+        if self._boilerplate_depth:
+            self._boilerplate_parts.append(data)
+            return
+        self.parts.append(data)
+        self.text_length += len(data)
+
+    def get_text(self):
+        text = WHITESPACE_RE.sub(" ", "".join(self.parts)).strip()
+        if not text and self._boilerplate_parts:
+            # Unclosed <nav> or a page that is all chrome: keep what there is
+            text = WHITESPACE_RE.sub(" ", "".join(self._boilerplate_parts)).strip()
+        return text
+
+    def get_links(self):
+        """[(href, anchor text)] in page order; hrefs are as written in the page."""
+        return [(href, WHITESPACE_RE.sub(" ", "".join(text)).strip()) for href, text in self.links]
+
+
+class StdlibExtractor(_TextBuilder, HTMLParser):
+    """Streaming extractor on the standard library HTML tokenizer (no tree is built)."""
+
+    name = "stdlib"
+
+    def __init__(self, drop_boilerplate=True):
+        _TextBuilder.__init__(self, drop_boilerplate)
+        HTMLParser.__init__(self, convert_charrefs=True)
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, dict(attrs).get("href") if tag == "a" else None)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        self._end(tag)
+
+    def handle_data(self, data):
+        self._data(data)
+
+
+class _LxmlTarget(_TextBuilder):
+    """Parser target receiving tokenizer events from lxml's C parser."""
+
+    def start(self, tag, attrib):
+        self._start(tag, attrib.get("href") if tag == "a" else None)
+
+    def end(self, tag):
+        self._end(tag)
+
+    def data(self, data):
+        self._data(data)
+
+    def close(self):
+        return None
+
+
+class LxmlExtractor:
+    """Streaming extractor driven by lxml's libxml2 HTML tokenizer."""
+
+    name = "lxml"
+
+    def __init__(self, drop_boilerplate=True):
+        self._target = _LxmlTarget(drop_boilerplate)
+        self._parser = etree.HTMLParser(target=self._target, recover=True)
+        self._fed = False
+
+    @property
+    def text_length(self):
+        return self._target.text_length
+
+    def feed(self, data):
+        if data:
+            self._parser.feed(data)
+            self._fed = True
+
+    def close(self):
+        if self._fed:
+            try:
+                self._parser.close()
+            except etree.LxmlError:
+                pass
+
+    def get_text(self):
+        return self._target.get_text()
+
+    def get_links(self):
+        return self._target.get_links()
+
+
+class Bs4Extractor:
+    """
+    BeautifulSoup(html.parser) extraction, kept for comparison. The soup is
+    built once the whole body is in; a stdlib tokenizer runs alongside so
+    text_length counts extracted text like the streaming extractors do.
+    """
+
+    name = "bs4"
+
+    def __init__(self, drop_boilerplate=True):
+        self.drop_boilerplate = drop_boilerplate
+        self._chunks = []
+        self._counter = StdlibExtractor(drop_boilerplate)
+
+    @property
+    def text_length(self):
+        return self._counter.text_length
+
+    def feed(self, data):
+        self._chunks.append(data)
+        self._counter.feed(data)
+
+    def close(self):
+        self._counter.close()
+
+    def get_text(self):
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup("".join(self._chunks), "html.parser")
+        for element in soup.find_all(SKIP_TAGS):
+            element.decompose()
+        chrome = []
+        if self.drop_boilerplate:
+            # Outermost chrome only: nested elements go with their parent
+            chrome = [e for e in soup.find_all(BOILERPLATE_TAGS) if not e.find_parent(BOILERPLATE_TAGS)]
+            chrome = [e.extract() for e in chrome]
+        text = WHITESPACE_RE.sub(" ", soup.get_text(" ")).strip()
+        if not text and chrome:
+            # A page that is all chrome: keep what there is
+            text = WHITESPACE_RE.sub(" ", " ".join(e.get_text(" ") for e in chrome)).strip()
+        return text
+
+    def get_links(self):
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup("".join(self._chunks), "html.parser")
+        return [
+            (a["href"].strip(), WHITESPACE_RE.sub(" ", a.get_text()).strip())
+            for a in soup.find_all("a", href=True)[:MAX_LINKS]
+        ]
+
+
+EXTRACTORS = {
+    "stdlib": StdlibExtractor,
+    "bs4": Bs4Extractor,
+}
+if etree is not None:
+    EXTRACTORS["lxml"] = LxmlExtractor
+
+
+def get_extractor(name=HTML_EXTRACTOR, drop_boilerplate=True):
+    """
+    Return a new streaming extractor (feed(), close(), text_length, get_text(), get_links()).
+    "auto" picks lxml when it is installed and the stdlib tokenizer otherwise.
+    """
+    if name == "auto":
+        name = "lxml" if "lxml" in EXTRACTORS else "stdlib"
+    extractor_class = EXTRACTORS.get(name)
+    if extractor_class is None:
+        raise ValueError(
+            f"Unknown HTML extractor '{name}'. Available: auto, {', '.join(EXTRACTORS)}"
+        )
+    return extractor_class(drop_boilerplate=drop_boilerplate)
+
+
+def extract_text(html, name=HTML_EXTRACTOR, drop_boilerplate=True):
+    """Convert a complete HTML document (str) to normalized text."""
+    extractor = get_extractor(name, drop_boilerplate)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.get_text()
+
+
+def extract_bytes(raw, encoding="utf-8", name=HTML_EXTRACTOR, max_text_chars=None,
+                  chunk_size=16 * 1024, drop_boilerplate=True):
+    """
+    Decode and extract an already downloaded body. Module-level so it can run
+    in a ProcessPoolExecutor worker.
+    Returns (text, stopped, links), where stopped is True if extraction ended
+    early because max_text_chars characters of text had been collected.
+    """
+    extractor = get_extractor(name, drop_boilerplate)
+    text = raw.decode(encoding, errors="replace")
+    stopped = False
+    for start in range(0, len(text), chunk_size):
+        extractor.feed(text[start:start + chunk_size])
+        if max_text_chars and extractor.text_length >= max_text_chars:
+            stopped = start + chunk_size < len(text)
+            break
+    extractor.close()
+    return extractor.get_text(), stopped, extractor.get_links()
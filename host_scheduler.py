@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict, deque
+from config import (
+    SCRAPE_PER_HOST_CONCURRENCY,
+    SCRAPE_HOST_BACKOFF,
+    SCRAPE_HOST_MAX_BACKOFF,
+)
+
+# Status codes that mean the host wants us to slow down
+THROTTLE_STATUSES = {429, 503}
+
+
+class _HostState:
+    def __init__(self, limit):
+        self.queue = deque()
+        self.in_flight = 0
+        self.limit = limit
+        self.backoff = 0.0
+        self.ready_at = 0.0
+        self.throttled = 0
+
+
+class HostScheduler:
+    """
+    Decides which queued page to fetch next so no single host gets flooded.
+
+    Pages are queued per host and handed out round-robin across hosts. Each
+    host has a concurrency limit that starts at max_per_host, is halved when
+    the host times out, errors or answers 429/503, and grows back by one per
+    successful fetch. A struggling host also gets no new requests for an
+    exponentially growing backoff period, while other hosts carry on.
+    """
+
+    def __init__(self, max_per_host=SCRAPE_PER_HOST_CONCURRENCY, base_backoff=SCRAPE_HOST_BACKOFF,
+                 max_backoff=SCRAPE_HOST_MAX_BACKOFF):
+        self.max_per_host = max(1, max_per_host)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # Insertion order is the round-robin order; a served host moves to the end
+        self._hosts = OrderedDict()
+        self.queued = 0
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.max_per_host)
+        return state
+
+    def add(self, host, item):
+        self._state(host).queue.append(item)
+        self.queued += 1
+
+    def next_ready(self, now=None):
+        """Return (host, item) for the next page that may start now, or None."""
+        now = time.monotonic() if now is None else now
+        for host, state in self._hosts.items():
+            if state.queue and state.in_flight < state.limit and state.ready_at <= now:
+                self._hosts.move_to_end(host)
+                state.in_flight += 1
+                self.queued -= 1
+                return host, state.queue.popleft()
+        return None
+
+    def acquire(self, host):
+        """Take a slot on host outside the queue (e.g. for a hedged request). Returns False if it is full."""
+        state = self._state(host)
+        if state.in_flight >= state.limit or state.ready_at > time.monotonic():
+            return False
+        state.in_flight += 1
+        return True
+
+    def drain(self):
+        """Remove and return every queued item."""
+        items = []
+        for state in self._hosts.values():
+            items.extend(state.queue)
+            state.queue.clear()
+        self.queued = 0
+        return items
+
+    def next_wakeup(self, now=None):
+        """Seconds until a backed-off host with queued pages may be served again (None if none waits)."""
+        now = time.monotonic() if now is None else now
+        waits = [
+            state.ready_at - now
+            for state in self._hosts.values()
+            if state.queue and state.in_flight < state.limit and state.ready_at > now
+        ]
+        return max(0.0, min(waits)) if waits else None
+
+    def release(self, host):
+        """Free a slot without adapting the host (e.g. a hedge copy that was stopped)."""
+        state = self._state(host)
+        state.in_flight = max(0, state.in_flight - 1)
+
+    def done(self, host, ok=True, status=None):
+        """Report a finished fetch and adapt the host's limit and backoff."""
+        state = self._state(host)
+        state.in_flight = max(0, state.in_flight - 1)
+        if ok and status not in THROTTLE_STATUSES:
+            state.backoff = 0.0
+            state.limit = min(self.max_per_host, state.limit + 1)
+            return
+        state.throttled += 1
+        state.limit = max(1, state.limit // 2)
+        state.backoff = min(self.max_backoff, state.backoff * 2 or self.base_backoff)
+        state.ready_at = time.monotonic() + state.backoff
+        print(
+            f"[DEBUG] Backing off {host} for {state.backoff:.0f}s "
+            f"({'status ' + str(status) if ok else 'error'}, limit {state.limit})"
+        )
+
+    def stats(self):
+        return {
+            host: {"limit": s.limit, "throttled": s.throttled, "queued": len(s.queue)}
+            for host, s in self._hosts.items()
+        }
@@ -0,0 +1,111 @@
+from collections import deque
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a fixed keyword list.
+
+    The keywords are compiled once; matching then walks the text a single
+    time, so the cost depends on the text length and not on how many
+    keywords are loaded. Matching is case-insensitive. With word_boundary
+    set, a keyword only matches when it is not part of a longer word.
+    """
+
+    def __init__(self, keywords, word_boundary=False):
+        self.word_boundary = word_boundary
+        self.keywords = []
+        # Node i: goto transitions, failure link, keywords ending here
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for keyword in keywords:
+            self._add(keyword)
+        self._build()
+
+    @classmethod
+    def from_file(cls, path, word_boundary=False):
+        """Load keywords from a file, one per line (blank lines and # comments are ignored)."""
+        with open(path, "r", encoding="utf-8") as f:
+            keywords = [line.strip() for line in f]
+        return cls([k for k in keywords if k and not k.startswith("#")], word_boundary)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+    def _add(self, keyword):
+        keyword = keyword.strip().lower()
+        if not keyword:
+            return
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        if keyword not in self._output[node]:
+            self._output[node].append(keyword)
+            self.keywords.append(keyword)
+
+    def _build(self):
+        # Breadth-first so every failure link points at an already finished node
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                if node:
+                    self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def _bounded(self, text, start, end):
+        return (
+            (start == 0 or not _is_word_char(text[start - 1]))
+            and (end == len(text) or not _is_word_char(text[end]))
+        )
+
+    def iter_matches(self, text):
+        """Yield (start, end, keyword) for every keyword occurrence in text."""
+        if not self.keywords:
+            return
+        text = text.lower()
+        goto, fail, output = self._goto, self._fail, self._output
+        root = goto[0]
+        node = 0
+        for i, ch in enumerate(text):
+            if not node and ch not in root:
+                continue
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for keyword in output[node]:
+                start = i - len(keyword) + 1
+                if self.word_boundary and not self._bounded(text, start, i + 1):
+                    continue
+                yield start, i + 1, keyword
+
+    def find_first(self, text):
+        """Return the first keyword found in text, or None."""
+        for _, _, keyword in self.iter_matches(text):
+            return keyword
+        return None
+
+    def find_all(self, text):
+        """Return the distinct keywords found in text, in order of first occurrence."""
+        found = {}
+        for _, _, keyword in self.iter_matches(text):
+            found.setdefault(keyword, None)
+        return list(found)
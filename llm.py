@@ -1,20 +1,43 @@
 import re
-import openai
 import logging
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from llm_utils import _common_llm_params, resolve_model_config, get_model_choices
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_ollama import ChatOllama
+from llm_utils import (
+    _common_llm_params,
+    resolve_model_config,
+    get_model_choices,
+    get_token_budget,
+    estimate_tokens,
+)
+from llm_cache import get_llm_cache, cache_key
+from llm_scheduler import get_llm_scheduler, provider_of, is_rate_limit_error
+from ranking import shortlist_results
+from artifacts import format_artifact_table, mask_artifacts
 from config import (
     CONTENT_ALLOWLIST,
     CONTENT_BLOCKLIST,
     FILTER_NSFW,
     FILTER_IRRELEVANT,
     MAX_RESULTS,
+    FILTER_SHORTLIST_SIZE,
+    LLM_MAP_CONCURRENCY,
+    LLM_MAX_CHUNK_TOKENS,
+    LLM_CACHE_ENABLED,
 )
 
 warnings.filterwarnings("ignore")
 
+# Tokens set aside in every summary call for the system prompt and instructions
+PROMPT_OVERHEAD_TOKENS = 1500
+
+# Everything after the .onion host, dropped from links shown to the LLM
+ONION_PATH_RE = re.compile(r"(?<=\.onion).*")
+TITLE_NOISE_RE = re.compile(r"[^0-9a-zA-Z\-\.]")
+
 
 def get_llm(model_choice):
     # Look up the configuration (cloud or local Ollama)
@@ -35,12 +58,80 @@ def get_llm(model_choice):
     # Model-specific parameters will override common ones if there are any conflicts
     all_params = {**_common_llm_params, **model_specific_params}
 
+    # Ollama otherwise runs with its small default context and silently drops the start of long prompts
+    if llm_class is ChatOllama and "num_ctx" not in all_params:
+        all_params["num_ctx"] = get_token_budget(model_choice)["context"]
+
+    # The LLM scheduler retries failed calls; SDK retries underneath would multiply them
+    if "max_retries" in getattr(llm_class, "model_fields", {}):
+        all_params["max_retries"] = 0
+
     # Create the LLM instance using the gathered parameters
     llm_instance = llm_class(**all_params)
 
     return llm_instance
 
 
+class _StreamWatch(BaseCallbackHandler):
+    """Notes whether an LLM call has streamed any token to the handlers yet."""
+
+    def __init__(self):
+        self.streamed = False
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.streamed = True
+
+
+def _invoke_chain(llm, prompt_template, inputs):
+    """
+    Run prompt_template | llm | StrOutputParser() on inputs, answering from
+    the LLM response cache when the same model already got the same prompt.
+    A cached answer is replayed through the LLM's streaming handlers, so it
+    is shown just like a freshly generated one. Calls that do reach the
+    provider go through the LLM scheduler (rate limits and retries). A call
+    that fails after it has streamed tokens to the handlers is not retried,
+    since the retry would show the answer a second time.
+    """
+    prompt = prompt_template.invoke(inputs)
+    chain = llm | StrOutputParser()
+    watch = _StreamWatch()
+    config = {"callbacks": [watch]} if getattr(llm, "callbacks", None) else None
+
+    def run():
+        return get_llm_scheduler().call(
+            provider_of(llm),
+            lambda: chain.invoke(prompt, config=config),
+            tokens=estimate_tokens(prompt.to_string()),
+            output_tokens=estimate_tokens,
+            can_retry=lambda: not watch.streamed,
+        )
+
+    if not LLM_CACHE_ENABLED:
+        return run()
+
+    cache = get_llm_cache()
+    key = cache_key(llm, prompt.to_messages())
+    cached = cache.get(key)
+    if cached is not None:
+        _replay(getattr(llm, "callbacks", None), cached)
+        return cached
+
+    response = run()
+    if response:
+        model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+        cache.put(key, str(model), response)
+    return response
+
+
+def log_llm_cache_stats():
+    if LLM_CACHE_ENABLED:
+        stats = get_llm_cache().stats()
+        print(
+            f"[DEBUG] LLM cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['entries']} entries ({stats['bytes'] / 1024:.0f} KiB)"
+        )
+
+
 def refine_query(llm, user_input):
     system_prompt = """
     You are a Cybercrime Threat Intelligence Expert. Your task is to refine the provided user query that needs to be sent to darkweb search engines. 
@@ -56,8 +147,7 @@ def refine_query(llm, user_input):
     prompt_template = ChatPromptTemplate(
         [("system", system_prompt), ("user", "{query}")]
     )
-    chain = prompt_template | llm | StrOutputParser()
-    return chain.invoke({"query": user_input})
+    return _invoke_chain(llm, prompt_template, {"query": user_input})
 
 
 def filter_results(llm, query, results):
@@ -72,6 +162,12 @@ def filter_results(llm, query, results):
     # Use configured MAX_RESULTS or default to 20
     max_limit = MAX_RESULTS if MAX_RESULTS > 0 else 20
 
+    # Shortlist locally so the prompt does not grow with the number of results
+    shortlist_size = max(FILTER_SHORTLIST_SIZE, max_limit)
+    if FILTER_SHORTLIST_SIZE > 0 and len(results) > shortlist_size:
+        print(f"[INFO] Shortlisting {shortlist_size} of {len(results)} results before LLM filtering")
+        results = shortlist_results(query, results, shortlist_size)
+
     system_prompt = f"""
     You are a Cybercrime Threat Intelligence Expert. You are given a dark web search query and a list of search results in the form of index, link and title. 
     Your task is select the Top {max_limit} relevant results that best match the search query for user to investigate more.
@@ -87,15 +183,17 @@ def filter_results(llm, query, results):
     prompt_template = ChatPromptTemplate(
         [("system", system_prompt), ("user", "{results}")]
     )
-    chain = prompt_template | llm | StrOutputParser()
     try:
-        result_indices = chain.invoke({"query": query, "results": final_str})
-    except openai.RateLimitError as e:
+        result_indices = _invoke_chain(llm, prompt_template, {"query": query, "results": final_str})
+    except Exception as e:
+        # Still throttled after the scheduler's retries: the prompt itself is too large for the quota
+        if not is_rate_limit_error(e):
+            raise
         print(
             f"Rate limit error: {e} \n Truncating to Web titles only with 30 characters"
         )
         final_str = _generate_final_string(results, truncate=True)
-        result_indices = chain.invoke({"query": query, "results": final_str})
+        result_indices = _invoke_chain(llm, prompt_template, {"query": query, "results": final_str})
 
     # Select top_k results using original (non-truncated) results
     parsed_indices = []
@@ -141,8 +239,8 @@ def _generate_final_string(results, truncate=False):
     final_str = []
     for i, res in enumerate(results):
         # Truncate link at .onion for display
-        truncated_link = re.sub(r"(?<=\.onion).*", "", res["link"])
-        title = re.sub(r"[^0-9a-zA-Z\-\.]", " ", res["title"])
+        truncated_link = ONION_PATH_RE.sub("", res["link"])
+        title = TITLE_NOISE_RE.sub(" ", res["title"])
         if truncated_link == "" and title == "":
             continue
 
@@ -165,13 +263,26 @@ def _generate_final_string(results, truncate=False):
     return "\n".join(s for s in final_str)
 
 
-def _chunk_content(content, max_chunk_size=50000):
+def _chunk_token_budget(llm):
+    """Content tokens that fit in one summary call for this LLM (see llm_utils._model_token_budgets)."""
+    budget = get_token_budget(getattr(llm, "model_name", None) or getattr(llm, "model", None) or "")
+    # num_ctx on an Ollama model is the window it actually runs with
+    context = getattr(llm, "num_ctx", None) or budget["context"]
+    max_tokens = max(1000, context - budget["output"] - PROMPT_OVERHEAD_TOKENS)
+    if LLM_MAX_CHUNK_TOKENS > 0:
+        max_tokens = min(max_tokens, LLM_MAX_CHUNK_TOKENS)
+    return max_tokens
+
+
+def _chunk_content(content, max_tokens):
     """
-    Split content into chunks based on URL boundaries to avoid breaking mid-content.
-    Returns list of content chunks.
+    Split content into chunks of at most max_tokens (estimated) based on URL
+    boundaries to avoid breaking mid-content. A single page larger than
+    max_tokens is cut into equal parts. Returns list of content chunks.
     """
     chunks = []
     current_chunk = ""
+    current_tokens = 0
     
     # Split by URL markers
     sections = content.split("--- URL:")
@@ -180,16 +291,30 @@ def _chunk_content(content, max_chunk_size=50000):
         if i == 0 and not section.strip().startswith("http"):
             # First section might be metadata, keep it
             current_chunk = section
+            current_tokens = estimate_tokens(section)
             continue
         
         section_with_marker = f"--- URL:{section}"
+        section_tokens = estimate_tokens(section_with_marker)
+
+        if section_tokens > max_tokens:
+            if current_chunk.strip():
+                chunks.append(current_chunk)
+            parts = -(-section_tokens // max_tokens)
+            step = -(-len(section_with_marker) // parts)
+            chunks.extend(
+                section_with_marker[j:j + step] for j in range(0, len(section_with_marker), step)
+            )
+            current_chunk, current_tokens = "", 0
+            continue
         
         # If adding this section exceeds limit, save current chunk and start new one
-        if len(current_chunk) + len(section_with_marker) > max_chunk_size and current_chunk:
+        if current_tokens + section_tokens > max_tokens and current_chunk:
             chunks.append(current_chunk)
-            current_chunk = section_with_marker
+            current_chunk, current_tokens = section_with_marker, section_tokens
         else:
             current_chunk += section_with_marker
+            current_tokens += section_tokens
     
     # Add the last chunk
     if current_chunk.strip():
@@ -198,6 +323,58 @@ def _chunk_content(content, max_chunk_size=50000):
     return chunks if chunks else [content]
 
 
+def _without_callbacks(llm):
+    """Copy of the LLM that does not stream to the handlers, for runs whose output is replayed later."""
+    try:
+        return llm.model_copy(update={"callbacks": None})
+    except AttributeError:
+        return llm
+
+
+def _replay(callbacks, text):
+    """Send a finished LLM output through streaming handlers as if it had just been streamed."""
+    for handler in callbacks or []:
+        if hasattr(handler, "on_llm_new_token"):
+            handler.on_llm_new_token(text)
+            handler.on_llm_end(None)
+
+
+def _map_chunks(llm, query, chunks, max_workers=LLM_MAP_CONCURRENCY):
+    """
+    Summarize all chunks with up to max_workers LLM calls in flight.
+
+    Chunk outputs are not streamed while they are generated, since several
+    would interleave; each one is replayed through the LLM's streaming
+    handlers as soon as it and every chunk before it are done, so the output
+    reads in chunk order. Replaying happens on the calling thread, which
+    UI callbacks (Streamlit) require. Since nothing is streamed, the LLM
+    scheduler can retry a chunk call on its own; a chunk that still fails is
+    reported in the summaries instead of failing the whole report.
+    """
+    callbacks = getattr(llm, "callbacks", None)
+    quiet_llm = _without_callbacks(llm)
+    total = len(chunks)
+    summaries = [None] * total
+    next_to_emit = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+        futures = {
+            executor.submit(_generate_chunk_summary, quiet_llm, query, chunk, i + 1, total): i
+            for i, chunk in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                summaries[i] = future.result()
+            except Exception as e:
+                print(f"[ERROR] Chunk {i + 1}/{total} could not be analyzed: {e}")
+                summaries[i] = f"**Chunk {i + 1}/{total} Analysis:** unavailable (analysis failed: {e})"
+            print(f"[INFO] Finished chunk {i + 1}/{total}")
+            while next_to_emit < total and summaries[next_to_emit] is not None:
+                _replay(callbacks, summaries[next_to_emit] + "\n\n")
+                next_to_emit += 1
+    return summaries
+
+
 def _generate_chunk_summary(llm, query, content_chunk, chunk_num, total_chunks):
     """Generate summary for a single chunk of content."""
     system_prompt = f"""
@@ -207,26 +384,24 @@ def _generate_chunk_summary(llm, query, content_chunk, chunk_num, total_chunks):
     
     Rules:
     1. Extract and list all source URLs from this chunk
-    2. Identify all intelligence artifacts (emails, domains, cryptocurrency addresses, threat actors, malware, etc.)
-    3. Note any patterns or connections
+    2. Addresses, domains, emails, PGP keys and Telegram handles were extracted and validated beforehand and appear in the text as references like [A3]; do not try to recover or list them, only note what the text says about a reference where it matters
+    3. Note any patterns or connections, including threat actors, markets, forums and malware named in the text
     4. Keep your analysis concise and focused on facts
     5. Do NOT generate final conclusions - this is a partial analysis
     
     Output Format:
     **Chunk {chunk_num}/{total_chunks} Analysis:**
     - Source URLs: [list all URLs]
-    - Artifacts Found: [list all artifacts with context]
-    - Key Observations: [2-3 bullet points]
+    - Key Observations: [2-3 bullet points, citing references like [A3] where relevant]
     """
     
     prompt_template = ChatPromptTemplate(
         [("system", system_prompt), ("user", "{content}")]
     )
-    chain = prompt_template | llm | StrOutputParser()
-    return chain.invoke({"query": query, "content": content_chunk})
+    return _invoke_chain(llm, prompt_template, {"query": query, "content": content_chunk})
 
 
-def _generate_final_summary(llm, query, chunk_summaries, excluded_info):
+def _generate_final_summary(llm, query, chunk_summaries, excluded_info, artifact_table=""):
     """Generate final comprehensive summary from all chunk summaries."""
     # Build filtering instructions based on config
     filtering_rules = []
@@ -258,7 +433,7 @@ def _generate_final_summary(llm, query, chunk_summaries, excluded_info):
     Output Format:
     1. Input Query: {{query}}
     2. Source Links Referenced for Analysis - comprehensive list from all chunks
-    3. Investigation Artifacts - all artifacts identified across all chunks (deduplicated)
+    3. Investigation Artifacts - the VALIDATED ARTIFACTS table, which is authoritative: report its values exactly as listed, resolve references like [A3] in the analyses to its rows, and add the context the analyses give for them. Do not add addresses or identifiers that are not in the table
     4. Key Insights - 5-7 high-level insights synthesized from all chunks
     5. Excluded Content - {excluded_info if excluded_info else "None"}
     6. Next Steps - actionable investigation steps and suggested queries
@@ -266,21 +441,67 @@ def _generate_final_summary(llm, query, chunk_summaries, excluded_info):
     Format your response in a structured way with clear section headings.
     """
     
-    combined_analysis = "\n\n".join(chunk_summaries)
+    combined_analysis = _with_artifacts("\n\n".join(chunk_summaries), artifact_table)
     
     prompt_template = ChatPromptTemplate(
         [("system", system_prompt), ("user", "{analysis}")]
     )
-    chain = prompt_template | llm | StrOutputParser()
-    return chain.invoke({"query": query, "analysis": combined_analysis})
+    return _invoke_chain(llm, prompt_template, {"query": query, "analysis": combined_analysis})
+
+
+def _with_artifacts(content, artifact_table):
+    """Put the locally validated artifact table in front of the LLM input."""
+    if not artifact_table:
+        return content
+    return (
+        "--- VALIDATED ARTIFACTS (extracted and checksum-verified locally; authoritative, "
+        "report them as listed. In the text below each one appears as its ref, e.g. [A3]) ---\n"
+        f"{artifact_table}\n\n{content}"
+    )
+
+
+# Lines main.py / ui.py put around the page texts: URL headers, section headers and mirror lists
+SOURCE_LINE_RE = re.compile(r"^(--- .* ---|\(Same content also at: .*\))$", re.MULTILINE)
+
+
+def _mask_page_text(content, artifacts):
+    """
+    mask_artifacts over the page texts of content only. URL headers, mirror
+    lists and the EXCLUDED sections are the sources the report cites, so
+    their addresses are kept as they are.
+    """
+    if not artifacts:
+        return content
+    parts = SOURCE_LINE_RE.split(content)
+    excluded = False
+    for i in range(0, len(parts), 2):
+        if i:
+            excluded = parts[i - 1].startswith("--- EXCLUDED") or (
+                excluded and not parts[i - 1].startswith("--- ")
+            )
+        if not excluded:
+            parts[i] = mask_artifacts(parts[i], artifacts)
+    return "".join(parts)
 
 
-def generate_summary(llm, query, content, max_chunk_size=50000):
+def generate_summary(llm, query, content, max_chunk_tokens=None, artifacts=None):
     """
     Generate intelligence summary, automatically chunking large content to avoid token limits.
+    max_chunk_tokens defaults to what fits in one call for the LLM's model, so
+    content is only split when the model's context window requires it.
+    artifacts (ScrapeResults.artifacts) are the validated artifacts of the full
+    pages. They are given to the report as a table, and replaced in the page
+    texts of content by their table reference, so the model takes them from the table instead
+    of re-reading them from the excerpts.
     """
+    if max_chunk_tokens is None:
+        max_chunk_tokens = _chunk_token_budget(llm)
+    artifact_table = format_artifact_table(artifacts or [])
+    content = _mask_page_text(content, artifacts or [])
+    content_tokens = estimate_tokens(content)
+
     # Check if content needs chunking
-    if len(content) <= max_chunk_size:
+    if content_tokens + estimate_tokens(artifact_table) <= max_chunk_tokens:
         # Small enough to process in one go - use original method
         filtering_rules = []
         
@@ -309,8 +530,8 @@ def generate_summary(llm, query, content, max_chunk_size=50000):
         1. Analyze the Darkweb OSINT data provided using links and their raw text.
         2. Output the Source Links referenced for the analysis.
         3. Provide a detailed, contextual, evidence-based technical analysis of the data.
-        4. Provide intellgience artifacts along with their context visible in the data.
-        5. The artifacts can include indicators like name, email, phone, cryptocurrency addresses, domains, darkweb markets, forum names, threat actor information, malware names, TTPs, etc.
+        4. Addresses, domains, emails, PGP keys and Telegram handles were extracted and validated beforehand. The VALIDATED ARTIFACTS table is authoritative: report its values exactly as listed and do not add addresses or identifiers that are not in it. In the text they appear as references like [A3] to its rows.
+        5. Give the context the data provides for each artifact, and name the darkweb markets, forums, threat actors, malware and TTPs it mentions.
         6. Generate 3-5 key insights based on the data.
         7. Each insight should be specific, actionable, context-based, and data-driven.
         8. Include suggested next steps and queries for investigating more on the topic.
@@ -320,7 +541,7 @@ def generate_summary(llm, query, content, max_chunk_size=50000):
         Output Format:
         1. Input Query: {{query}}
         2. Source Links Referenced for Analysis - this heading will include all source links used for the analysis
-        3. Investigation Artifacts - this heading will include all technical artifacts identified including name, email, phone, cryptocurrency addresses, domains, darkweb markets, forum names, threat actor information, malware names, etc.
+        3. Investigation Artifacts - this heading will include the validated artifacts as listed in the table, with their context, followed by the darkweb markets, forum names, threat actors and malware names found in the data.
         4. Key Insights
         5. Excluded Content - this section lists any content, links, or data that was explicitly excluded from the analysis with reasons why they were excluded (e.g., not safe for work content, irrelevant results, inaccessible links, malformed data, blocked keywords, etc.). Include a disclaimer: "⚠️ DISCLAIMER: The following items were excluded from analysis. Exercise extreme caution if investigating these sources independently, as they may contain harmful, illegal, or disturbing content."
         6. Next Steps - this includes next investigative steps including search queries to search more on a specific artifacts for example or any other topic.
@@ -332,11 +553,15 @@ def generate_summary(llm, query, content, max_chunk_size=50000):
         prompt_template = ChatPromptTemplate(
             [("system", system_prompt), ("user", "{content}")]
         )
-        chain = prompt_template | llm | StrOutputParser()
-        return chain.invoke({"query": query, "content": content})
+        return _invoke_chain(
+            llm, prompt_template, {"query": query, "content": _with_artifacts(content, artifact_table)}
+        )
     
     # Content is too large - use chunking approach
-    print(f"\n[INFO] Content size ({len(content)} chars) exceeds limit. Processing in chunks...")
+    print(
+        f"\n[INFO] Content size (~{content_tokens} tokens) exceeds the "
+        f"{max_chunk_tokens}-token budget. Processing in chunks..."
+    )
     
     # Separate excluded info from main content
     excluded_info = ""
@@ -347,18 +572,14 @@ def generate_summary(llm, query, content, max_chunk_size=50000):
         excluded_info = "--- EXCLUDED" + parts[1]
     
     # Split content into chunks
-    chunks = _chunk_content(main_content, max_chunk_size)
+    chunks = _chunk_content(main_content, max_chunk_tokens)
     print(f"[INFO] Split into {len(chunks)} chunks for processing")
     
-    # Process each chunk
-    chunk_summaries = []
-    for i, chunk in enumerate(chunks, 1):
-        print(f"[INFO] Processing chunk {i}/{len(chunks)}...")
-        summary = _generate_chunk_summary(llm, query, chunk, i, len(chunks))
-        chunk_summaries.append(summary)
+    # Process the chunks concurrently; summaries come back in chunk order
+    chunk_summaries = _map_chunks(llm, query, chunks)
     
     # Generate final comprehensive summary
     print(f"[INFO] Generating final comprehensive report...")
-    final_summary = _generate_final_summary(llm, query, chunk_summaries, excluded_info)
+    final_summary = _generate_final_summary(llm, query, chunk_summaries, excluded_info, artifact_table)
     
     return final_summary
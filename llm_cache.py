@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from config import (
+    ROBIN_CACHE_DIR,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_MB,
+)
+
+
+# LLM attributes that change the answer; anything else (keys, clients, callbacks) is left out of the key
+IDENTITY_FIELDS = (
+    "model_name", "model", "temperature", "top_p", "top_k", "max_tokens", "max_output_tokens",
+    "num_ctx", "num_predict", "seed", "reasoning_effort",
+)
+
+
+def llm_identity(llm):
+    """Class, model name and generation parameters of an LLM instance, as a JSON-friendly dict."""
+    identity = {"class": type(llm).__name__}
+    for name in IDENTITY_FIELDS:
+        value = getattr(llm, name, None)
+        if isinstance(value, (str, int, float, bool)):
+            identity[name] = value
+    return identity
+
+
+def cache_key(llm, messages):
+    """
+    Content address of an LLM call: a hash of the model, its parameters and
+    the rendered prompt messages.
+    """
+    payload = {
+        "llm": llm_identity(llm),
+        "messages": [(message.type, message.content) for message in messages],
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-backed cache of LLM responses keyed by cache_key().
+
+    Entries expire after ttl seconds and the stored text is kept under
+    max_bytes by evicting the least recently used rows. Hit/miss counters are
+    kept for the current process and accumulated on disk.
+    """
+
+    def __init__(self, path, ttl=LLM_CACHE_TTL, max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def _count(self, name):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key):
+        """Return the cached response text, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                self._count("hits")
+                return row[0]
+            if row:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.misses += 1
+            self._count("misses")
+            return None
+
+    def put(self, key, model, response):
+        """Store a response and evict least recently used rows beyond max_bytes."""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if total > self.max_bytes:
+                # Oldest-accessed rows first, until the running total fits again
+                excess = total - self.max_bytes
+                freed = 0
+                stale = []
+                for row_key, row_size in self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed ASC"
+                ):
+                    if freed >= excess:
+                        break
+                    stale.append((row_key,))
+                    freed += row_size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Hit/miss counters for this process and since the cache was created."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            totals = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the process-wide LLM response cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(os.path.join(ROBIN_CACHE_DIR, "llm_cache.sqlite3"))
+        return _cache
@@ -0,0 +1,243 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from config import (
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF,
+    LLM_MAX_RETRY_WAIT,
+)
+
+# HTTP statuses worth retrying: rate limits, overload and transient server errors
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+THROTTLE_STATUSES = {429, 529}
+# Exception class names used by the provider SDKs for throttling and transient failures
+THROTTLE_NAMES = ("RateLimit", "ResourceExhausted", "TooManyRequests", "Overloaded")
+TRANSIENT_NAMES = ("Timeout", "Connection", "ServiceUnavailable", "InternalServer", "ServerError")
+# Local models are not metered by anyone
+UNMETERED_PROVIDERS = {"ollama"}
+
+
+def provider_of(llm):
+    """Provider name of a LangChain chat model: openai, anthropic, google, ollama or its class name."""
+    module = type(llm).__module__
+    for provider in ("openai", "anthropic", "google", "ollama"):
+        if provider in module:
+            return provider
+    return type(llm).__name__.lower()
+
+
+def _status_code(exc):
+    for source in (exc, getattr(exc, "response", None)):
+        for name in ("status_code", "code", "status"):
+            value = getattr(source, name, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def is_rate_limit_error(exc):
+    """True if exc is a provider telling us to slow down (HTTP 429/529 or an SDK rate-limit error)."""
+    return (
+        _status_code(exc) in THROTTLE_STATUSES
+        or any(name in type(exc).__name__ for name in THROTTLE_NAMES)
+    )
+
+
+def is_retryable_error(exc):
+    if is_rate_limit_error(exc) or _status_code(exc) in RETRY_STATUSES:
+        return True
+    if getattr(exc, "is_retryable", False):
+        return True
+    return any(name in type(exc).__name__ for name in TRANSIENT_NAMES)
+
+
+def retry_after(exc):
+    """Seconds the provider asked us to wait (Retry-After / retry-after-ms headers), or None."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(0.0, float(value) / 1000)
+        value = headers.get("retry-after")
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Allows `per_minute` units per minute with bursts up to the same amount.
+    A rate of 0 means unlimited. Usage reported after the fact can take the
+    bucket below zero, which delays later callers until it refills.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount can be taken (0 if it can be taken now)."""
+        if not self.per_minute:
+            return 0.0
+        self._refill(now)
+        # A single request larger than the whole bucket only waits for a full bucket
+        needed = min(amount, self.per_minute) - self.tokens
+        return max(0.0, needed * 60 / self.per_minute)
+
+    def take(self, amount, now):
+        if self.per_minute:
+            self._refill(now)
+            self.tokens -= amount
+
+
+class _ProviderState:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        self.retries = 0
+
+
+class LLMScheduler:
+    """
+    Paces LLM calls per provider so parallel summaries use the quota without tripping it.
+
+    Each provider has token buckets for requests and tokens per minute and a
+    cap on calls in flight; a call waits until all three allow it. A call that
+    is throttled (429/529) or fails transiently is retried with a jittered
+    exponential backoff, or after the provider's Retry-After if it sent one.
+    A throttled provider is paused for every caller, not just the one that
+    hit the limit.
+    """
+
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 max_concurrency=LLM_MAX_CONCURRENCY, max_retries=LLM_MAX_RETRIES,
+                 retry_backoff=LLM_RETRY_BACKOFF, max_retry_wait=LLM_MAX_RETRY_WAIT):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_wait = max_retry_wait
+        self._providers = {}
+        self._cond = threading.Condition()
+
+    def _state(self, provider):
+        state = self._providers.get(provider)
+        if state is None:
+            metered = provider not in UNMETERED_PROVIDERS
+            state = self._providers[provider] = _ProviderState(
+                self.requests_per_minute if metered else 0,
+                self.tokens_per_minute if metered else 0,
+            )
+        return state
+
+    def _acquire(self, provider, tokens):
+        with self._cond:
+            state = self._state(provider)
+            while True:
+                now = time.monotonic()
+                if state.in_flight < self.max_concurrency:
+                    wait = max(
+                        state.paused_until - now,
+                        state.requests.wait_time(1, now),
+                        state.tokens.wait_time(tokens, now),
+                    )
+                    if wait <= 0:
+                        state.requests.take(1, now)
+                        state.tokens.take(tokens, now)
+                        state.in_flight += 1
+                        return
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _release(self, provider, extra_tokens=0, pause=0.0):
+        with self._cond:
+            state = self._state(provider)
+            state.in_flight -= 1
+            now = time.monotonic()
+            state.tokens.take(extra_tokens, now)
+            if pause:
+                state.paused_until = max(state.paused_until, now + pause)
+            self._cond.notify_all()
+
+    def call(self, provider, fn, tokens=0, output_tokens=None, can_retry=None):
+        """
+        Run fn() under the provider's limits and return its result.
+        tokens is the estimated prompt size; output_tokens(result), if given,
+        estimates the answer size so it is charged to the token bucket too.
+        can_retry(), if given, is asked after a failure whether the call may be
+        repeated (e.g. not once part of a streamed answer has been shown).
+        This is the only place LLM calls are retried; the clients are built
+        with max_retries=0.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire(provider, tokens)
+            try:
+                result = fn()
+            except Exception as exc:
+                if attempt == self.max_retries or not is_retryable_error(exc) \
+                        or (can_retry is not None and not can_retry()):
+                    self._release(provider)
+                    raise
+                throttled = is_rate_limit_error(exc)
+                delay = retry_after(exc)
+                if delay is None:
+                    delay = random.uniform(0, self.retry_backoff * 2 ** attempt)
+                delay = min(delay, self.max_retry_wait)
+                # Throttling concerns the whole provider; other failures only this call
+                self._release(provider, pause=delay if throttled else 0.0)
+                with self._cond:
+                    state = self._state(provider)
+                    state.retries += 1
+                    state.throttled += throttled
+                print(
+                    f"[WARN] {provider} call failed ({type(exc).__name__}); "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+                continue
+            self._release(provider, extra_tokens=output_tokens(result) if output_tokens else 0)
+            return result
+
+    def stats(self):
+        with self._cond:
+            return {
+                provider: {"in_flight": s.in_flight, "throttled": s.throttled, "retries": s.retries}
+                for provider, s in self._providers.items()
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler():
+    """Return the process-wide LLM call scheduler, creating it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
@@ -1,5 +1,6 @@
-from config import OLLAMA_BASE_URL
+from config import OLLAMA_BASE_URL, OLLAMA_NUM_CTX
 from typing import Callable, Optional, List
+import re
 import requests
 from urllib.parse import urljoin
 from langchain_openai import ChatOpenAI
@@ -110,6 +111,56 @@ _llm_config_map = {
 }
 
 
+# Context window and the share of it reserved for the model's answer, in tokens.
+# Chunking (llm._chunk_content) packs each call up to the remaining input budget,
+# so large-context models get few calls and small local models are not overflowed.
+# Models missing here (locally installed Ollama models) use _default_token_budget.
+_model_token_budgets = {
+    'gpt-4.1': {'context': 1047576, 'output': 32768},
+    'gpt-5.1': {'context': 400000, 'output': 32768},
+    'gpt-5-mini': {'context': 400000, 'output': 32768},
+    'gpt-5-nano': {'context': 400000, 'output': 32768},
+    'claude-sonnet-4-5': {'context': 200000, 'output': 16384},
+    'claude-sonnet-4-0': {'context': 200000, 'output': 16384},
+    'gemini-2.5-flash': {'context': 1048576, 'output': 32768},
+    'gemini-2.5-flash-lite': {'context': 1048576, 'output': 32768},
+    'gemini-2.5-pro': {'context': 1048576, 'output': 32768},
+    # Ollama allocates memory for the whole context, so local models get OLLAMA_NUM_CTX
+    # (passed as num_ctx) rather than the largest window the weights support
+    'llama3.2': {'context': OLLAMA_NUM_CTX, 'output': 2048},
+    'llama3.1': {'context': OLLAMA_NUM_CTX, 'output': 2048},
+    'gemma3': {'context': OLLAMA_NUM_CTX, 'output': 2048},
+    'deepseek-r1': {'context': OLLAMA_NUM_CTX, 'output': 4096},
+}
+_default_token_budget = {'context': OLLAMA_NUM_CTX, 'output': 2048}
+
+# Word pieces of up to 5 characters and single punctuation marks: close to BPE
+# token counts for URLs, hashes and addresses, and somewhat high for plain prose
+_TOKEN_PIECE_RE = re.compile(r"\w{1,5}|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local estimate of the number of tokens in text (no tokenizer download needed)."""
+    return len(_TOKEN_PIECE_RE.findall(text))
+
+
+def get_token_budget(model_name: str) -> dict:
+    """
+    Return {'context': ..., 'output': ...} for a model choice or a provider model
+    name (e.g. 'llama3.1:latest', 'models/gemini-2.5-pro').
+    """
+    name = _normalize_model_name(model_name or "")
+    name = name.removeprefix("models/")
+    for candidate in (name, name.removesuffix(":latest")):
+        if candidate in _model_token_budgets:
+            return dict(_model_token_budgets[candidate])
+    for key, config in _llm_config_map.items():
+        params = config["constructor_params"]
+        if name in (params.get("model"), params.get("model_name")) and key in _model_token_budgets:
+            return dict(_model_token_budgets[key])
+    return dict(_default_token_budget)
+
+
 def _normalize_model_name(name: str) -> str:
     return name.strip().lower()
 
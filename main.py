@@ -4,11 +4,18 @@ import os
 import sys
 import time
 import atexit
+import multiprocessing
 from yaspin import yaspin
 from datetime import datetime
 from scrape import scrape_multiple
 from search import get_search_results
-from llm import get_llm, refine_query, filter_results, generate_summary
+from content_filter import filter_scraped_content
+from pipeline import stream_search_and_scrape, select_scraped
+from crawl import crawl
+from dedup import collapse_mirrors
+from config import FILTER_SCRAPED_CONTENT, DEDUP_ENABLED, CRAWL_DEPTH, CRAWL_MAX_PAGES
+from tor_pool import configured_endpoints, is_port_open
+from llm import get_llm, refine_query, filter_results, generate_summary, log_llm_cache_stats
 from llm_utils import get_model_choices
 
 MODEL_CHOICES = get_model_choices()
@@ -21,15 +28,13 @@ def start_tor():
     """Start Tor service if not already running."""
     global _tor_process
     
-    # Check if Tor is already running on port 9050
-    import socket
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    result = sock.connect_ex(('127.0.0.1', 9050))
-    sock.close()
-    
-    if result == 0:
-        click.echo("✓ Tor is already running on port 9050")
+    # Check if any configured Tor SOCKS endpoint is already up
+    endpoints = configured_endpoints()
+    running = [f"{host}:{port}" for host, port in endpoints if is_port_open(host, port)]
+    if running:
+        click.echo(f"✓ Tor is already running on {', '.join(running)}")
         return
+    host, port = endpoints[0]
     
     # Find tor executable
     tor_path = os.path.join(os.path.dirname(__file__), "tor", "tor.exe")
@@ -57,13 +62,10 @@ def start_tor():
             creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
         )
         
-        # Wait for Tor to be ready (check port 9050)
+        # Wait for Tor to be ready (check the first SOCKS endpoint)
         for i in range(30):  # Wait up to 30 seconds
             time.sleep(1)
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            result = sock.connect_ex(('127.0.0.1', 9050))
-            sock.close()
-            if result == 0:
+            if is_port_open(host, port):
                 click.echo("✓ Tor service started successfully")
                 click.echo(f"Check {log_file} for Tor connection details")
                 return
@@ -117,7 +119,7 @@ def robin():
     default=5,
     show_default=True,
     type=int,
-    help="Number of threads to use for scraping (Default: 5)",
+    help="Number of threads to use for scraping; search queries all engines at once (Default: 5)",
 )
 @click.option(
     "--output",
@@ -125,12 +127,40 @@ def robin():
     type=str,
     help="Filename to save the final intelligence summary. If not provided, a filename based on the current date and time is used.",
 )
-def cli(model, query, threads, output):
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Scrape search results as they arrive instead of waiting for every search engine first",
+)
+@click.option(
+    "--rotate",
+    is_flag=True,
+    default=False,
+    help="Switch Tor circuits through the control port when scraping gets slow or error-prone",
+)
+@click.option(
+    "--crawl-depth",
+    default=CRAWL_DEPTH,
+    show_default=True,
+    type=int,
+    help="Follow same-site links this many clicks deep from each selected result (0 = no crawling)",
+)
+@click.option(
+    "--crawl-pages",
+    default=CRAWL_MAX_PAGES,
+    show_default=True,
+    type=int,
+    help="Maximum pages to scrape in crawl mode, including the selected results (which are always scraped)",
+)
+def cli(model, query, threads, output, stream, rotate, crawl_depth, crawl_pages):
     """Run Robin in CLI mode.\n
     Example commands:\n
     - robin -m gpt4o -q "ransomware payments" -t 12\n
     - robin --model claude-3-5-sonnet-latest --query "sensitive credentials exposure" --threads 8 --output filename\n
     - robin -m llama3.1 -q "zero days"\n
+    - robin -m gpt-4.1 -q "initial access brokers" --stream\n
+    - robin -m gpt-4.1 -q "carding forums" --crawl-depth 2 --crawl-pages 40\n
     """
     # Start Tor service
     start_tor()
@@ -141,19 +171,49 @@ def cli(model, query, threads, output):
     with yaspin(text="Processing...", color="cyan") as sp:
         refined_query = refine_query(llm, query)
 
-        search_results = get_search_results(
-            refined_query.replace(" ", "+"), max_workers=threads
-        )
+        if stream:
+            # Pages are fetched while slower engines are still answering,
+            # the LLM then picks which of them go into the summary
+            search_results, streamed = stream_search_and_scrape(
+                refined_query.replace(" ", "+"), max_workers=threads, rotate=rotate,
+                query=refined_query,
+            )
+            search_filtered = filter_results(llm, refined_query, search_results)
+        else:
+            search_results = get_search_results(refined_query.replace(" ", "+"))
 
-        search_filtered = filter_results(llm, refined_query, search_results)
+            search_filtered = filter_results(llm, refined_query, search_results)
 
-        scraped_results = scrape_multiple(search_filtered, max_workers=threads)
+        if crawl_depth > 0:
+            # Selected results that were already streamed come from the page store
+            scraped_results = crawl(
+                search_filtered, query=refined_query, max_depth=crawl_depth,
+                max_pages=crawl_pages, max_workers=threads, rotate=rotate,
+            )
+        elif stream:
+            scraped_results = select_scraped(
+                streamed, search_filtered, max_workers=threads, rotate=rotate,
+                query=refined_query,
+            )
+        else:
+            scraped_results = scrape_multiple(
+                search_filtered, max_workers=threads, rotate=rotate, query=refined_query
+            )
+        if FILTER_SCRAPED_CONTENT:
+            scraped_results, excluded_pages = filter_scraped_content(scraped_results)
+            search_results.excluded_content.extend(excluded_pages)
+        if DEDUP_ENABLED:
+            scraped_results = collapse_mirrors(scraped_results)
         sp.ok("✔")
 
     # Convert scraped results dict to formatted string
+    mirrors = getattr(scraped_results, "mirrors", {})
     scraped_content = ""
     for url, content in scraped_results.items():
-        scraped_content += f"\n\n--- URL: {url} ---\n{content}\n"
+        scraped_content += f"\n\n--- URL: {url} ---\n"
+        if mirrors.get(url):
+            scraped_content += f"(Same content also at: {', '.join(mirrors[url])})\n"
+        scraped_content += f"{content}\n"
     
     # Prepare excluded info
     excluded_info = ""
@@ -173,7 +233,10 @@ def cli(model, query, threads, output):
             excluded_info += f"- {exc['link']} ({exc['title'][:50]}...): {exc['reason']}\n"
 
     # Generate the intelligence summary (automatically chunks large datasets)
-    summary = generate_summary(llm, query, scraped_content + excluded_info)
+    summary = generate_summary(
+        llm, query, scraped_content + excluded_info, artifacts=getattr(scraped_results, "artifacts", [])
+    )
+    log_llm_cache_stats()
 
     # Save or print the summary
     if not output:
@@ -231,4 +294,6 @@ def ui(ui_port, ui_host):
 
 
 if __name__ == "__main__":
+    # Extraction workers are spawned; a frozen executable must not rerun the CLI in them
+    multiprocessing.freeze_support()
     robin()
@@ -0,0 +1,191 @@
+import os
+import mmap
+import time
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from config import ROBIN_CACHE_DIR, PAGE_STORE_FRESHNESS, PAGE_STORE_MAX_MB
+
+
+class PageStore:
+    """
+    Local archive of raw page bodies.
+
+    Bodies are zlib-compressed and stored once per content hash under
+    blobs/, so a page that did not change, or is mirrored under several
+    URLs, takes the space of one copy. A SQLite index maps each URL to its
+    latest body hash together with the ETag and Last-Modified headers needed
+    for conditional re-fetches. Pages fetched less than `freshness` seconds
+    ago can be served without a request at all; a body cut short by the
+    size limits is never treated as current.
+
+    The stored bodies are kept under max_bytes (uncompressed) by dropping
+    the least recently fetched URLs and the blobs no URL points to anymore.
+    """
+
+    def __init__(self, root, freshness=PAGE_STORE_FRESHNESS, max_bytes=int(PAGE_STORE_MAX_MB * 1024 * 1024)):
+        self.root = root
+        self.freshness = freshness
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, "blobs")
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(root, "pages.sqlite3"), timeout=10, check_same_thread=False
+        )
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    content_type TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    size INTEGER NOT NULL,
+                    complete INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched ON pages (fetched_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_hash ON pages (hash)")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest[2:])
+
+    def lookup(self, url):
+        """Index entry for a URL as a dict, or None if it was never stored."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash, content_type, etag, last_modified, size, complete, fetched_at "
+                "FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None or not os.path.exists(self._blob_path(row[0])):
+            return None
+        keys = ("hash", "content_type", "etag", "last_modified", "size", "complete", "fetched_at")
+        return dict(zip(keys, row))
+
+    def is_fresh(self, entry):
+        return bool(entry["complete"]) and time.time() - entry["fetched_at"] <= self.freshness
+
+    def conditional_headers(self, entry):
+        """
+        If-None-Match / If-Modified-Since headers for re-fetching a stored page.
+        None for a truncated body: a 304 would only confirm the part we never stored.
+        """
+        headers = {}
+        if not entry["complete"]:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read(self, digest):
+        """Return the raw body stored under a content hash."""
+        with open(self._blob_path(digest), "rb") as f:
+            # Decompress straight from the mapped file instead of reading it into memory first
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return zlib.decompress(mapped)
+
+    def put(self, url, raw, content_type="", etag=None, last_modified=None, complete=True):
+        """Store a body (once per content hash) and point the URL at it. Returns the hash."""
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(raw, 6))
+            os.replace(tmp_path, path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages "
+                "(url, hash, content_type, etag, last_modified, size, complete, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, content_type, etag, last_modified, len(raw), int(complete), time.time()),
+            )
+            self.stored += 1
+            unused = self._evict()
+        for stale in unused:
+            try:
+                os.remove(self._blob_path(stale))
+            except OSError:
+                pass
+        return digest
+
+    def _evict(self):
+        """
+        Drop the least recently fetched URLs until the bodies fit in max_bytes.
+        Call with the lock held; returns the hashes no URL points to anymore.
+        """
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM pages GROUP BY hash)"
+        ).fetchone()
+        unused = []
+        if total <= self.max_bytes:
+            return unused
+        rows = self._conn.execute("SELECT url, hash, size FROM pages ORDER BY fetched_at ASC").fetchall()
+        for url, digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            # A body shared with other URLs only frees space with its last URL
+            if self._conn.execute("SELECT 1 FROM pages WHERE hash = ? LIMIT 1", (digest,)).fetchone() is None:
+                unused.append(digest)
+                total -= size
+        return unused
+
+    def touch(self, url):
+        """Mark a stored page as just confirmed unchanged (a 304 answer)."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def count_hit(self, revalidated=False):
+        with self._lock:
+            if revalidated:
+                self.revalidated += 1
+            else:
+                self.fresh_hits += 1
+
+    def iter_pages(self):
+        """Yield (url, content_type, raw body) for every stored page, e.g. to re-analyze an archive."""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, hash, content_type FROM pages").fetchall()
+        for url, digest, content_type in rows:
+            try:
+                yield url, content_type, self.read(digest)
+            except (OSError, ValueError, zlib.error):
+                continue
+
+    def stats(self):
+        with self._lock:
+            (pages,) = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+            (blobs,) = self._conn.execute("SELECT COUNT(DISTINCT hash) FROM pages").fetchone()
+            return {
+                "pages": pages,
+                "blobs": blobs,
+                "fresh_hits": self.fresh_hits,
+                "revalidated": self.revalidated,
+                "stored": self.stored,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_page_store():
+    """Return the process-wide page store, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PageStore(os.path.join(ROBIN_CACHE_DIR, "pages"))
+        return _store
@@ -0,0 +1,49 @@
+from scrape import scrape_multiple
+from search import ResultCollector, iter_search_results
+from config import STREAM_MAX_PAGES
+
+
+def stream_search_and_scrape(refined_query, max_workers=5, max_pages=STREAM_MAX_PAGES, rotate=False, query=None):
+    """
+    Run search and scrape as one streaming stage instead of two barriers.
+
+    Each search result accepted by the ResultCollector goes straight into the
+    scrape pool while slower engines are still answering. scrape_multiple
+    bounds the pages in flight, which in turn stops this generator from being
+    read further, so a burst of results cannot flood the Tor client. At most
+    max_pages results are scraped (0 = no limit); later results are still
+    collected so the caller sees the full search result list.
+
+    query is passed to scrape_multiple for passage selection.
+
+    Returns (search_results, scraped_results) in the same shapes as
+    get_search_results and scrape_multiple.
+    """
+    collector = ResultCollector()
+
+    def accepted_results():
+        queued = 0
+        for result_data in iter_search_results(refined_query):
+            for res in collector.add(result_data):
+                if max_pages and queued >= max_pages:
+                    continue
+                queued += 1
+                yield res
+
+    scraped_results = scrape_multiple(
+        accepted_results(), max_workers=max_workers, rotate=rotate, query=query
+    )
+    return collector.results, scraped_results
+
+
+def select_scraped(scraped_results, selected, max_workers=5, rotate=False, query=None):
+    """
+    Return scraped content for the selected results in selection order,
+    scraping any selected result the streaming stage did not reach.
+    """
+    missing = [res for res in selected if res["link"] not in scraped_results]
+    if missing:
+        scraped_results = scraped_results.subset(list(scraped_results)).merge(scrape_multiple(
+            missing, max_workers=max_workers, rotate=rotate, query=query
+        ))
+    return scraped_results.subset([res["link"] for res in selected])
@@ -0,0 +1,140 @@
+import re
+import math
+from collections import Counter
+from config import PASSAGE_CHARS
+
+TOKEN_RE = re.compile(r"\w+")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+# Too common to tell passages apart
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the "
+    "this to was were will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords and single characters."""
+    return [
+        t for t in TOKEN_RE.findall(text.lower())
+        if len(t) > 1 and t not in STOPWORDS
+    ]
+
+
+class BM25:
+    """
+    Okapi BM25 over a fixed list of documents, each given as a token list.
+
+    k1 controls how quickly repeated terms stop adding to the score, b how
+    strongly long documents are penalized.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(doc) for doc in documents]
+        self.doc_lengths = [len(doc) for doc in documents]
+        count = len(documents)
+        self.avg_length = sum(self.doc_lengths) / count if count else 0.0
+        doc_freqs = Counter()
+        for freqs in self.term_freqs:
+            doc_freqs.update(freqs.keys())
+        # Non-negative IDF variant, so terms present in most documents still count a little
+        self.idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def score(self, query_tokens, index):
+        """BM25 score of document `index` for the query."""
+        freqs = self.term_freqs[index]
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[index] / (self.avg_length or 1))
+        total = 0.0
+        for term in set(query_tokens):
+            tf = freqs.get(term)
+            if tf:
+                total += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return total
+
+    def scores(self, query_tokens):
+        """Scores of all documents, in document order."""
+        return [self.score(query_tokens, i) for i in range(len(self.term_freqs))]
+
+
+def split_passages(text, passage_chars=PASSAGE_CHARS):
+    """
+    Split text into passages of about passage_chars characters, breaking
+    at sentence ends where possible and at spaces otherwise.
+    """
+    passages = []
+    current = ""
+    for sentence in SENTENCE_END_RE.split(text):
+        while len(sentence) > passage_chars:
+            cut = sentence.rfind(" ", 0, passage_chars)
+            cut = cut if cut > 0 else passage_chars
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > passage_chars:
+            passages.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current.strip():
+        passages.append(current)
+    return passages
+
+
+def select_passages(text, query, max_chars, passage_chars=PASSAGE_CHARS, separator=" ... "):
+    """
+    Return the passages of text that best match query, within max_chars.
+
+    Passages are ranked with BM25 against the query and taken best first
+    until the budget is used, then put back in page order. Without query
+    terms, or when no passage matches, the leading passages are kept, which
+    is the same as plain truncation.
+    """
+    if len(text) <= max_chars:
+        return text
+    passages = split_passages(text, passage_chars)
+    query_tokens = tokenize(query or "")
+    scores = BM25([tokenize(p) for p in passages]).scores(query_tokens) if query_tokens else []
+    ranked = sorted(
+        (i for i, s in enumerate(scores) if s > 0),
+        key=lambda i: (-scores[i], i),
+    )
+    if not ranked:
+        return text[:max_chars]
+
+    chosen = []
+    used = 0
+    for i in ranked:
+        cost = len(passages[i]) + (len(separator) if chosen else 0)
+        if used + cost > max_chars:
+            continue
+        chosen.append(i)
+        used += cost
+    if not chosen:
+        # Even the best passage is over budget
+        return passages[ranked[0]][:max_chars]
+    return separator.join(passages[i] for i in sorted(chosen))
+
+
+def shortlist_results(query, results, top_k):
+    """
+    Keep the top_k search results (dicts with "title" and "link") that best
+    match the query by BM25 over their title and URL words, best first.
+    Results with equal scores keep their original order, so with no query
+    terms or no matches this is simply the first top_k results.
+    """
+    if len(results) <= top_k:
+        return list(results)
+    query_tokens = tokenize(query or "")
+    if not query_tokens:
+        return list(results[:top_k])
+    scores = BM25(
+        [tokenize(f"{res.get('title', '')} {res.get('link', '')}") for res in results]
+    ).scores(query_tokens)
+    ranked = sorted(range(len(results)), key=lambda i: -scores[i])
+    return [results[i] for i in ranked[:top_k]]
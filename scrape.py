@@ -1,8 +1,38 @@
+import re
+import time
+import zlib
+import codecs
+import sqlite3
 import random
-import requests
 import threading
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+import multiprocessing
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from session_pool import get_session_pool, pooled_get
+from tor_pool import tor_get, get_tor_pool
+from extract import get_extractor, extract_bytes
+from ranking import select_passages
+from artifacts import extract_artifacts, compact_text
+from page_store import get_page_store
+from host_scheduler import HostScheduler
+from engine_health import percentile
+from url_utils import get_host
+from config import (
+    TOR_CONTROL_PORT,
+    TOR_CONTROL_PASSWORD,
+    SCRAPE_MAX_BYTES,
+    SCRAPE_MAX_TEXT_CHARS,
+    PARSE_PROCESSES,
+    PASSAGE_BUDGET_CHARS,
+    PASSAGE_BUDGET_TOKENS,
+    PAGE_STORE_ENABLED,
+    SCRAPE_RETRIES,
+    SCRAPE_RETRY_BACKOFF,
+    SCRAPE_HEDGE_PERCENTILE,
+    SCRAPE_DEADLINE,
+)
 
 import warnings
 warnings.filterwarnings("ignore")
@@ -20,60 +50,689 @@ USER_AGENTS = [
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36 Edg/135.0.3179.54"
 ]
 
+# Streaming fetch settings
+CHUNK_SIZE = 16 * 1024
+TEXTUAL_TYPES = ("html", "xml", "json", "javascript")
+CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+# Without a charset in Content-Type, browsers look for <meta charset> in the first 1024 bytes
+META_CHARSET_RE = re.compile(rb"<meta[^>]+?charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+SNIFF_BYTES = 1024
+BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+# Per-request timeout (seconds) and answers worth retrying
+DEFAULT_TIMEOUT = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Completed fetches needed before hedging starts, and the shortest hedge delay (seconds)
+HEDGE_MIN_SAMPLES = 5
+HEDGE_MIN_DELAY = 1.0
+
+# Characters per token when the passage budget is given in tokens
+CHARS_PER_TOKEN = 4
+
 # Global counter and lock for thread-safe Tor rotation
 request_counter = 0
 counter_lock = threading.Lock()
 
-def scrape_single(url_data, rotate=False, rotate_interval=5, control_port=9051, control_password=None):
+# Extraction worker processes, kept alive between scrape_multiple calls
+_parse_pools = {}
+_parse_pool_sizes = {}
+_parse_pools_lock = threading.Lock()
+
+class ScrapeResults(dict):
+    """Custom dict class that can hold additional per-page fetch statistics, extracted artifacts and mirrors."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # URL -> fetch statistics (see fetch_page)
+        self.page_stats = {}
+        # Validated artifacts found in the full page texts (see artifacts.extract_artifacts)
+        self.artifacts = []
+        # Representative URL -> URLs of near-duplicate mirrors dropped in its favour (see dedup.py)
+        self.mirrors = {}
+
+    def refresh_artifacts(self):
+        """Re-run artifact extraction over the full text of the pages in this result."""
+        self.artifacts = extract_artifacts({
+            url: stats.get("text", "") for url, stats in self.page_stats.items() if url in self
+        })
+        return self.artifacts
+
+    def subset(self, urls):
+        """New ScrapeResults with only the given URLs, in that order."""
+        subset = ScrapeResults((url, self[url]) for url in urls if url in self)
+        subset.page_stats = {url: self.page_stats[url] for url in subset if url in self.page_stats}
+        subset.mirrors = {url: mirrors for url, mirrors in self.mirrors.items() if url in subset}
+        subset.refresh_artifacts()
+        return subset
+
+    def merge(self, other):
+        """Add the pages of another result (a ScrapeResults or a plain dict)."""
+        self.update(other)
+        self.page_stats.update(getattr(other, "page_stats", {}))
+        self.mirrors.update(getattr(other, "mirrors", {}))
+        self.refresh_artifacts()
+        return self
+
+
+def get_parse_pool(processes=PARSE_PROCESSES):
+    """Return the shared extraction ProcessPoolExecutor with `processes` workers (None if 0)."""
+    if processes <= 0:
+        return None
+    with _parse_pools_lock:
+        pool = _parse_pools.get(processes)
+        if pool is None:
+            # spawn: forking a process that runs scraping threads is unsafe
+            pool = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+            )
+            _parse_pools[processes] = pool
+            _parse_pool_sizes[pool] = processes
+        return pool
+
+
+def _discard_parse_pool(pool):
+    """Drop a broken pool so the next get_parse_pool starts fresh workers."""
+    with _parse_pools_lock:
+        processes = _parse_pool_sizes.get(pool)
+        if _parse_pools.get(processes) is pool:
+            del _parse_pools[processes]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _current_parse_pool(pool):
+    """pool itself, or the pool that replaced it after its workers broke."""
+    with _parse_pools_lock:
+        processes = _parse_pool_sizes.get(pool)
+    return pool if processes is None else get_parse_pool(processes)
+
+
+def _is_textual(content_type):
+    content_type = content_type.split(";")[0].strip().lower()
+    return not content_type or content_type.startswith("text/") or any(
+        kind in content_type for kind in TEXTUAL_TYPES
+    )
+
+
+def _charset(content_type, head=b""):
     """
-    Scrapes a single URL.
-    If the URL is an onion site, routes the request through Tor.
-    Returns a tuple (url, scraped_text).
+    Encoding of a body: a byte order mark, then the Content-Type charset,
+    then a <meta charset> (or http-equiv) declaration in the first bytes of
+    head, then utf-8.
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    declared = CHARSET_RE.search(content_type)
+    if not declared:
+        declared = META_CHARSET_RE.search(head[:SNIFF_BYTES])
+    if declared:
+        name = declared.group(1)
+        try:
+            return codecs.lookup(name.decode("ascii") if isinstance(name, bytes) else name).name
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return "utf-8"
+
+
+def _extract_raw(raw, content_type, parse_pool=None, max_text_chars=SCRAPE_MAX_TEXT_CHARS):
+    """Extract a complete body, in a worker process when a parse_pool is given. Returns (text, stopped, links)."""
+    encoding = _charset(content_type, raw[:SNIFF_BYTES])
+    if parse_pool is not None:
+        parse_pool = _current_parse_pool(parse_pool)
+        try:
+            return parse_pool.submit(
+                extract_bytes, raw, encoding, max_text_chars=max_text_chars, chunk_size=CHUNK_SIZE
+            ).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory): extract this body here, later ones on new workers
+            _discard_parse_pool(parse_pool)
+    return extract_bytes(raw, encoding, max_text_chars=max_text_chars, chunk_size=CHUNK_SIZE)
+
+
+def _from_store(store, entry, source, parse_pool=None, max_text_chars=SCRAPE_MAX_TEXT_CHARS):
+    """fetch_page result for a body served from the page store."""
+    text, stopped, links = _extract_raw(
+        store.read(entry["hash"]), entry["content_type"], parse_pool, max_text_chars
+    )
+    return {
+        "status": 200,
+        "text": text,
+        "links": links,
+        "content_type": entry["content_type"],
+        "content_length": entry["size"],
+        "bytes_read": 0,
+        "bytes_saved": entry["size"],
+        "truncated": stopped or not entry["complete"],
+        "skipped": False,
+        "oversized": False,
+        "source": source,
+    }
+
+
+def _iter_body(response, max_bytes=None):
+    """
+    Yield the body as it arrives, at most CHUNK_SIZE bytes at a time, so a
+    page trickling in can be stopped between reads. iter_content blocks until
+    a full chunk is in. Errors are raised as the requests exceptions
+    iter_content would raise. No more than max_bytes bytes are yielded.
+    """
+    raw = response.raw
+    if not hasattr(raw, "read1"):
+        # urllib3 before 2.0
+        read = 0
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if max_bytes is not None:
+                chunk = chunk[:max_bytes - read]
+            read += len(chunk)
+            if chunk:
+                yield chunk
+            if max_bytes is not None and read >= max_bytes:
+                return
+        return
+    read = 0
+    while max_bytes is None or read < max_bytes:
+        size = CHUNK_SIZE if max_bytes is None else min(CHUNK_SIZE, max_bytes - read)
+        try:
+            chunk = raw.read1(size, decode_content=True)
+        except ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e)
+        if not chunk:
+            return
+        # A decompressed read can come out longer than asked for
+        if max_bytes is not None:
+            chunk = chunk[:max_bytes - read]
+        read += len(chunk)
+        yield chunk
+
+
+def fetch_page(url, headers, timeout=DEFAULT_TIMEOUT, max_bytes=SCRAPE_MAX_BYTES, max_text_chars=SCRAPE_MAX_TEXT_CHARS,
+               parse_pool=None, store=None, isolation=None, circuit=None, deadline=None, cancel=None):
+    """
+    Fetch a page as a stream and extract its text incrementally with the
+    HTML_EXTRACTOR engine (script, style and page chrome are dropped).
+
+    Content-Type and Content-Length are checked before the body is read:
+    non-text responses are skipped, and a body that declares more than
+    max_bytes is flagged "oversized" (only its first max_bytes are read).
+    The download stops as soon as max_text_chars characters of text have
+    been extracted or max_bytes bytes have been read.
+
+    With a parse_pool (ProcessPoolExecutor), the body is downloaded up to
+    max_bytes and extraction runs in a worker process, so the calling
+    thread holds the GIL only for network I/O.
+
+    With a store (PageStore), a page stored within its freshness window is
+    served without a request, an older copy is re-fetched with
+    If-None-Match / If-Modified-Since and reused on 304, and new bodies are
+    saved to the store.
+
+    isolation gives an onion request its own Tor circuit (see TorInstance.proxies);
+    circuit=(control_port, control_password) reports it for circuit rotation.
+
+    The download also stops, as truncated, once deadline (a time.monotonic()
+    value) passes or the cancel Event is set.
+
+    Returns a dict with "status", "text", "links" ([(href, anchor text)]), "content_type", "content_length",
+    "bytes_read", "bytes_saved" (known unread bytes), "truncated", "skipped",
+    "oversized" and "source" ("network", "store" or "revalidated").
     """
+    entry = store.lookup(url) if store is not None else None
+    if entry and store.is_fresh(entry):
+        try:
+            stats = _from_store(store, entry, "store", parse_pool, max_text_chars)
+            store.count_hit()
+            return stats
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"[DEBUG] Stored copy of {url} is unreadable, re-fetching: {e}")
+            entry = None
+    if entry:
+        headers = {**headers, **store.conditional_headers(entry)}
+
+    if ".onion" in url:
+        response = tor_get(url, isolation=isolation, circuit=circuit, headers=headers, timeout=timeout, stream=True)
+    else:
+        response = pooled_get(url, headers=headers, timeout=timeout, stream=True)
+    content_type = response.headers.get("Content-Type", "")
+    content_length = response.headers.get("Content-Length", "")
+    content_length = int(content_length) if content_length.isdigit() else None
+    stats = {
+        "status": response.status_code,
+        "text": "",
+        "links": [],
+        "content_type": content_type,
+        "content_length": content_length,
+        "bytes_read": 0,
+        "bytes_saved": 0,
+        "truncated": False,
+        "skipped": False,
+        "oversized": content_length is not None and content_length > max_bytes,
+        "source": "network",
+    }
+    try:
+        if response.status_code == 304 and entry:
+            store.touch(url)
+            store.count_hit(revalidated=True)
+            return _from_store(store, entry, "revalidated", parse_pool, max_text_chars)
+        if response.status_code != 200:
+            return stats
+        if not _is_textual(content_type):
+            stats["skipped"] = True
+            stats["bytes_saved"] = content_length or 0
+            return stats
+        if stats["oversized"]:
+            print(f"[DEBUG] {url} declares {content_length} bytes, reading the first {max_bytes}")
+
+        # Raw bytes are kept for the page store and for extraction in a worker process
+        chunks = [] if store is not None or parse_pool is not None else None
+        collector = decoder = None
+        head = b""
+        if parse_pool is None:
+            collector = get_extractor()
+        for chunk in _iter_body(response, max_bytes):
+            stats["bytes_read"] += len(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+            if collector is not None:
+                if decoder is None:
+                    # The decoder is picked once the first bytes can be sniffed for <meta charset>
+                    head += chunk
+                    if len(head) >= SNIFF_BYTES:
+                        decoder = codecs.getincrementaldecoder(_charset(content_type, head))(errors="replace")
+                        collector.feed(decoder.decode(head))
+                else:
+                    collector.feed(decoder.decode(chunk))
+            if stats["bytes_read"] >= max_bytes or (
+                collector is not None and collector.text_length >= max_text_chars
+            ) or (deadline is not None and time.monotonic() >= deadline) or (
+                cancel is not None and cancel.is_set()
+            ):
+                stats["truncated"] = True
+                break
+        complete = not stats["truncated"]
+        if collector is not None:
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(_charset(content_type, head))(errors="replace")
+                collector.feed(decoder.decode(head, final=complete))
+            elif complete:
+                collector.feed(decoder.decode(b"", final=True))
+
+        if collector is not None:
+            collector.close()
+            stats["text"] = collector.get_text()
+            stats["links"] = collector.get_links()
+        else:
+            stats["text"], stopped, stats["links"] = _extract_raw(b"".join(chunks), content_type, parse_pool, max_text_chars)
+            stats["truncated"] = stats["truncated"] or stopped
+        if stats["truncated"] and content_length:
+            stats["bytes_saved"] = max(0, content_length - stats["bytes_read"])
+
+        if store is not None and chunks:
+            try:
+                store.put(
+                    url, b"".join(chunks), content_type,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                    complete=complete,
+                )
+            except (OSError, sqlite3.Error) as e:
+                print(f"[DEBUG] Could not store {url}: {e}")
+        return stats
+    finally:
+        response.close()
+
+
+def _scrape_page(url_data, rotate=False, rotate_interval=5, control_port=9051, control_password=None,
+                 parse_pool=None, query=None, max_chars=None, store=None,
+                 retries=SCRAPE_RETRIES, retry_backoff=SCRAPE_RETRY_BACKOFF, deadline=None, isolation=None,
+                 cancel=None):
+    """
+    scrape_single that also returns the fetch statistics of the page.
+    With max_chars, the page text is cut down to the passages that best
+    match query (the title is always kept).
+
+    Network errors and 429/5xx answers are retried up to `retries` times
+    after a jittered exponential backoff (a random delay of up to
+    retry_backoff * 2^attempt seconds), but never past `deadline`
+    (time.monotonic() value). isolation selects a separate Tor circuit.
+    Setting the cancel Event stops the download and any further retries.
+    page_stats gets "attempts" and "outcome" ("fetched", "retried" or "failed").
+    """
+    global request_counter
     url = url_data['link']
+    cancel = cancel or threading.Event()
     use_tor = ".onion" in url
-    proxies = None
-    if use_tor:
-        proxies = {
-            "http": "socks5h://127.0.0.1:9050",
-            "https": "socks5h://127.0.0.1:9050"
-        }
     headers = {
         "User-Agent": random.choice(USER_AGENTS)
     }
-    try:
-        response = requests.get(url, headers=headers, proxies=proxies, timeout=30)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "html.parser")
-            scraped_text = url_data['title'] + soup.get_text().replace('\n', ' ').replace('\r', '')
-        else:
-            scraped_text = url_data['title']
-    except:
+    # The Tor pool reports each request to the circuit controller of the tor process that served it
+    circuit = (control_port, control_password) if rotate and use_tor else None
+    if circuit:
+        with counter_lock:
+            request_counter += 1
+            due = rotate_interval and request_counter % rotate_interval == 0
+        if due:
+            for controller in get_tor_pool().circuit_controllers(control_port, control_password):
+                controller.rotate(f"every {rotate_interval} requests")
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        timeout = DEFAULT_TIMEOUT
+        if deadline is not None:
+            timeout = max(1, min(timeout, deadline - started))
+        ok = True
+        retryable = False
+        try:
+            stats = fetch_page(
+                url, headers, timeout=timeout, parse_pool=parse_pool, store=store,
+                isolation=isolation, circuit=circuit, deadline=deadline, cancel=cancel,
+            )
+            retryable = stats["status"] in RETRY_STATUSES
+        except Exception as e:
+            ok = False
+            retryable = isinstance(e, (requests.exceptions.RequestException, OSError))
+            stats = {"error": str(e)}
+        if not retryable or attempt >= retries:
+            break
+        delay = random.uniform(0, retry_backoff * 2 ** attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            break
+        print(f"[DEBUG] Retrying {url} in {delay:.1f}s ({stats.get('error') or stats['status']})")
+        if cancel.wait(delay):
+            break
+        attempt += 1
+
+    stats["attempts"] = attempt + 1
+    if not ok or retryable:
+        stats["outcome"] = "failed"
+    else:
+        stats["outcome"] = "retried" if attempt else "fetched"
+    if stats.get("status") == 200 and stats["text"]:
+        # PGP blocks are long and carry no words worth ranking, keep a reference instead
+        text = compact_text(stats["text"])
+        if max_chars:
+            text = select_passages(text, query, max(0, max_chars - len(url_data['title']) - 1))
+        scraped_text = url_data['title'] + " " + text
+    else:
         scraped_text = url_data['title']
-    
+    if stats.get("truncated") or stats.get("skipped"):
+        print(
+            f"[DEBUG] {'Skipped' if stats['skipped'] else 'Stopped'} {url} after "
+            f"{stats['bytes_read']} bytes ({stats['bytes_saved']} bytes saved)"
+        )
+    return url, scraped_text, stats
+
+
+def scrape_single(url_data, rotate=False, rotate_interval=5, control_port=9051, control_password=None):
+    """
+    Scrapes a single URL.
+    If the URL is an onion site, routes the request through Tor.
+    The body is streamed and the download stops once enough text has been
+    extracted (see fetch_page).
+    With rotate=True, request latency and errors are reported to the circuit
+    controller of the tor process that served them (on control_port, unless
+    TOR_CONTROL_PORTS assigns one), which switches circuits when they degrade;
+    rotate_interval additionally forces a new circuit every N Tor requests
+    across all threads (0 = only on degradation).
+    Returns a tuple (url, scraped_text).
+    """
+    url, scraped_text, _ = _scrape_page(
+        url_data, rotate, rotate_interval, control_port, control_password
+    )
     return url, scraped_text
 
-def scrape_multiple(urls_data, max_workers=5):
+class _InputFeed:
+    """
+    Reads the scrape input on a helper thread, one item at a time and only
+    when asked, so the scrape loop can wait for the next item together with
+    its fetches instead of blocking on a generator that is still searching.
+    """
+
+    _END = object()
+
+    def __init__(self, iterable):
+        self._iter = iter(iterable)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        self.exhausted = False
+
+    def poll(self):
+        """Return the next item if it has arrived, else None (and start reading it)."""
+        if self.pending is None:
+            self.pending = self._executor.submit(next, self._iter, self._END)
+        if not self.pending.done():
+            return None
+        item = self.pending.result()
+        self.pending = None
+        if item is self._END:
+            self.exhausted = True
+            return None
+        return item
+
+    def rest(self):
+        """Remaining items of a list input (the feed must not be read afterwards)."""
+        items = []
+        if self.pending is not None:
+            item = self.pending.result()
+            if item is not self._END:
+                items.append(item)
+        items.extend(self._iter)
+        return items
+
+    def close(self):
+        # A generator blocked on slow search engines is left to finish on its own
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scrape_multiple(urls_data, max_workers=5, max_in_flight=None, rotate=False, parse_processes=PARSE_PROCESSES,
+                    query=None, max_chars=None, use_store=PAGE_STORE_ENABLED, retries=SCRAPE_RETRIES,
+                    hedge_percentile=SCRAPE_HEDGE_PERCENTILE, deadline=SCRAPE_DEADLINE, on_page=None):
     """
     Scrapes multiple URLs concurrently using a thread pool.
+    Pages are scheduled per host (see HostScheduler): hosts are served
+    round-robin, each with at most SCRAPE_PER_HOST_CONCURRENCY pages in
+    flight, and a host that times out or throttles is backed off while the
+    other hosts keep the threads busy.
     
     Parameters:
-      - urls_data: list of URLs to scrape.
-      - max_workers: number of concurrent threads for scraping.
+      - urls_data: iterable of URL dicts to scrape. It is consumed lazily, so a
+        generator that is still producing search results can be passed in.
+      - max_workers: number of concurrent threads for scraping (across all hosts).
+      - max_in_flight: maximum pages queued or being fetched at once
+        (default: 2 * max_workers). The input is not read further while
+        this many pages are pending.
+      - rotate: replace Tor circuits that become slow or error-prone
+        (uses TOR_CONTROL_PORT / TOR_CONTROL_PASSWORD).
+      - parse_processes: worker processes for HTML extraction; the threads
+        then only download (0 = extract in the threads).
+      - query: the refined query. Each page is reduced to the passages that
+        rank highest for it (BM25) instead of its first characters.
+      - max_chars: characters kept per page (default: PASSAGE_BUDGET_CHARS,
+        or PASSAGE_BUDGET_TOKENS estimated tokens when that is set).
+      - use_store: serve and save pages through the local page store
+        (see fetch_page and PAGE_STORE_FRESHNESS).
+      - retries: retries per page for network errors and 429/5xx answers.
+      - hedge_percentile: once a fetch has taken longer than this percentile
+        of the fetch times seen so far, a duplicate request is sent on
+        another Tor circuit and the first answer wins (0 = no hedging).
+      - deadline: seconds for the whole stage (0 = none). When it passes,
+        the pages done so far are returned and the rest are marked timed out.
+      - on_page: called as on_page(url, content, page_stats) on the scraping
+        loop's thread as each page finishes, e.g. to feed new URLs to a
+        urls_data generator.
     
     Returns:
-      A dictionary mapping each URL to its scraped content.
+      A ScrapeResults dictionary mapping each URL to its scraped content,
+      with per-page fetch statistics in .page_stats and the validated
+      artifacts found in the full page texts in .artifacts. Each page's "outcome" is
+      "fetched", "retried", "hedged", "failed" or "timed_out".
     """
-    results = {}
-    max_chars = 1200 # Taking first n chars from the scraped data
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {
-            executor.submit(scrape_single, url_data): url_data
-            for url_data in urls_data
-        }
-        for future in as_completed(future_to_url):
-            url, content = future.result()
-            if len(content) > max_chars:
-                content = content[:max_chars]
-            results[url] = content
+    results = ScrapeResults()
+    if max_chars is None:
+        max_chars = PASSAGE_BUDGET_TOKENS * CHARS_PER_TOKEN or PASSAGE_BUDGET_CHARS
+    max_in_flight = max_in_flight or max_workers * 2
+    stop_at = time.monotonic() + deadline if deadline else None
+    feed = _InputFeed(urls_data)
+    # future -> (host, url_data, start time, is_hedge)
+    running = {}
+    # future -> host for losing hedge copies that have been told to stop but not finished yet
+    abandoned = {}
+    # future -> Event that stops its fetch
+    cancels = {}
+    hedged = set()
+    hedge_slots = max(1, max_workers // 2) if hedge_percentile else 0
+    latencies = []
+    scheduler = HostScheduler()
+    parse_pool = get_parse_pool(parse_processes)
+    store = get_page_store() if use_store else None
+    page_kwargs = dict(
+        rotate=rotate, rotate_interval=0,
+        control_port=TOR_CONTROL_PORT, control_password=TOR_CONTROL_PASSWORD,
+        parse_pool=parse_pool, query=query, max_chars=max_chars, store=store, deadline=stop_at,
+    )
+
+    def record(url, content, page_stats):
+        if len(content) > max_chars:
+            content = content[:max_chars]
+        results[url] = content
+        results.page_stats[url] = page_stats
+
+    def submit(url_data, **kwargs):
+        cancel = threading.Event()
+        future = executor.submit(_scrape_page, url_data, cancel=cancel, **kwargs, **page_kwargs)
+        cancels[future] = cancel
+        return future
+
+    # Room for hedged duplicates on top of the regular workers. Abandoned copies
+    # keep their thread until they stop, so nothing is submitted without a free
+    # thread and the start times used for hedging are real.
+    threads = max_workers + hedge_slots
+    executor = ThreadPoolExecutor(max_workers=threads)
+    try:
+        while running or scheduler.queued or not feed.exhausted:
+            now = time.monotonic()
+            if stop_at is not None and now >= stop_at:
+                break
+            while not feed.exhausted and scheduler.queued + len(running) < max_in_flight:
+                url_data = feed.poll()
+                if url_data is None:
+                    break
+                scheduler.add(get_host(url_data['link']), url_data)
+            regular = sum(1 for entry in running.values() if not entry[3])
+            while regular < max_workers and len(running) + len(abandoned) < threads:
+                ready = scheduler.next_ready()
+                if ready is None:
+                    break
+                host, url_data = ready
+                future = submit(url_data, retries=retries)
+                running[future] = (host, url_data, now, False)
+                regular += 1
+
+            hedge_at = None
+            if hedge_slots and len(latencies) >= HEDGE_MIN_SAMPLES:
+                threshold = max(HEDGE_MIN_DELAY, percentile(latencies, hedge_percentile))
+                hedges = len(running) - regular
+                for host, url_data, started, is_hedge in list(running.values()):
+                    url = url_data['link']
+                    if is_hedge or url in hedged:
+                        continue
+                    if now - started < threshold:
+                        remaining = started + threshold - now
+                        hedge_at = remaining if hedge_at is None else min(hedge_at, remaining)
+                        continue
+                    if hedges >= hedge_slots or len(running) + len(abandoned) >= threads \
+                            or not scheduler.acquire(host):
+                        continue
+                    hedged.add(url)
+                    hedges += 1
+                    print(f"[DEBUG] Hedging {url} after {now - started:.1f}s on a new circuit")
+                    future = submit(url_data, retries=0, isolation=f"hedge-{random.getrandbits(32):08x}")
+                    running[future] = (host, url_data, now, True)
+
+            # Wake up for a finished fetch, the next input item, a host coming
+            # out of backoff, a fetch due for hedging or the deadline
+            waiting = set(running) | set(abandoned)
+            if feed.pending is not None and not feed.pending.done():
+                waiting.add(feed.pending)
+            timeouts = [t for t in (scheduler.next_wakeup(), hedge_at) if t is not None]
+            if stop_at is not None:
+                timeouts.append(max(0, stop_at - now))
+            timeout = min(timeouts) if timeouts else None
+            if not waiting:
+                # Nothing to wait on but hosts in backoff (or the input just ran out)
+                wakeup = scheduler.next_wakeup()
+                if wakeup:
+                    time.sleep(min(timeouts))
+                continue
+            done, _ = wait(waiting, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                cancels.pop(future, None)
+                if future in abandoned:
+                    # The losing copy has stopped; only now is its host slot free. Its
+                    # outcome says nothing about the host, so the host is not adapted
+                    scheduler.release(abandoned.pop(future))
+                    continue
+                if future not in running:
+                    continue
+                host, url_data, started, is_hedge = running.pop(future)
+                url, content, page_stats = future.result()
+                ok = page_stats["outcome"] != "failed"
+                scheduler.done(host, ok="error" not in page_stats, status=page_stats.get("status"))
+                twin_running = any(entry[1]['link'] == url for entry in running.values())
+                if not ok and twin_running:
+                    continue
+                if ok:
+                    latencies.append(time.monotonic() - started)
+                    if is_hedge:
+                        page_stats["outcome"] = "hedged"
+                page_stats["hedged"] = url in hedged
+                record(url, content, page_stats)
+                if on_page is not None:
+                    on_page(url, results[url], page_stats)
+                # Stop the losing copy of a hedged request; it counts against its host until it ends
+                for twin in [f for f, entry in running.items() if entry[1]['link'] == url]:
+                    abandoned[twin] = running.pop(twin)[0]
+                    cancels[twin].set()
+    finally:
+        # Fetches still running at the deadline stop at their next chunk
+        # instead of being waited for
+        for cancel in cancels.values():
+            cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        feed.close()
+
+    if running or scheduler.queued:
+        late = [entry[1] for entry in running.values()] + scheduler.drain()
+        if isinstance(urls_data, (list, tuple)):
+            late.extend(feed.rest())
+        finished = len(results)
+        for url_data in late:
+            if url_data['link'] not in results:
+                record(url_data['link'], url_data['title'], {"outcome": "timed_out"})
+        print(f"[DEBUG] Scrape deadline of {deadline}s reached, {finished} pages done, "
+              f"{len(results) - finished} timed out")
+    results.refresh_artifacts()
+    if results.artifacts:
+        print(f"[DEBUG] Extracted {len(results.artifacts)} validated artifacts")
+    outcomes = {}
+    for page_stats in results.page_stats.values():
+        outcomes[page_stats["outcome"]] = outcomes.get(page_stats["outcome"], 0) + 1
+    print(f"[DEBUG] Page outcomes: {outcomes}")
+
+    saved = sum(p.get("bytes_saved", 0) for p in results.page_stats.values())
+    read = sum(p.get("bytes_read", 0) for p in results.page_stats.values())
+    print(f"[DEBUG] Scraped {len(results)} pages: {read} bytes read, {saved} bytes skipped")
+    if store is not None:
+        store_stats = store.stats()
+        print(
+            f"[DEBUG] Page store: {store_stats['fresh_hits']} served fresh, "
+            f"{store_stats['revalidated']} unchanged (304), {store_stats['pages']} pages archived"
+        )
+    stats = get_session_pool().stats()
+    print(
+        f"[DEBUG] Session pool: {stats['requests']} requests, {stats['new_connections']} connections opened, "
+        f"{stats['reuse_rate']:.0%} reused"
+    )
     return results
\ No newline at end of file
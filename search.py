@@ -1,9 +1,24 @@
-import requests
 import random
-import re
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from config import CONTENT_ALLOWLIST, CONTENT_BLOCKLIST
+import queue
+import asyncio
+import time
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import (
+    SEARCH_ENGINE_TIMEOUT,
+    SEARCH_DEADLINE,
+    ENGINE_HEALTH_ENABLED,
+    SEARCH_CACHE_ENABLED,
+    SEARCH_PAGES,
+    MAX_RESULTS_PER_HOST,
+)
+from search_parsers import get_parser
+from url_utils import canonicalize_url, dedup_key, get_host
+from content_filter import check_content_filters
+from tor_pool import tor_get
+from engine_health import get_engine_health
+from search_cache import get_search_cache
 
 import warnings
 warnings.filterwarnings("ignore")
@@ -15,6 +30,8 @@ class SearchResults(list):
         super().__init__(*args, **kwargs)
         self.excluded_services = []
         self.excluded_content = []
+        # Onion host -> number of extra results dropped by the per-host cap
+        self.capped_hosts = {}
 
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36",
@@ -46,104 +63,328 @@ SEARCH_ENGINE_ENDPOINTS = [
     "http://3fzh7yuupdfyjhwt3ugzqqof6ulbcl27ecev33knxe3u7goi3vfn2qqd.onion/oss/index.php?search={query}", # OSS (Onion Search Server)
 ]
 
-def get_tor_proxies():
-    return {
-        "http": "socks5h://127.0.0.1:9050",
-        "https": "socks5h://127.0.0.1:9050"
-    }
-
-def fetch_search_results(endpoint, query):
-    url = endpoint.format(query=query)
+def _fetch_page(url, parser, timeout, isolation=None):
+    """Fetch and parse one result page. Returns (results, error)."""
     headers = {
         "User-Agent": random.choice(USER_AGENTS)
     }
-    proxies = get_tor_proxies()
+    response = tor_get(url, isolation=isolation, headers=headers, timeout=timeout)
+    if response.status_code != 200:
+        return [], f"HTTP {response.status_code}"
+    return parser.parse(response.content), None
+
+
+def fetch_search_results(endpoint, query, timeout=30, isolation=None, pages=SEARCH_PAGES):
+    """
+    Fetch results from one search engine using its registered parser.
+    For engines with pagination, result pages 2..pages are fetched
+    concurrently once the first page has returned results.
+    """
+    url = endpoint.format(query=query)
+    parser = get_parser(endpoint)
+    started = time.monotonic()
     try:
         print(f"[DEBUG] Searching: {url}")
-        response = requests.get(url, headers=headers, proxies=proxies, timeout=30)
-        if response.status_code == 200:
-            # Normally you would parse html_content with BeautifulSoup and extract results.
-            soup = BeautifulSoup(response.text, "html.parser")
-            links = []
-            for a in soup.find_all('a'):
-                try:
-                    href = a['href']
-                    title = a.get_text(strip=True)
-                    link = re.findall(r'https?:\/\/[^\/]*\.onion.*', href)
-                    if len(link) != 0:
-                        links.append({"title": title, "link": link[0]})
-                except Exception:
-                    continue
-            print(f"[DEBUG] Found {len(links)} results from {url}")
-            return {"results": links, "excluded": None}
-        else:
-            print(f"[DEBUG] Failed to fetch {url} - Status: {response.status_code}")
-            return {"results": [], "excluded": {"url": url, "reason": f"HTTP {response.status_code}"}}
+        links, error = _fetch_page(url, parser, timeout, isolation)
+        if error:
+            print(f"[DEBUG] Failed to fetch {url} - Status: {error}")
+            return {"results": [], "excluded": {"url": url, "reason": error}}
     except Exception as e:
         print(f"[DEBUG] Error fetching {url}: {str(e)}")
         return {"results": [], "excluded": {"url": url, "reason": str(e)}}
 
-def check_content_filters(text):
+    page_urls = [parser.page_url(url, page) for page in range(2, pages + 1)]
+    page_urls = [page_url for page_url in page_urls if page_url]
+    # Extra pages share what is left of this engine's timeout
+    remaining = timeout - (time.monotonic() - started)
+    if links and page_urls and remaining > 1:
+        executor = ThreadPoolExecutor(max_workers=len(page_urls))
+        futures = [
+            executor.submit(_fetch_page, page_url, parser, remaining, isolation)
+            for page_url in page_urls
+        ]
+        done, _ = wait(futures, timeout=remaining)
+        executor.shutdown(wait=False, cancel_futures=True)
+        seen = {res["link"] for res in links}
+        for future in futures:
+            if future not in done or future.exception():
+                continue
+            for res in future.result()[0]:
+                if res["link"] not in seen:
+                    seen.add(res["link"])
+                    links.append(res)
+
+    print(f"[DEBUG] Found {len(links)} results from {url}")
+    return {"results": links, "excluded": None}
+
+async def _run_engine(loop, executor, endpoint, query, engine_timeout, hedge_delay):
     """
-    Check if content should be filtered based on allowlist/blocklist.
-    Returns (should_include, reason)
+    Fetch one engine. If hedge_delay is set and the engine has not answered by
+    then, a duplicate request goes out on a separate circuit and the first
+    successful answer wins.
     """
-    text_lower = text.lower()
-    
-    # Check blocklist first - these are always excluded
-    if CONTENT_BLOCKLIST:
-        for blocked_keyword in CONTENT_BLOCKLIST:
-            if blocked_keyword in text_lower:
-                return False, f"Blocked keyword: {blocked_keyword}"
-    
-    # Check allowlist - these override other filters
-    if CONTENT_ALLOWLIST:
-        for allowed_keyword in CONTENT_ALLOWLIST:
-            if allowed_keyword in text_lower:
-                return True, None
-    
-    # Default: include the content
-    return True, None
-
-
-def get_search_results(refined_query, max_workers=5):
-    results = []
-    excluded_services = []
-    excluded_content = []
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(fetch_search_results, endpoint, refined_query)
-                   for endpoint in SEARCH_ENGINE_ENDPOINTS]
-        for future in as_completed(futures):
+    primary = loop.run_in_executor(
+        executor, fetch_search_results, endpoint, query, engine_timeout
+    )
+    if hedge_delay is None or hedge_delay >= engine_timeout:
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+    if done:
+        return primary.result()
+
+    print(f"[DEBUG] Hedging after {hedge_delay:.1f}s: {endpoint.format(query=query)}")
+    hedge = loop.run_in_executor(
+        executor,
+        functools.partial(
+            fetch_search_results, endpoint, query, engine_timeout,
+            isolation=f"hedge-{random.getrandbits(32):08x}",
+        ),
+    )
+    pending = {primary, hedge}
+    result_data = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
             result_data = future.result()
-            results.extend(result_data["results"])
-            if result_data["excluded"]:
-                excluded_services.append(result_data["excluded"])
-
-    # Deduplicate and filter results based on the link and content filters
-    seen_links = set()
-    unique_results = SearchResults()  # Use custom class instead of plain list
-    for res in results:
-        link = res.get("link")
-        title = res.get("title", "")
-        
-        if link in seen_links:
-            continue
-        
-        # Apply content filters
-        should_include, reason = check_content_filters(f"{title} {link}")
-        
-        if should_include:
-            seen_links.add(link)
-            unique_results.append(res)
-        else:
-            excluded_content.append({
-                "title": title,
-                "link": link,
-                "reason": reason
-            })
-    
-    # Store excluded info using the custom class attributes
-    unique_results.excluded_services = excluded_services
-    unique_results.excluded_content = excluded_content
-    return unique_results
\ No newline at end of file
+            if not result_data["excluded"]:
+                return result_data
+    return result_data
+
+
+async def _fetch_with_deadline(
+    loop, executor, semaphore, health, cache, endpoint, query, engine_timeout, hedge_delay=None
+):
+    """Run one engine in the executor, giving up once engine_timeout has elapsed."""
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            result_data = await asyncio.wait_for(
+                _run_engine(loop, executor, endpoint, query, engine_timeout, hedge_delay),
+                timeout=engine_timeout,
+            )
+        except asyncio.TimeoutError:
+            url = endpoint.format(query=query)
+            print(f"[DEBUG] Timed out after {engine_timeout:g}s: {url}")
+            result_data = {
+                "results": [],
+                "excluded": {"url": url, "reason": f"Timed out after {engine_timeout:g}s"},
+            }
+        except asyncio.CancelledError:
+            if health:
+                health.record(endpoint, False, time.monotonic() - started, error="Search deadline reached")
+            raise
+        if health:
+            excluded = result_data["excluded"]
+            health.record(
+                endpoint,
+                excluded is None,
+                time.monotonic() - started,
+                len(result_data["results"]),
+                error=excluded["reason"] if excluded else None,
+            )
+        # Empty pages are not cached so a broken or captcha'd engine is retried next time
+        if cache and result_data["results"] and not result_data["excluded"]:
+            cache.put(endpoint, query, result_data["results"])
+        return result_data
+
+
+async def stream_search_results_async(
+    refined_query,
+    engine_timeout=SEARCH_ENGINE_TIMEOUT,
+    deadline=SEARCH_DEADLINE,
+    max_workers=None,
+):
+    """
+    Query every search engine at once and yield each engine's result dict
+    ({"results": [...], "excluded": ...}) as soon as that engine answers.
+
+    Each engine gets at most engine_timeout seconds and the whole fan-out at
+    most deadline seconds. Engines still pending at the deadline are yielded
+    as excluded. When health tracking is enabled, benched engines are yielded
+    as excluded without being queried, and the fastest healthy engines are
+    hedged. Engines with a fresh entry in the search cache are answered from
+    disk before anything goes out over Tor. max_workers optionally caps how many engines run at once
+    (None = all of them).
+    """
+    cache = get_search_cache() if SEARCH_CACHE_ENABLED else None
+    # Reported however the stage ends, including when every engine was answered from the cache
+    try:
+        endpoints = SEARCH_ENGINE_ENDPOINTS
+        if cache:
+            endpoints = []
+            for endpoint in SEARCH_ENGINE_ENDPOINTS:
+                cached = cache.get(endpoint, refined_query)
+                if cached is None:
+                    endpoints.append(endpoint)
+                    continue
+                print(f"[DEBUG] Cache hit ({len(cached)} results): {endpoint.format(query=refined_query)}")
+                yield {"results": cached, "excluded": None}
+
+        health = get_engine_health() if ENGINE_HEALTH_ENABLED else None
+        hedge_delays = {}
+        if health:
+            endpoints, skipped, hedge_delays = health.plan(endpoints)
+            for endpoint, reason in skipped:
+                yield {
+                    "results": [],
+                    "excluded": {"url": endpoint.format(query=refined_query), "reason": reason},
+                }
+        if not endpoints:
+            return
+
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=len(endpoints) + len(hedge_delays))
+        semaphore = asyncio.Semaphore(max_workers or len(endpoints))
+        # Endpoints are ordered best first, so a max_workers cap favours healthy engines
+        tasks = {
+            asyncio.ensure_future(
+                _fetch_with_deadline(
+                    loop, executor, semaphore, health, cache, endpoint, refined_query,
+                    engine_timeout, hedge_delays.get(endpoint),
+                )
+            ): endpoint
+            for endpoint in endpoints
+        }
+        try:
+            stop_at = loop.time() + deadline
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, stop_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                # Every finished engine is yielded, including several finishing in the same wakeup
+                for task in done:
+                    yield task.result()
+            for task in pending:
+                task.cancel()
+                url = tasks[task].format(query=refined_query)
+                print(f"[DEBUG] Search deadline reached, dropping: {url}")
+                yield {
+                    "results": [],
+                    "excluded": {"url": url, "reason": f"Search deadline of {deadline:g}s reached"},
+                }
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled engines record their outcome before the store is saved
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Worker threads finish on their own once the request timeout expires
+            executor.shutdown(wait=False, cancel_futures=True)
+            if health:
+                health.save()
+    finally:
+        if cache:
+            stats = cache.stats()
+            print(f"[DEBUG] Search cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+
+_STREAM_DONE = object()
+
+
+def iter_search_results(
+    refined_query,
+    engine_timeout=SEARCH_ENGINE_TIMEOUT,
+    deadline=SEARCH_DEADLINE,
+    max_workers=None,
+):
+    """
+    Synchronous generator over stream_search_results_async.
+    The event loop runs in a background thread so callers without a loop
+    (CLI, Streamlit) can consume engine results as they arrive.
+    """
+    results_queue = queue.Queue()
+    errors = []
+
+    def run_loop():
+        async def pump():
+            async for result_data in stream_search_results_async(
+                refined_query, engine_timeout, deadline, max_workers
+            ):
+                results_queue.put(result_data)
+
+        try:
+            asyncio.run(pump())
+        except Exception as e:
+            errors.append(e)
+        finally:
+            results_queue.put(_STREAM_DONE)
+
+    threading.Thread(target=run_loop, daemon=True).start()
+    while True:
+        result_data = results_queue.get()
+        if result_data is _STREAM_DONE:
+            break
+        yield result_data
+    if errors:
+        raise errors[0]
+
+
+class ResultCollector:
+    """
+    Incrementally canonicalizes, deduplicates, caps per onion host and
+    content-filters engine results into a SearchResults list.
+    """
+
+    def __init__(self, max_per_host=MAX_RESULTS_PER_HOST):
+        self.max_per_host = max_per_host
+        self.results = SearchResults()
+        self._seen = set()
+        self._host_counts = {}
+
+    def add(self, result_data):
+        """Add one engine's result dict, returning the results that were accepted."""
+        if result_data["excluded"]:
+            self.results.excluded_services.append(result_data["excluded"])
+
+        accepted = []
+        for res in result_data["results"]:
+            link = canonicalize_url(res.get("link", ""))
+            title = res.get("title", "")
+
+            key = dedup_key(link)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+
+            # Apply content filters
+            should_include, reason = check_content_filters(f"{title} {link}")
+            if not should_include:
+                self.results.excluded_content.append({
+                    "title": title,
+                    "link": link,
+                    "reason": reason
+                })
+                continue
+
+            host = get_host(link)
+            count = self._host_counts.get(host, 0)
+            if self.max_per_host and count >= self.max_per_host:
+                self.results.capped_hosts[host] = self.results.capped_hosts.get(host, 0) + 1
+                continue
+            self._host_counts[host] = count + 1
+
+            res = {**res, "link": link}
+            self.results.append(res)
+            accepted.append(res)
+        return accepted
+
+
+def get_search_results(
+    refined_query,
+    max_workers=None,
+    engine_timeout=SEARCH_ENGINE_TIMEOUT,
+    deadline=SEARCH_DEADLINE,
+):
+    # Deduplicate and filter results as each engine answers
+    collector = ResultCollector()
+    for result_data in iter_search_results(
+        refined_query, engine_timeout, deadline, max_workers
+    ):
+        collector.add(result_data)
+
+    if collector.results.capped_hosts:
+        dropped = sum(collector.results.capped_hosts.values())
+        print(f"[DEBUG] Per-host cap dropped {dropped} results from {len(collector.results.capped_hosts)} hosts")
+    return collector.results
@@ -0,0 +1,134 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from config import (
+    ROBIN_CACHE_DIR,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_MAX_ENTRIES,
+)
+
+
+def normalize_query(query):
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    return re.sub(r"[\s+]+", " ", query).strip().lower()
+
+
+class SearchCache:
+    """
+    SQLite-backed cache of search engine results keyed by (endpoint, normalized query).
+
+    Entries expire after ttl seconds and the table is kept under max_entries by
+    evicting the least recently used rows. Hit/miss counters are kept for the
+    current process and accumulated on disk.
+    """
+
+    def __init__(self, path, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    endpoint TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    PRIMARY KEY (endpoint, query)
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def _count(self, name):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, endpoint, query):
+        """Return the cached result list, or None on a miss or expired entry."""
+        key = (endpoint, normalize_query(query))
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT payload, created FROM results WHERE endpoint = ? AND query = ?", key
+            ).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._conn.execute(
+                    "UPDATE results SET accessed = ? WHERE endpoint = ? AND query = ?",
+                    (now, *key),
+                )
+                self.hits += 1
+                self._count("hits")
+                return json.loads(row[0])
+            if row:
+                self._conn.execute(
+                    "DELETE FROM results WHERE endpoint = ? AND query = ?", key
+                )
+            self.misses += 1
+            self._count("misses")
+            return None
+
+    def put(self, endpoint, query, results):
+        """Store a result list and evict least recently used rows beyond max_entries."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (endpoint, query, payload, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (endpoint, normalize_query(query), json.dumps(results), now, now),
+            )
+            self._conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM results WHERE rowid IN "
+                    "(SELECT rowid FROM results ORDER BY accessed ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results")
+
+    def stats(self):
+        """Hit/miss counters for this process and since the cache was created."""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            totals = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """Return the process-wide search cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchCache(os.path.join(ROBIN_CACHE_DIR, "search_cache.sqlite3"))
+        return _cache
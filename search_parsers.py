@@ -0,0 +1,147 @@
+import re
+from urllib.parse import urlparse, urlencode, parse_qsl, urlunparse, unquote
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Prefer the C-accelerated lxml tree builder, fall back to the stdlib parser
+try:
+    import lxml  # noqa: F401
+    PARSER_BACKEND = "lxml"
+except ImportError:
+    PARSER_BACKEND = "html.parser"
+
+ONION_LINK_RE = re.compile(r"https?://[^/\s\"'<>]*\.onion[^\s\"'<>]*")
+WHITESPACE_RE = re.compile(r"\s+")
+# Query parameters engines use to wrap outgoing links in a redirect
+REDIRECT_PARAMS = ("redirect_url", "url", "u", "q", "target")
+
+
+def _clean_text(text):
+    return WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def extract_onion_link(href):
+    """Return the onion URL an href points to, unwrapping engine redirect links."""
+    if not href:
+        return None
+    parsed = urlparse(href)
+    if parsed.query and ".onion" not in (parsed.hostname or ""):
+        params = dict(parse_qsl(parsed.query))
+        for name in REDIRECT_PARAMS:
+            target = params.get(name)
+            if target and ONION_LINK_RE.match(target):
+                return target
+    match = ONION_LINK_RE.search(unquote(href))
+    return match.group(0) if match else None
+
+
+class EngineParser:
+    """
+    Extracts {"title", "link", "snippet"} results from one search engine's result page.
+
+    result_selector picks one element per result; title, link and snippet
+    selectors are then applied inside it. A parser without result_selector,
+    or one whose selectors find nothing (e.g. after a markup change), falls
+    back to scanning anchors only.
+
+    page_param names the query parameter used for pagination, page N (1-based)
+    is requested as first_page + (N - 1) * page_step.
+    """
+
+    def __init__(
+        self,
+        result_selector=None,
+        title_selector="a",
+        link_selector="a[href]",
+        snippet_selector=None,
+        page_param=None,
+        first_page=1,
+        page_step=1,
+    ):
+        self.result_selector = result_selector
+        self.title_selector = title_selector
+        self.link_selector = link_selector
+        self.snippet_selector = snippet_selector
+        self.page_param = page_param
+        self.first_page = first_page
+        self.page_step = page_step
+
+    def parse(self, html):
+        results = self._parse_structured(html) if self.result_selector else []
+        return results or self._parse_anchors(html)
+
+    def _parse_structured(self, html):
+        soup = BeautifulSoup(html, PARSER_BACKEND)
+        results = []
+        for block in soup.select(self.result_selector):
+            anchor = block.select_one(self.link_selector)
+            link = extract_onion_link(anchor.get("href")) if anchor else None
+            if not link:
+                continue
+            title_el = block.select_one(self.title_selector)
+            snippet_el = block.select_one(self.snippet_selector) if self.snippet_selector else None
+            results.append({
+                "title": _clean_text(title_el.get_text(" ") if title_el else ""),
+                "link": link,
+                "snippet": _clean_text(snippet_el.get_text(" ") if snippet_el else ""),
+            })
+        return results
+
+    def _parse_anchors(self, html):
+        # Only build tree nodes for anchors, the rest of the page is skipped
+        soup = BeautifulSoup(html, PARSER_BACKEND, parse_only=SoupStrainer("a", href=True))
+        results = []
+        for a in soup.find_all("a", href=True):
+            link = extract_onion_link(a["href"])
+            if link:
+                results.append({"title": a.get_text(strip=True), "link": link, "snippet": ""})
+        return results
+
+    def page_url(self, url, page):
+        """URL of result page `page` (1-based), or None if the engine has no pagination."""
+        if not self.page_param or page <= 1:
+            return None
+        parsed = urlparse(url)
+        params = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+                  if k != self.page_param]
+        params.append((self.page_param, str(self.first_page + (page - 1) * self.page_step)))
+        return urlunparse(parsed._replace(query=urlencode(params, safe="+")))
+
+
+GENERIC_PARSER = EngineParser()
+
+# Parsers keyed by engine onion host. Selectors follow each engine's result
+# markup; unknown engines use GENERIC_PARSER.
+PARSER_REGISTRY = {
+    # Ahmia
+    "juhanurmihxlp77nkq76byazcldy2hlmovfu2epvl5ankdibsot4csyd.onion": EngineParser(
+        result_selector="li.result",
+        title_selector="h4 a",
+        link_selector="h4 a[href]",
+        snippet_selector="p",
+        page_param="page",
+        first_page=0,
+    ),
+    # OnionLand
+    "3bbad7fauom4d6sgppalyqddsqbf5u5p56b5k5uk2zxsy3d6ey2jobad.onion": EngineParser(
+        result_selector="div.result-block",
+        title_selector="div.title a",
+        link_selector="div.title a[href]",
+        snippet_selector="div.desc",
+        page_param="page",
+    ),
+    # Tor66
+    "tor66sewebgixwhcqfnp5inzp5x5uohhdy3kvtnyfxc2e5mxiuh34iid.onion": EngineParser(
+        page_param="page",
+    ),
+}
+
+
+def register_parser(host, parser):
+    """Register (or replace) the parser used for a search engine host."""
+    PARSER_REGISTRY[host.lower()] = parser
+
+
+def get_parser(endpoint):
+    """Return the parser for a search engine endpoint URL."""
+    host = (urlparse(endpoint).hostname or "").lower()
+    return PARSER_REGISTRY.get(host, GENERIC_PARSER)
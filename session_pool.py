@@ -0,0 +1,229 @@
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    SESSION_POOL_CONNECTIONS,
+    SESSION_POOL_MAXSIZE,
+    SESSION_POOL_MAX_SESSIONS,
+)
+
+
+def _count_connections(session):
+    """Total connections ever opened by the urllib3 pools behind a session."""
+    total = 0
+    # One adapter is mounted for both schemes, count it once
+    adapters = {id(a): a for a in session.adapters.values()}
+    for adapter in adapters.values():
+        managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+        for manager in managers:
+            if manager is None:
+                continue
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is not None:
+                    total += pool.num_connections
+    return total
+
+
+def _proxy_address(proxy):
+    """"host:port" of a proxy URL, without scheme or credentials."""
+    parts = urlsplit(proxy)
+    return f"{parts.hostname}:{parts.port}"
+
+
+class SessionPool:
+    """
+    Thread-safe pool of keep-alive requests sessions keyed by (proxy, host).
+
+    Requests to the same onion host through the same SOCKS proxy reuse an open
+    connection instead of paying for a new TCP, SOCKS and rendezvous setup.
+    At most max_sessions sessions are kept, least recently used ones are
+    evicted first. A session is only closed once no request is using it: an
+    evicted session that is still busy is closed when its last request
+    (or streamed response) is released.
+    """
+
+    def __init__(
+        self,
+        pool_connections=SESSION_POOL_CONNECTIONS,
+        pool_maxsize=SESSION_POOL_MAXSIZE,
+        max_sessions=SESSION_POOL_MAX_SESSIONS,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._requests = 0
+        # id(session) -> requests currently using it
+        self._users = {}
+        # Sessions removed from the pool while busy, closed on their last release
+        self._retired = {}
+        # Connection counts of sessions that have already been closed
+        self._closed_connections = 0
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=False,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Connection"] = "keep-alive"
+        return session
+
+    def _retire(self, session):
+        """
+        Take a session out of service (lock held). Returns True if it is idle
+        and should be closed now; a busy one is closed by _release.
+        """
+        if self._users.get(id(session)):
+            self._retired[id(session)] = session
+            return False
+        self._closed_connections += _count_connections(session)
+        return True
+
+    def _lookup(self, key, use):
+        """Session for key, created if needed, LRU-evicting beyond max_sessions (lock held)."""
+        to_close = []
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._new_session()
+            self._sessions[key] = session
+        else:
+            self._sessions.move_to_end(key)
+        if use:
+            self._users[id(session)] = self._users.get(id(session), 0) + 1
+        while len(self._sessions) > self.max_sessions:
+            _, old = self._sessions.popitem(last=False)
+            if self._retire(old):
+                to_close.append(old)
+        return session, to_close
+
+    def _release(self, session):
+        with self._lock:
+            count = self._users.get(id(session), 1) - 1
+            if count > 0:
+                self._users[id(session)] = count
+                return
+            self._users.pop(id(session), None)
+            retired = self._retired.pop(id(session), None)
+            if retired is not None:
+                self._closed_connections += _count_connections(retired)
+        if retired is not None:
+            retired.close()
+
+    def get_session(self, proxy, host):
+        """Return the session for a (proxy, host) pair, creating it if needed."""
+        with self._lock:
+            session, to_close = self._lookup((proxy, host), use=False)
+        for old in to_close:
+            old.close()
+        return session
+
+    def request(self, method, url, proxies=None, **kwargs):
+        """
+        Send a request on the pooled session for its (proxy, host). The session
+        counts as in use until the request returns or, with stream=True, until
+        the response is closed.
+        """
+        parts = urlsplit(url)
+        proxy = (proxies or {}).get(parts.scheme)
+        with self._lock:
+            session, to_close = self._lookup((proxy, (parts.hostname or "").lower()), use=True)
+            self._requests += 1
+        for old in to_close:
+            old.close()
+        try:
+            response = session.request(method, url, proxies=proxies, **kwargs)
+        except BaseException:
+            self._release(session)
+            raise
+        if not kwargs.get("stream"):
+            self._release(session)
+            return response
+
+        close = response.close
+        released = []
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    self._release(session)
+
+        response.close = close_and_release
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def stats(self):
+        """Request and connection counts; reused = requests that did not open a new connection."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            retired = list(self._retired.values())
+            requests_made = self._requests
+            connections = self._closed_connections
+        connections += sum(_count_connections(s) for s in sessions + retired)
+        reused = max(0, requests_made - connections)
+        return {
+            "sessions": len(sessions),
+            "requests": requests_made,
+            "new_connections": connections,
+            "reused": reused,
+            "reuse_rate": reused / requests_made if requests_made else 0.0,
+        }
+
+    def close_proxied(self, addresses=None):
+        """
+        Retire every session that goes through a proxy (or only through the
+        given "host:port" proxies), e.g. after a Tor circuit change. New
+        requests get fresh sessions; sessions still in use are closed when
+        their requests finish instead of under them.
+        """
+        to_close = []
+        with self._lock:
+            keys = [
+                key for key in self._sessions
+                if key[0] and (addresses is None or _proxy_address(key[0]) in addresses)
+            ]
+            for key in keys:
+                session = self._sessions.pop(key)
+                if self._retire(session):
+                    to_close.append(session)
+        for session in to_close:
+            session.close()
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            for session in sessions:
+                self._closed_connections += _count_connections(session)
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool():
+    """Return the process-wide session pool shared by search and scrape."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool()
+        return _pool
+
+
+def pooled_get(url, **kwargs):
+    """requests.get through the shared session pool."""
+    return get_session_pool().get(url, **kwargs)
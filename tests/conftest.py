@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep caches and stores written during tests out of the working tree
+os.environ.setdefault("ROBIN_CACHE_DIR", tempfile.mkdtemp(prefix="robin-test-cache-"))
@@ -0,0 +1,178 @@
+"""Local stand-ins for Tor's SOCKS and control ports and for a web server."""
+import select
+import socket
+import struct
+import threading
+import http.server
+
+
+class _Server:
+    """TCP listener that serves each connection on its own thread until stop()."""
+
+    def __init__(self, port=0):
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", port))
+        self._sock.listen(50)
+        self._sock.settimeout(0.1)
+        self.port = self._sock.getsockname()[1]
+        self._conns = set()
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            conn.settimeout(None)
+            self._conns.add(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            self.handle(conn)
+        except OSError:
+            pass
+        finally:
+            self._conns.discard(conn)
+            conn.close()
+
+    def handle(self, conn):
+        raise NotImplementedError
+
+    def stop(self):
+        """Stop listening and drop every open connection, like a killed process."""
+        self._running = False
+        self._sock.close()
+        for conn in list(self._conns):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+
+class FakeSocksServer(_Server):
+    """
+    SOCKS5 proxy without authentication checks that relays to 127.0.0.1 for
+    .onion hosts. With refuse=True every CONNECT fails, like a tor process
+    whose circuits are broken while its SocksPort still answers.
+    """
+
+    def __init__(self, port=0):
+        self.usernames = []
+        self.connections = 0
+        self.refuse = False
+        super().__init__(port)
+
+    def _recv_exact(self, conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise OSError("client went away")
+            data += chunk
+        return data
+
+    def handle(self, conn):
+        self.connections += 1
+        _, count = self._recv_exact(conn, 2)
+        methods = self._recv_exact(conn, count)
+        if 2 in methods:
+            # Username/password: Tor uses it only to isolate circuits
+            conn.sendall(b"\x05\x02")
+            _, user_len = self._recv_exact(conn, 2)
+            self.usernames.append(self._recv_exact(conn, user_len).decode())
+            (pass_len,) = self._recv_exact(conn, 1)
+            self._recv_exact(conn, pass_len)
+            conn.sendall(b"\x01\x00")
+        else:
+            conn.sendall(b"\x05\x00")
+        _, _, _, address_type = self._recv_exact(conn, 4)
+        if address_type == 3:
+            (length,) = self._recv_exact(conn, 1)
+            host = self._recv_exact(conn, length).decode()
+        else:
+            host = socket.inet_ntoa(self._recv_exact(conn, 4))
+        (port,) = struct.unpack(">H", self._recv_exact(conn, 2))
+        if self.refuse:
+            # General SOCKS server failure
+            conn.sendall(b"\x05\x01\x00\x01" + b"\x00" * 6)
+            return
+        if host.endswith(".onion"):
+            host = "127.0.0.1"
+        upstream = socket.create_connection((host, port))
+        conn.sendall(b"\x05\x00\x00\x01" + b"\x00" * 6)
+        try:
+            while True:
+                readable, _, _ = select.select([conn, upstream], [], [])
+                for source in readable:
+                    data = source.recv(65536)
+                    if not data:
+                        return
+                    (upstream if source is conn else conn).sendall(data)
+        finally:
+            upstream.close()
+
+
+class FakeControlServer(_Server):
+    """Tor control port that understands AUTHENTICATE, SIGNAL NEWNYM and QUIT."""
+
+    def __init__(self, password=None, port=0):
+        self.password = password
+        self.commands = []
+        super().__init__(port)
+
+    @property
+    def newnym_count(self):
+        return self.commands.count("SIGNAL NEWNYM")
+
+    def handle(self, conn):
+        authenticated = False
+        with conn.makefile("rwb") as f:
+            for raw in f:
+                line = raw.decode().strip()
+                self.commands.append(line)
+                if line.startswith("AUTHENTICATE"):
+                    authenticated = self.password is None or line == f'AUTHENTICATE "{self.password}"'
+                    f.write(b"250 OK\r\n" if authenticated else b"515 Authentication failed\r\n")
+                elif line == "SIGNAL NEWNYM":
+                    f.write(b"250 OK\r\n" if authenticated else b"514 Authentication required\r\n")
+                elif line == "QUIT":
+                    f.write(b"250 closing connection\r\n")
+                    f.flush()
+                    return
+                else:
+                    f.write(b'510 Unrecognized command\r\n')
+                f.flush()
+
+
+class _OkHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        content_type, body = self.server.pages.get(self.path, ("text/plain", f"ok {self.path}".encode()))
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(pages=None):
+    """
+    Start a threaded HTTP server that serves pages ({path: (content_type, body)})
+    and answers "ok <path>" for any other path. Returns the server (call shutdown()).
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    server.pages = pages or {}
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
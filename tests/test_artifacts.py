@@ -0,0 +1,101 @@
+import pytest
+
+from artifacts import (
+    extract_artifacts,
+    format_artifact_table,
+    keccak256,
+    mask_artifacts,
+    valid_btc_base58,
+    valid_btc_bech32,
+    valid_eth,
+    valid_xmr,
+)
+
+
+def test_keccak256_vectors():
+    # Ethereum's Keccak-256, not the FIPS 202 SHA3-256 padding
+    assert keccak256(b"").hex() == "c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470"
+    assert keccak256(b"abc").hex() == "4e03657aea45a94fc7d47ba826c8d667c0d1e6e33a64a036ec44f58fa12d6c45"
+    # Inputs across the 136-byte rate boundary
+    assert len({keccak256(b"a" * n) for n in (135, 136, 137)}) == 3
+
+
+@pytest.mark.parametrize("address", [
+    # EIP-55 examples
+    "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed",
+    "0xfB6916095ca1df60bB79Ce92cE3Ea74c37c5d359",
+    "0xdbF03B407c01E7cD3CBea99509d93f8DDDC8C6FB",
+    "0xD1220A0cf47c7B9Be7A2E6BA89F429762e7b9aDb",
+    # Single-case addresses carry no checksum
+    "0x5aaeb6053f3e94c9b9a09f33669435e7ef1beaed",
+])
+def test_valid_eth(address):
+    assert valid_eth(address)
+
+
+def test_eth_checksum_mismatch():
+    assert not valid_eth("0x5aaeb6053F3E94C9b9A09f33669435E7Ef1BeAed")
+
+
+@pytest.mark.parametrize("address, valid", [
+    ("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa", True),
+    ("3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy", True),
+    ("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNb", False),
+    # Valid characters, wrong length
+    ("1A1zP1eP5QGefi2DMPTfTL5SLmv7Divf", False),
+])
+def test_btc_base58(address, valid):
+    assert valid_btc_base58(address) is valid
+
+
+@pytest.mark.parametrize("address, valid", [
+    # BIP-173
+    ("bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4", True),
+    ("BC1QW508D6QEJXTDG4Y5R3ZARVARY0C5XW7KV8F3T4", True),
+    ("bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3", True),
+    ("bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t5", False),
+    ("bc1qw508d6qejxtdg4y5r3zarvaRy0c5xw7kv8f3t4", False),
+    # BIP-350
+    ("bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0", True),
+    ("BC1SW50QGDZ25J", True),
+    # Bech32 checksum on a v1 program
+    ("bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqh2y7hd", False),
+    # BIP-86 taproot output
+    ("bc1p5d7rjq7g6rdk2yhzks9smlaqtedr4dekq08ge8ztwac72sfr9rusxg3297", True),
+])
+def test_btc_bech32(address, valid):
+    assert valid_btc_bech32(address) is valid
+
+
+XMR_ADDRESS = (
+    "44AFFq5kSiGBoZ4NMDwYtN18obc8AemS33DBLWs3H7otXft3XjrpDtQGv7SqSsaBYBb98uNbr2VBBEt7f2wfn3RVGQBEP3A"
+)
+
+
+def test_xmr():
+    assert valid_xmr(XMR_ADDRESS)
+    assert not valid_xmr(XMR_ADDRESS[:-1] + "B")
+    assert not valid_xmr(XMR_ADDRESS[:-1])
+
+
+def test_mask_artifacts_uses_table_refs():
+    text = (
+        f"Send XMR to {XMR_ADDRESS} or BTC to 1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa, "
+        "contact t.me/VendorBob. Not an address: 1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNb"
+    )
+    artifacts = extract_artifacts({"http://a.onion/": text})
+    table = format_artifact_table(artifacts)
+    masked = mask_artifacts(text, artifacts)
+    for line in table.splitlines()[1:]:
+        ref, _, value, _ = line.split(" | ")
+        assert value not in masked
+        assert f"[{ref}]" in masked
+    # Strings that failed validation are not in the table and stay in the text
+    assert "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNb" in masked
+
+
+def test_mask_leaves_artifacts_beyond_the_table():
+    text = "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa and 3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy"
+    artifacts = extract_artifacts({"u": text})
+    masked = mask_artifacts(text, artifacts, max_rows=1)
+    assert masked.count("[A1]") == 1 and masked.count("A2") == 0
@@ -0,0 +1,58 @@
+import scrape
+from crawl import BloomFilter, crawl
+from fake_servers import start_http_server
+
+
+def _html(*links):
+    anchors = "".join(f'<a href="{href}">{text}</a> ' for href, text in links)
+    return ("text/html", f"<html><body><p>page</p>{anchors}</body></html>".encode())
+
+
+def test_bloom_filter():
+    seen = BloomFilter(capacity=100)
+    assert seen.add("a") and not seen.add("a")
+    assert "a" in seen and "b" not in seen
+
+
+def test_crawl_follows_links_in_one_scrape(monkeypatch):
+    server = start_http_server({
+        "/": _html(("/market", "market listings"), ("/about", "about"), ("/logout", "log out")),
+        "/market": _html(("/market/item1", "item"), ("/style.css", "css")),
+        "/about": _html(("/", "home")),
+        "/market/item1": _html(("/market/item2", "next")),
+    })
+    calls = []
+    scrape_multiple = scrape.scrape_multiple
+    monkeypatch.setattr("crawl.scrape_multiple", lambda *a, **kw: calls.append(1) or scrape_multiple(*a, **kw))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        results = crawl([{"link": f"{base}/", "title": "home"}], query="market", max_depth=2,
+                        max_pages=10)
+    finally:
+        server.shutdown()
+    assert len(calls) == 1
+    depths = {url[len(base):]: stats["depth"] for url, stats in results.page_stats.items()}
+    # Depth 3 is out of reach, skipped paths and extensions are never fetched
+    assert depths == {"/": 0, "/market": 1, "/about": 1, "/market/item1": 2}
+    assert list(results)[0] == f"{base}/"
+
+
+def test_crawl_page_limit():
+    server = start_http_server({"/": _html(*[(f"/p{i}", "page") for i in range(20)])})
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        results = crawl([{"link": f"{base}/", "title": "home"}], max_depth=1, max_pages=5)
+    finally:
+        server.shutdown()
+    assert len(results) == 5
+
+
+def test_every_seed_is_scraped_beyond_the_page_limit():
+    server = start_http_server({f"/s{i}": _html(("/more", "more")) for i in range(4)})
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    seeds = [{"link": f"{base}/s{i}", "title": "seed"} for i in range(4)]
+    try:
+        results = crawl(seeds, max_depth=1, max_pages=2)
+    finally:
+        server.shutdown()
+    assert sorted(results) == sorted(seed["link"] for seed in seeds)
@@ -0,0 +1,34 @@
+import pytest
+
+import dedup
+from dedup import find_near_duplicates, simhash
+
+PAGE = " ".join(f"word{i}" for i in range(60))
+
+
+def test_mirrors_cluster_and_distinct_pages_do_not():
+    texts = {
+        "a": PAGE,
+        "mirror": PAGE + " footer",
+        "other": " ".join(f"other{i}" for i in range(60)),
+    }
+    assert find_near_duplicates(texts, max_distance=10) == [["a", "mirror"]]
+
+
+@pytest.mark.parametrize("max_distance", [-1, 0, 63, 64, 1000])
+def test_out_of_range_distance_is_clamped(max_distance):
+    texts = {"a": PAGE, "b": PAGE}
+    assert find_near_duplicates(texts, max_distance) == [["a", "b"]]
+
+
+def test_members_stay_within_distance_of_the_representative(monkeypatch):
+    # a - b and b - c are 3 bits apart, a - c is 6
+    fingerprints = {"a": 0b0, "b": 0b111, "c": 0b111111}
+    texts = {key: f"{key} " * (40 - i) for i, key in enumerate(fingerprints)}
+    monkeypatch.setattr(dedup, "simhash", lambda text: fingerprints[text.split()[0]])
+    assert find_near_duplicates(texts, max_distance=3) == [["a", "b"]]
+
+
+def test_simhash_is_stable():
+    assert simhash(PAGE) == simhash(PAGE)
+    assert dedup.hamming(simhash(PAGE), simhash(PAGE + " extra words here")) < 16
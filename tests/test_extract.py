@@ -0,0 +1,38 @@
+import pytest
+
+from extract import EXTRACTORS, extract_bytes, get_extractor
+
+PAGE = (
+    "<html><head><title>Market</title><style>p{}</style></head><body>"
+    "<nav><a href='/'>Home</a> <a href='/faq'>FAQ</a></nav>"
+    "<main><p>Vendor list and <a href='/v/1'>escrow</a> rules</p>"
+    "<script>var x = 1;</script></main>"
+    "<footer>Copyright</footer></body></html>"
+)
+
+
+@pytest.mark.parametrize("name", sorted(EXTRACTORS))
+def test_extractors_agree(name):
+    extractor = get_extractor(name)
+    extractor.feed(PAGE)
+    extractor.close()
+    assert extractor.get_text() == "Market Vendor list and escrow rules"
+    assert extractor.text_length == len("MarketVendor list and escrow rules")
+    assert ("/faq", "FAQ") in extractor.get_links()
+
+
+@pytest.mark.parametrize("name", sorted(EXTRACTORS))
+def test_boilerplate_can_be_kept(name):
+    extractor = get_extractor(name, drop_boilerplate=False)
+    extractor.feed(PAGE)
+    extractor.close()
+    assert "Home FAQ" in extractor.get_text()
+    assert "Copyright" in extractor.get_text()
+
+
+@pytest.mark.parametrize("name", sorted(EXTRACTORS))
+def test_text_length_stops_on_text_not_markup(name):
+    # Lots of markup and script, little text: the text budget is not reached
+    html = "<div>" + "<script>x</script><span></span>" * 2000 + "<p>end</p></div>"
+    text, stopped, _ = extract_bytes(html.encode(), name=name, max_text_chars=100, chunk_size=1024)
+    assert text == "end" and not stopped
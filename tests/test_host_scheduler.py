@@ -0,0 +1,27 @@
+from host_scheduler import HostScheduler
+
+
+def test_release_keeps_the_backoff():
+    scheduler = HostScheduler(max_per_host=4, base_backoff=60)
+    scheduler.add("a.onion", "first")
+    scheduler.add("a.onion", "second")
+    assert scheduler.next_ready() == ("a.onion", "first")
+    assert scheduler.acquire("a.onion")
+    # Another fetch from the host failed, then the losing hedge copy stops
+    scheduler.done("a.onion", ok=False)
+    scheduler.release("a.onion")
+    state = scheduler._hosts["a.onion"]
+    assert state.in_flight == 0
+    assert state.backoff == 60 and state.limit == 2
+    assert scheduler.next_ready() is None
+    assert scheduler.next_wakeup() > 50
+
+
+def test_success_clears_the_backoff():
+    scheduler = HostScheduler(max_per_host=4, base_backoff=60)
+    scheduler.add("a.onion", "page")
+    assert scheduler.acquire("a.onion") and scheduler.acquire("a.onion")
+    scheduler.done("a.onion", ok=False)
+    scheduler.done("a.onion", ok=True)
+    state = scheduler._hosts["a.onion"]
+    assert state.backoff == 0 and state.limit == 3
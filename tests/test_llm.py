@@ -0,0 +1,112 @@
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.prompts import ChatPromptTemplate
+import pytest
+
+import llm
+from artifacts import extract_artifacts
+from llm_scheduler import LLMScheduler
+
+PROMPT = ChatPromptTemplate.from_messages([("user", "{question}")])
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+class FlakyModel(BaseChatModel):
+    """Streams its tokens, failing after fail_after of them on the first call."""
+
+    tokens: list
+    fail_after: int
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "flaky"
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        for i, token in enumerate(self.tokens):
+            if self.calls == 1 and i == self.fail_after:
+                raise Unavailable("try again")
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class EchoModel(BaseChatModel):
+    """Answers with the prompt it was given."""
+
+    @property
+    def _llm_type(self):
+        return "echo"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = "\n".join(message.content for message in messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class Collect(BaseCallbackHandler):
+    def __init__(self):
+        self.tokens = []
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.tokens.append(token)
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    monkeypatch.setattr(llm, "LLM_CACHE_ENABLED", False)
+    scheduler = LLMScheduler(max_retries=3, retry_backoff=0)
+    monkeypatch.setattr(llm, "get_llm_scheduler", lambda: scheduler)
+    return scheduler
+
+
+def test_failure_before_any_token_is_retried():
+    shown = Collect()
+    model = FlakyModel(tokens=["a", "b"], fail_after=0, streaming=True, callbacks=[shown])
+    assert llm._invoke_chain(model, PROMPT, {"question": "q"}) == "ab"
+    assert model.calls == 2
+    assert shown.tokens == ["a", "b"]
+
+
+def test_failure_after_streamed_tokens_is_not_retried():
+    shown = Collect()
+    model = FlakyModel(tokens=["a", "b"], fail_after=1, streaming=True, callbacks=[shown])
+    with pytest.raises(Unavailable):
+        llm._invoke_chain(model, PROMPT, {"question": "q"})
+    assert model.calls == 1
+    assert shown.tokens == ["a"]
+
+
+def test_quiet_model_is_retried_after_partial_output():
+    model = FlakyModel(tokens=["a", "b"], fail_after=1, streaming=True)
+    assert llm._invoke_chain(model, PROMPT, {"question": "q"}) == "ab"
+    assert model.calls == 2
+
+
+ONION = "duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion"
+
+
+def test_source_urls_survive_masking():
+    page = f"Our market moved to {ONION}, mail admin@{ONION}"
+    url = f"http://{ONION}/search"
+    content = (
+        f"\n\n--- URL: {url} ---\n"
+        f"(Same content also at: http://{ONION}/mirror)\n{page}"
+        "\n\n--- EXCLUDED CONTENT (FILTERED) ---\n"
+        f"- http://{ONION}/blocked (Blocked page...): blocklist\n"
+    )
+    artifacts = extract_artifacts({url: page})
+    prompt = llm.generate_summary(EchoModel(), "market", content, max_chunk_tokens=100_000, artifacts=artifacts)
+    assert f"--- URL: {url} ---" in prompt
+    assert f"(Same content also at: http://{ONION}/mirror)" in prompt
+    assert f"- http://{ONION}/blocked (Blocked page...)" in prompt
+    assert "Our market moved to [A1], mail [A2]" in prompt
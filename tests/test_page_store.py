@@ -0,0 +1,32 @@
+import os
+
+from page_store import PageStore
+
+
+def test_truncated_body_is_never_current(tmp_path):
+    store = PageStore(str(tmp_path), freshness=3600)
+    store.put("http://a.onion/", b"<p>partial", etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT",
+              complete=False)
+    entry = store.lookup("http://a.onion/")
+    assert not store.is_fresh(entry)
+    assert store.conditional_headers(entry) == {}
+
+    store.put("http://a.onion/", b"<p>whole</p>", etag='"v1"')
+    entry = store.lookup("http://a.onion/")
+    assert store.is_fresh(entry)
+    assert store.conditional_headers(entry) == {"If-None-Match": '"v1"'}
+
+
+def test_eviction_drops_oldest_pages_and_unused_blobs(tmp_path):
+    store = PageStore(str(tmp_path), max_bytes=250)
+    old = store.put("http://old.onion/", b"o" * 100)
+    shared = store.put("http://a.onion/", b"s" * 100)
+    # A mirror of the same body takes no extra space
+    store.put("http://b.onion/", b"s" * 100)
+    store.put("http://new.onion/", b"n" * 100)
+
+    assert store.lookup("http://old.onion/") is None
+    assert not os.path.exists(store._blob_path(old))
+    assert store.lookup("http://a.onion/") and store.lookup("http://b.onion/")
+    assert os.path.exists(store._blob_path(shared))
+    assert store.stats()["pages"] == 3
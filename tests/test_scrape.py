@@ -0,0 +1,174 @@
+import http.server
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from fake_servers import start_http_server
+from scrape import _charset, _discard_parse_pool, _extract_raw, fetch_page, get_parse_pool, scrape_multiple
+
+CYRILLIC = "Добро пожаловать на форум"
+
+
+def _page(head_markup):
+    return f"<html><head>{head_markup}<title>t</title></head><body><p>{CYRILLIC}</p></body></html>"
+
+
+@pytest.mark.parametrize("content_type, head, expected", [
+    ("text/html; charset=koi8-r", b'<meta charset="windows-1251">', "koi8-r"),
+    ("text/html", b'<meta charset="windows-1251">', "cp1251"),
+    ("text/html", b'<meta http-equiv="Content-Type" content="text/html; charset=windows-1251">', "cp1251"),
+    ("text/html", b"\xef\xbb\xbf<html>", "utf-8-sig"),
+    ("text/html", b'<meta charset="no-such-codec">', "utf-8"),
+    ("text/html", b"<html>", "utf-8"),
+])
+def test_charset(content_type, head, expected):
+    assert _charset(content_type, head) == expected
+
+
+@pytest.fixture
+def web():
+    body = _page('<meta charset="windows-1251">').encode("cp1251")
+    server = start_http_server({
+        "/short": ("text/html", body),
+        # The declaration is found even when the first network read is small
+        "/long": ("text/html", body.replace(b"<title>", b"<!--" + b" " * 4000 + b"--><title>")),
+    })
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("path", ["/short", "/long"])
+def test_fetch_decodes_meta_charset(web, path):
+    stats = fetch_page(web + path, {})
+    assert CYRILLIC in stats["text"]
+    assert not stats["truncated"]
+
+
+def test_oversized_body_is_flagged_and_cut(web):
+    body = b"<p>" + b"word " * 2000 + b"</p>"
+    server = start_http_server({"/big": ("text/html", body)})
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        big = fetch_page(base + "/big", {}, max_bytes=1000)
+        small = fetch_page(web + "/short", {}, max_bytes=1000)
+    finally:
+        server.shutdown()
+    assert big["oversized"] and big["truncated"]
+    assert big["bytes_read"] == 1000 and big["bytes_saved"] == len(body) - big["bytes_read"]
+    assert not small["oversized"]
+
+
+def test_broken_parse_pool_is_replaced():
+    pool = get_parse_pool(1)
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    # The body that hit the broken pool is extracted in this process
+    assert _extract_raw(b"<p>first</p>", "text/html", pool)[0] == "first"
+    replacement = get_parse_pool(1)
+    assert replacement is not pool
+    # Callers still holding the broken pool are moved to the new workers
+    assert _extract_raw(b"<p>second</p>", "text/html", pool)[0] == "second"
+    assert get_parse_pool(1) is replacement
+    _discard_parse_pool(replacement)
+
+
+def test_slow_input_does_not_block_the_deadline():
+    server = start_http_server()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def slow_search():
+        yield {"link": f"{base}/first", "title": "first"}
+        # A search engine that is still answering
+        time.sleep(3)
+        yield {"link": f"{base}/second", "title": "second"}
+
+    started = time.monotonic()
+    try:
+        results = scrape_multiple(slow_search(), parse_processes=0, use_store=False, deadline=1.5)
+    finally:
+        server.shutdown()
+    assert time.monotonic() - started < 2.5
+    assert results.page_stats[f"{base}/first"]["outcome"] == "fetched"
+    assert "ok /first" in results[f"{base}/first"]
+
+
+class _SlowFirstHandler(http.server.BaseHTTPRequestHandler):
+    """Serves /slow as a trickle the first time and at once afterwards; everything else at once."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] = server.requests.get(self.path, 0) + 1
+            first = server.requests[self.path] == 1
+        body = f"<p>page {self.path}</p>".encode()
+        if self.path == "/slow" and first:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            try:
+                for _ in range(100):
+                    self.wfile.write(b"<p>" + b"x" * 64 + b"</p>")
+                    self.wfile.flush()
+                    time.sleep(0.1)
+            except OSError:
+                pass
+            server.trickle_ended = time.monotonic()
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_losing_hedge_copy_is_stopped():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SlowFirstHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = {}
+    server.trickle_ended = None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    # Fast pages give the hedge threshold its samples; the slow page is on a host of its own
+    urls = [{"link": f"http://127.0.0.1:{port}/fast{i}", "title": "fast"} for i in range(6)]
+    urls.append({"link": f"http://localhost:{port}/slow", "title": "slow"})
+    started = time.monotonic()
+    try:
+        results = scrape_multiple(urls, max_workers=2, parse_processes=0, use_store=False,
+                                  hedge_percentile=50, deadline=0)
+        slow = f"http://localhost:{port}/slow"
+        assert results.page_stats[slow]["outcome"] == "hedged"
+        assert "page /slow" in results[slow]
+        # The first copy was cancelled long before its ten second trickle ended
+        for _ in range(50):
+            if server.trickle_ended:
+                break
+            time.sleep(0.1)
+        assert server.trickle_ended and server.trickle_ended - started < 5
+    finally:
+        server.shutdown()
+
+
+def test_generator_input_ends_without_waiting_for_the_deadline():
+    server = start_http_server()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def search():
+        yield {"link": f"{base}/only", "title": "only"}
+
+    started = time.monotonic()
+    try:
+        results = scrape_multiple(search(), parse_processes=0, use_store=False, deadline=30)
+    finally:
+        server.shutdown()
+    assert time.monotonic() - started < 5
+    assert results.page_stats[f"{base}/only"]["outcome"] == "fetched"
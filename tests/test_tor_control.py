@@ -0,0 +1,130 @@
+import pytest
+import requests
+
+from fake_servers import FakeControlServer, FakeSocksServer, start_http_server
+from session_pool import SessionPool
+from tor_control import CircuitController, TorControlError, MIN_SAMPLES
+from tor_pool import TorProxyPool
+
+
+@pytest.fixture
+def control():
+    server = FakeControlServer(password="s3cret")
+    yield server
+    server.stop()
+
+
+def _controller(server, **kwargs):
+    kwargs.setdefault("password", "s3cret")
+    kwargs.setdefault("min_interval", 0)
+    return CircuitController(host="127.0.0.1", port=server.port, **kwargs)
+
+
+def test_authenticate_and_newnym(control):
+    controller = _controller(control)
+    assert controller.rotate("test")
+    assert control.commands[:2] == ['AUTHENTICATE "s3cret"', "SIGNAL NEWNYM"]
+    assert controller.generation == 1 and controller.rotations == 1
+
+
+def test_wrong_password_is_rejected(control):
+    with pytest.raises(TorControlError):
+        _controller(control, password="wrong").send_newnym()
+    assert control.newnym_count == 0
+    # rotate() swallows the failure and keeps the current circuit
+    assert not _controller(control, password="wrong").rotate("test")
+
+
+def test_rotation_rate_limit(control):
+    controller = _controller(control, min_interval=60)
+    assert controller.rotate("first")
+    assert not controller.rotate("too soon")
+    assert control.newnym_count == 1
+
+
+def test_rotates_on_error_rate(control):
+    controller = _controller(control, max_error_rate=0.5)
+    results = [controller.observe(0, 1.0, ok) for ok in (True, False, False, False, False)]
+    assert results[-1] and control.newnym_count == 1
+    # Requests that started on the old circuit no longer count
+    assert not controller.observe(0, 1.0, False)
+    assert controller.generation == 1
+
+
+def test_rotates_on_latency(control):
+    controller = _controller(control, latency_factor=2.0)
+    for _ in range(MIN_SAMPLES):
+        controller.observe(0, 1.0, True)
+    assert controller.baseline == 1.0
+    rotated = False
+    for _ in range(20):
+        rotated = controller.observe(0, 3.0, True) or rotated
+    assert rotated and control.newnym_count == 1
+
+
+def test_gradual_slowdown_does_not_move_the_baseline(control):
+    controller = _controller(control, latency_factor=2.0)
+    latency = 1.0
+    rotated = False
+    for _ in range(100):
+        rotated = controller.observe(controller.generation, latency, True)
+        if rotated:
+            break
+        latency *= 1.05
+    assert rotated, "a circuit that keeps getting slower must eventually be replaced"
+    # The baseline is still the median of the circuit's first healthy window
+    assert controller.baseline < 1.2
+
+
+def test_on_rotate_callback(control):
+    calls = []
+    controller = _controller(control, on_rotate=lambda: calls.append(True))
+    controller.rotate("test")
+    assert calls == [True]
+
+
+def test_rotation_retires_busy_sessions_without_closing_them():
+    pool = SessionPool()
+    session = pool.get_session("socks5h://127.0.0.1:9050", "a.onion")
+    closed = []
+    session.close = lambda: closed.append(session)
+    pool._users[id(session)] = 1
+    pool.close_proxied(["127.0.0.1:9050"])
+    assert not closed
+    # A new request gets a new session; the old one is closed on release
+    assert pool.get_session("socks5h://127.0.0.1:9050", "a.onion") is not session
+    pool._release(session)
+    assert closed == [session]
+
+
+def test_each_tor_process_rotates_on_its_own():
+    web = start_http_server()
+    socks = [FakeSocksServer(), FakeSocksServer()]
+    controls = [FakeControlServer(), FakeControlServer()]
+    try:
+        pool = TorProxyPool(
+            [("127.0.0.1", s.port) for s in socks],
+            control_ports=[c.port for c in controls],
+        )
+        for controller in pool.circuit_controllers():
+            controller.min_interval = 0
+            # Local latencies are noise; only the error rate should matter here
+            controller.latency_factor = 1000
+        # Only the first process fails: its circuits cannot reach the onion service
+        socks[0].refuse = True
+
+        url = f"http://test.onion:{web.server_address[1]}/"
+        # The pool picks instances by latency, so how requests split between them varies
+        for i in range(20 * MIN_SAMPLES):
+            try:
+                pool.get(url, isolation=f"r{i}", circuit=(None, None), timeout=5)
+            except requests.exceptions.ConnectionError:
+                pass
+            if controls[0].newnym_count:
+                break
+        assert controls[0].newnym_count >= 1
+        assert controls[1].newnym_count == 0
+    finally:
+        web.shutdown()
+        for server in socks + controls:
+            server.stop()
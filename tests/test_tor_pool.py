@@ -0,0 +1,88 @@
+import time
+
+import pytest
+import requests
+
+from fake_servers import FakeSocksServer, start_http_server
+from tor_pool import TorProxyPool, parse_endpoints, configured_endpoints
+
+
+@pytest.fixture
+def web():
+    server = start_http_server()
+    yield f"http://test.onion:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def socks_servers():
+    servers = [FakeSocksServer(), FakeSocksServer()]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def _pool(servers, **kwargs):
+    return TorProxyPool([("127.0.0.1", s.port) for s in servers], **kwargs)
+
+
+def test_parse_endpoints():
+    assert parse_endpoints("127.0.0.1:9050, 9052,,tor:9150") == [
+        ("127.0.0.1", 9050), ("127.0.0.1", 9052), ("tor", 9150),
+    ]
+
+
+def test_configured_endpoints_falls_back_to_default(monkeypatch):
+    monkeypatch.setattr("tor_pool.TOR_SOCKS_ENDPOINTS", " , ")
+    assert configured_endpoints() == [("127.0.0.1", 9050)]
+
+
+def test_least_loaded_selection(socks_servers):
+    pool = _pool(socks_servers)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    pool.release(first)
+    # The released instance is idle again, the other still has a request in flight
+    assert pool.acquire() is first
+
+
+def test_requests_spread_over_instances(socks_servers, web):
+    pool = _pool(socks_servers)
+    for i in range(4):
+        assert pool.get(f"{web}/page{i}", isolation=f"req{i}", timeout=5).text == f"ok /page{i}"
+    assert all(s.connections for s in socks_servers)
+    assert all(i["in_flight"] == 0 for i in pool.stats())
+    # Isolation strings reach Tor as SOCKS usernames
+    assert {"req0", "req1", "req2", "req3"} <= set(socks_servers[0].usernames + socks_servers[1].usernames)
+
+
+def test_failover_and_recovery(socks_servers, web):
+    pool = _pool(socks_servers, dead_cooldown=0.5)
+    killed = socks_servers[0]
+    port = killed.port
+    killed.stop()
+
+    # Requests keep working through the surviving instance
+    for i in range(3):
+        assert pool.get(f"{web}/a{i}", isolation=f"a{i}", timeout=5).status_code == 200
+    stats = {s["address"]: s for s in pool.stats()}
+    dead = stats[f"127.0.0.1:{port}"]
+    assert not dead["alive"] and dead["failures"] == 1
+
+    # Once the endpoint is back and the cooldown is over, it takes requests again
+    socks_servers[0] = FakeSocksServer(port)
+    time.sleep(0.6)
+    for i in range(4):
+        assert pool.get(f"{web}/b{i}", isolation=f"b{i}", timeout=5).status_code == 200
+    stats = {s["address"]: s for s in pool.stats()}
+    assert stats[f"127.0.0.1:{port}"]["alive"]
+    assert socks_servers[0].connections > 0
+
+
+def test_all_instances_down_raises(socks_servers, web):
+    pool = _pool(socks_servers)
+    for server in socks_servers:
+        server.stop()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.get(f"{web}/x", timeout=5)
@@ -0,0 +1,185 @@
+import time
+import socket
+import threading
+from session_pool import get_session_pool
+from config import (
+    TOR_CONTROL_HOST,
+    TOR_ROTATE_MIN_INTERVAL,
+    TOR_ROTATE_LATENCY_FACTOR,
+    TOR_ROTATE_MAX_ERROR_RATE,
+)
+
+# Observations needed before a circuit is judged
+MIN_SAMPLES = 5
+# Observations kept per circuit
+WINDOW_SIZE = 20
+# Weight of a replaced circuit's healthy median in the latency baseline
+BASELINE_ALPHA = 0.3
+
+
+class TorControlError(Exception):
+    pass
+
+
+def _median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+class CircuitController:
+    """
+    Rotates Tor circuits through the control port when they degrade.
+
+    Worker threads report each request through observe(). When the median
+    latency of the current circuit rises above latency_factor times the
+    baseline seen on earlier healthy circuits, or its error rate goes above
+    max_error_rate, one thread sends SIGNAL NEWNYM and the observation window
+    starts over. Rotations are at least min_interval seconds apart, and
+    observations from requests that started on an older circuit are ignored.
+
+    The baseline stays fixed while a circuit is being judged, so a circuit
+    that slows down gradually cannot drag it along. It starts as the first
+    healthy median seen, and each replaced circuit's first healthy median is
+    folded in when the circuit is replaced.
+    """
+
+    def __init__(
+        self,
+        host=TOR_CONTROL_HOST,
+        port=9051,
+        password=None,
+        min_interval=TOR_ROTATE_MIN_INTERVAL,
+        latency_factor=TOR_ROTATE_LATENCY_FACTOR,
+        max_error_rate=TOR_ROTATE_MAX_ERROR_RATE,
+        on_rotate=None,
+    ):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.min_interval = min_interval
+        self.latency_factor = latency_factor
+        self.max_error_rate = max_error_rate
+        self.on_rotate = on_rotate
+        self.generation = 0
+        self.rotations = 0
+        self.baseline = None
+        # First healthy median of the current circuit, folded into the baseline on rotation
+        self._circuit_median = None
+        self._window = []
+        self._last_rotation = 0
+        self._lock = threading.Lock()
+        self._signal_lock = threading.Lock()
+
+    def _command(self, sock_file, command):
+        sock_file.write(f"{command}\r\n".encode())
+        sock_file.flush()
+        reply = sock_file.readline().decode(errors="replace").strip()
+        # Multi-line replies use "250-" continuation lines
+        while reply[3:4] == "-":
+            reply = sock_file.readline().decode(errors="replace").strip()
+        if not reply.startswith("250"):
+            raise TorControlError(f"{command.split()[0]} failed: {reply}")
+
+    def send_newnym(self):
+        """Authenticate on the control port and send SIGNAL NEWNYM."""
+        if self.password:
+            escaped = self.password.replace("\\", "\\\\").replace('"', '\\"')
+            auth = f'AUTHENTICATE "{escaped}"'
+        else:
+            auth = "AUTHENTICATE"
+        with socket.create_connection((self.host, self.port), timeout=10) as sock:
+            with sock.makefile("rwb") as sock_file:
+                self._command(sock_file, auth)
+                self._command(sock_file, "SIGNAL NEWNYM")
+                sock_file.write(b"QUIT\r\n")
+                sock_file.flush()
+
+    def rotate(self, reason="requested"):
+        """
+        Switch to a new circuit unless one was requested less than
+        min_interval seconds ago. Returns True if NEWNYM was sent.
+        """
+        # Only one thread talks to the control port, the others carry on
+        if not self._signal_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                if time.monotonic() - self._last_rotation < self.min_interval:
+                    return False
+            try:
+                self.send_newnym()
+            except (OSError, TorControlError) as e:
+                print(f"[DEBUG] Tor circuit rotation failed: {e}")
+                return False
+            with self._lock:
+                self._last_rotation = time.monotonic()
+                self.generation += 1
+                self.rotations += 1
+                self._window = []
+                if self._circuit_median is not None:
+                    self.baseline = (
+                        BASELINE_ALPHA * self._circuit_median + (1 - BASELINE_ALPHA) * self.baseline
+                    )
+                self._circuit_median = None
+            print(f"[DEBUG] Rotated Tor circuit ({reason})")
+            if self.on_rotate:
+                self.on_rotate()
+            return True
+        finally:
+            self._signal_lock.release()
+
+    def observe(self, generation, latency, ok):
+        """
+        Record one request made on circuit `generation`.
+        Returns True if this observation triggered a rotation.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self._window = (self._window + [(latency, ok)])[-WINDOW_SIZE:]
+            if len(self._window) < MIN_SAMPLES:
+                return False
+            errors = sum(1 for _, success in self._window if not success)
+            error_rate = errors / len(self._window)
+            latencies = [lat for lat, success in self._window if success]
+            median = _median(latencies) if latencies else None
+
+            reason = None
+            if error_rate > self.max_error_rate:
+                reason = f"error rate {error_rate:.0%}"
+            elif median is not None and self.baseline is not None \
+                    and median > self.latency_factor * self.baseline:
+                reason = f"median latency {median:.1f}s vs baseline {self.baseline:.1f}s"
+            elif median is not None:
+                if self.baseline is None:
+                    self.baseline = median
+                if self._circuit_median is None:
+                    self._circuit_median = median
+        if reason:
+            return self.rotate(reason)
+        return False
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_circuit_controller(control_port=9051, control_password=None, proxy_addresses=None):
+    """
+    Return the controller shared by all worker threads for a control port
+    (one per tor process). proxy_addresses are the "host:port" SOCKS
+    endpoints of that tor process; after a rotation their kept-alive
+    sessions are retired (None = every proxied session).
+    """
+    key = (TOR_CONTROL_HOST, control_port)
+    with _controllers_lock:
+        controller = _controllers.get(key)
+        if controller is None:
+            controller = CircuitController(
+                port=control_port,
+                password=control_password,
+                # Kept-alive connections would stay on the old circuit
+                on_rotate=lambda: get_session_pool().close_proxied(proxy_addresses),
+            )
+            _controllers[key] = controller
+        return controller
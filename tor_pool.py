@@ -0,0 +1,244 @@
+import time
+import socket
+import threading
+import requests
+from session_pool import get_session_pool
+from tor_control import get_circuit_controller
+from config import TOR_SOCKS_ENDPOINTS, TOR_SELECTION, TOR_DEAD_COOLDOWN, TOR_CONTROL_PORTS
+
+# Weight of the newest sample in the per-instance latency average
+EWMA_ALPHA = 0.3
+# Tor's own default SocksPort, used when TOR_SOCKS_ENDPOINTS lists nothing
+DEFAULT_ENDPOINT = ("127.0.0.1", 9050)
+
+
+def parse_endpoints(value):
+    """Parse "host:port,host:port" (a bare port means 127.0.0.1) into [(host, port)]."""
+    endpoints = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(":")
+        endpoints.append((host or "127.0.0.1", int(port)))
+    return endpoints
+
+
+def parse_ports(value):
+    """Parse a comma-separated list of ports."""
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def configured_endpoints():
+    """SOCKS endpoints from TOR_SOCKS_ENDPOINTS, or Tor's default port if it is empty."""
+    return parse_endpoints(TOR_SOCKS_ENDPOINTS) or [DEFAULT_ENDPOINT]
+
+
+def is_port_open(host, port, timeout=2):
+    """True if something accepts TCP connections on host:port."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        return sock.connect_ex((host, port)) == 0
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class TorInstance:
+    """One SOCKS endpoint with its load and health, and the control port of its tor process."""
+
+    def __init__(self, host, port, control_port=None):
+        self.host = host
+        self.port = port
+        self.control_port = control_port
+        self.in_flight = 0
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self.dead_until = 0
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def proxies(self, isolation=None):
+        # Distinct SOCKS credentials get their own circuit (IsolateSOCKSAuth)
+        auth = f"{isolation}:x@" if isolation else ""
+        proxy = f"socks5h://{auth}{self.host}:{self.port}"
+        return {"http": proxy, "https": proxy}
+
+
+class TorProxyPool:
+    """
+    Spreads requests over several Tor SOCKS endpoints (separate tor processes
+    or several SocksPorts of one process).
+
+    selection="least_loaded" picks the instance with the fewest requests in
+    flight, "latency" weighs in-flight requests by each instance's average
+    latency. When a request fails because the SOCKS endpoint itself is gone,
+    the instance is marked dead for dead_cooldown seconds and the request is
+    retried on the next instance.
+
+    control_ports pairs each endpoint with the control port of the tor
+    process behind it (in order; a single port is shared by all endpoints,
+    as for several SocksPorts of one tor). Requests sent with a circuit
+    option report their latency and errors to that process's
+    CircuitController, so each tor process is rotated on its own.
+    """
+
+    def __init__(self, endpoints, selection=TOR_SELECTION, dead_cooldown=TOR_DEAD_COOLDOWN, control_ports=None):
+        if not endpoints:
+            raise ValueError("TorProxyPool needs at least one SOCKS endpoint")
+        control_ports = list(control_ports or [])
+        if len(control_ports) == 1:
+            control_ports *= len(endpoints)
+        control_ports += [None] * (len(endpoints) - len(control_ports))
+        self.instances = [
+            TorInstance(host, port, control_port)
+            for (host, port), control_port in zip(endpoints, control_ports)
+        ]
+        self.selection = selection
+        self.dead_cooldown = dead_cooldown
+        self._lock = threading.Lock()
+
+    def _load_key(self, instance):
+        if self.selection == "latency":
+            return ((instance.latency or 0) * (instance.in_flight + 1), instance.in_flight)
+        return (instance.in_flight, instance.latency or 0)
+
+    def acquire(self, exclude=()):
+        """Pick an instance and count the request against it. Pair with release()."""
+        now = time.time()
+        with self._lock:
+            candidates = [i for i in self.instances if i not in exclude]
+            if not candidates:
+                return None
+            alive = [i for i in candidates if i.dead_until <= now]
+            if alive:
+                instance = min(alive, key=self._load_key)
+            else:
+                # Everything is marked dead, try the one that has rested longest
+                instance = min(candidates, key=lambda i: i.dead_until)
+            instance.in_flight += 1
+            instance.requests += 1
+            return instance
+
+    def release(self, instance, latency=None, dead=False):
+        with self._lock:
+            instance.in_flight = max(0, instance.in_flight - 1)
+            if dead:
+                instance.failures += 1
+                instance.dead_until = time.time() + self.dead_cooldown
+                return
+            instance.dead_until = 0
+            if latency is not None:
+                instance.latency = (
+                    latency if instance.latency is None
+                    else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * instance.latency
+                )
+
+    def get_proxies(self, isolation=None):
+        """Proxies dict for the currently least-loaded instance (no load accounting)."""
+        instance = self.acquire()
+        self.release(instance)
+        return instance.proxies(isolation)
+
+    def circuit_controller(self, instance, control_port=None, control_password=None):
+        """
+        CircuitController of the tor process behind instance; control_port is
+        used for instances without a configured one.
+        """
+        port = instance.control_port or control_port
+        if port is None:
+            return None
+        addresses = [i.address for i in self.instances if (i.control_port or control_port) == port]
+        return get_circuit_controller(port, control_password, addresses)
+
+    def circuit_controllers(self, control_port=None, control_password=None):
+        """The distinct CircuitControllers of all instances."""
+        controllers = []
+        for instance in self.instances:
+            controller = self.circuit_controller(instance, control_port, control_password)
+            if controller is not None and controller not in controllers:
+                controllers.append(controller)
+        return controllers
+
+    def request(self, method, url, isolation=None, circuit=None, **kwargs):
+        """
+        Send a request through the pool, failing over to the next instance
+        when the chosen SOCKS endpoint is unreachable.
+        circuit=(control_port, control_password) reports the request to the
+        serving instance's CircuitController (see circuit_controller).
+        """
+        tried = []
+        last_error = None
+        while True:
+            instance = self.acquire(exclude=tried)
+            if instance is None:
+                raise last_error
+            tried.append(instance)
+            controller = self.circuit_controller(instance, *circuit) if circuit else None
+            generation = controller.generation if controller else None
+            started = time.monotonic()
+            try:
+                response = get_session_pool().request(
+                    method, url, proxies=instance.proxies(isolation), **kwargs
+                )
+            except requests.exceptions.ConnectionError as e:
+                # Tell a dead SOCKS endpoint apart from an unreachable onion service
+                if is_port_open(instance.host, instance.port):
+                    self.release(instance, time.monotonic() - started)
+                    if controller:
+                        controller.observe(generation, time.monotonic() - started, False)
+                    raise
+                print(f"[DEBUG] Tor instance {instance.address} is down, failing over")
+                self.release(instance, dead=True)
+                last_error = e
+                continue
+            except Exception:
+                self.release(instance, time.monotonic() - started)
+                if controller:
+                    controller.observe(generation, time.monotonic() - started, False)
+                raise
+            latency = time.monotonic() - started
+            self.release(instance, latency)
+            if controller:
+                controller.observe(generation, latency, True)
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "address": i.address,
+                    "in_flight": i.in_flight,
+                    "requests": i.requests,
+                    "failures": i.failures,
+                    "latency": i.latency,
+                    "alive": i.dead_until <= time.time(),
+                }
+                for i in self.instances
+            ]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_tor_pool():
+    """Return the process-wide Tor pool built from TOR_SOCKS_ENDPOINTS."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TorProxyPool(configured_endpoints(), control_ports=parse_ports(TOR_CONTROL_PORTS))
+        return _pool
+
+
+def tor_get(url, isolation=None, **kwargs):
+    """GET a URL through the Tor pool."""
+    return get_tor_pool().get(url, isolation=isolation, **kwargs)
@@ -3,19 +3,22 @@ import streamlit as st
 from datetime import datetime
 from scrape import scrape_multiple
 from search import get_search_results
+from content_filter import filter_scraped_content
+from dedup import collapse_mirrors
+from config import FILTER_SCRAPED_CONTENT, DEDUP_ENABLED
 from llm_utils import BufferedStreamingHandler, get_model_choices
-from llm import get_llm, refine_query, filter_results, generate_summary
+from llm import get_llm, refine_query, filter_results, generate_summary, log_llm_cache_stats
 
 
 # Cache expensive backend calls
 @st.cache_data(ttl=200, show_spinner=False)
-def cached_search_results(refined_query: str, threads: int):
-    return get_search_results(refined_query.replace(" ", "+"), max_workers=threads)
+def cached_search_results(refined_query: str):
+    return get_search_results(refined_query.replace(" ", "+"))
 
 
 @st.cache_data(ttl=200, show_spinner=False)
-def cached_scrape_multiple(filtered: list, threads: int):
-    return scrape_multiple(filtered, max_workers=threads)
+def cached_scrape_multiple(filtered: list, threads: int, query: str):
+    return scrape_multiple(filtered, max_workers=threads, query=query)
 
 
 # Streamlit page configuration
@@ -126,9 +129,7 @@ if run_button and query:
     # Stage 3 - Search dark web
     with status_slot.container():
         with st.spinner("🔍 Searching dark web..."):
-            st.session_state.results = cached_search_results(
-                st.session_state.refined, threads
-            )
+            st.session_state.results = cached_search_results(st.session_state.refined)
     p2.container(border=True).markdown(
         f"<div class='colHeight'><p class='pTitle'>Search Results</p><p>{len(st.session_state.results)}</p></div>",
         unsafe_allow_html=True,
@@ -149,17 +150,28 @@ if run_button and query:
     with status_slot.container():
         with st.spinner("📜 Scraping content..."):
             st.session_state.scraped = cached_scrape_multiple(
-                st.session_state.filtered, threads
+                st.session_state.filtered, threads, st.session_state.refined
             )
+            if FILTER_SCRAPED_CONTENT:
+                st.session_state.scraped, excluded_pages = filter_scraped_content(
+                    st.session_state.scraped
+                )
+                st.session_state.results.excluded_content.extend(excluded_pages)
+            if DEDUP_ENABLED:
+                st.session_state.scraped = collapse_mirrors(st.session_state.scraped)
 
     # Stage 6 - Summarize
     # 6a) Prepare session state for streaming text
     st.session_state.streamed_summary = ""
 
     # 6b) Convert scraped results dict to formatted string
+    mirrors = getattr(st.session_state.scraped, "mirrors", {})
     scraped_content = ""
     for url, content in st.session_state.scraped.items():
-        scraped_content += f"\n\n--- URL: {url} ---\n{content}\n"
+        scraped_content += f"\n\n--- URL: {url} ---\n"
+        if mirrors.get(url):
+            scraped_content += f"(Same content also at: {', '.join(mirrors[url])})\n"
+        scraped_content += f"{content}\n"
     
     # 6c) Prepare excluded info
     excluded_info = ""
@@ -194,7 +206,10 @@ if run_button and query:
         with st.spinner("✍️ Generating summary..."):
             stream_handler = BufferedStreamingHandler(ui_callback=ui_emit)
             llm.callbacks = [stream_handler]
-            _ = generate_summary(llm, query, scraped_content + excluded_info)
+            _ = generate_summary(
+                llm, query, scraped_content + excluded_info, artifacts=getattr(st.session_state.scraped, "artifacts", [])
+            )
+            log_llm_cache_stats()
 
     with btn_col:
         now = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -0,0 +1,71 @@
+import re
+import posixpath
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track the visitor and never change the page. Generic
+# names such as ref, source or from are left alone: forums use them for pagination
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "yclid", "mc_cid", "mc_eid",
+    "sid", "phpsessid", "sessionid", "session_id", "jsessionid", "_ga",
+}
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+INDEX_PAGE_RE = re.compile(r"/index\.html?$", re.IGNORECASE)
+SLASHES_RE = re.compile(r"/{2,}")
+
+
+def _is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def get_host(url):
+    """Lowercased host of a URL ('' if it cannot be parsed)."""
+    try:
+        return (urlsplit(url.strip()).hostname or "").rstrip(".")
+    except ValueError:
+        return ""
+
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so the same page is spelled one way:
+    lowercase scheme and host, default port, fragment, tracking parameters,
+    dot-segments, duplicate and trailing slashes and index.html are removed, and the
+    remaining query parameters are sorted. Unparseable URLs are returned stripped.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").rstrip(".")
+    if not host:
+        return url
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+
+    path = SLASHES_RE.sub("/", parts.path)
+    if path:
+        # Resolve "." and ".." segments; normpath drops the trailing slash, which is removed below anyway
+        path = posixpath.normpath(path)
+    path = INDEX_PAGE_RE.sub("/", path)
+    path = path.rstrip("/") or "/"
+
+    params = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(k)
+    ]
+    query = urlencode(sorted(params), safe="+")
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def dedup_key(url):
+    """
+    Key under which two URLs count as the same page. The scheme is dropped so
+    http and https variants collapse, onion services are addressed by their
+    key rather than by TLS anyway.
+    """
+    canonical = canonicalize_url(url)
+    return canonical.split("://", 1)[-1]